@@ -25,8 +25,8 @@ def insert_data_to_plc():
             for key, value in item.items():
                 print("Writing to PLC: Key:", type(key), "Value:", type(value))
                 if isinstance(value, (int, float)):
-                    value_type = 'REAL' if isinstance(value, float) else 'INT'
-                    c.write_tag(key.encode('utf-8'), value, value_type)
+                    # the driver knows the type of the tag from its previous reads
+                    c.write_tag(key.encode('utf-8'), value)
                 else:
                     print("Value is",value)
                     key = key.encode('utf-8')
@@ -24,7 +24,18 @@
 # SOFTWARE.
 #
 from pycomm.cip.cip_base import *
+try:
+    from pycomm.cip.cip_async import AsyncBase, Return
+except ImportError:
+    # asyncore is missing, only the asynchronous driver needs it
+    AsyncBase, Return = AsyncUnavailable, None
+from pycomm.ab_comm.l5x import load_l5x
+import array
+import functools
+import json
 import logging
+import os
+from collections import OrderedDict
 try:  # Python 2.7+
     from logging import NullHandler
 except ImportError:
@@ -35,7 +46,71 @@ except ImportError:
 logger = logging.getLogger(__name__)
 logger.addHandler(NullHandler())
 
+# general status of a request path that does not address an object of the controller
+PATH_ERRORS = (0x04, 0x05)
+
 string_sizes = [82, 12, 16, 20, 40, 8]
+# structure handle, LEN and DATA padded to 4 bytes of the biggest string read as a whole
+string_value_size = 2 + 4 + 84
+
+# version of the tag database written by get_tag_list
+TAG_DATABASE_VERSION = 1
+
+
+def _from_json(obj):
+    """ turn the unicode strings loaded from json back to str
+    """
+    if isinstance(obj, unicode):
+        return str(obj)
+    if isinstance(obj, list):
+        return [_from_json(item) for item in obj]
+    if isinstance(obj, dict):
+        return dict((_from_json(key), _from_json(value)) for key, value in obj.items())
+    return obj
+
+
+class StructTag(dict):
+    """ A structure tag yielded by Driver.iter_tag_list
+
+    The keys 'template' and 'udt' are read from the controller the first time one of them is used, get included.
+    """
+    def __init__(self, driver, *args, **kwargs):
+        super(StructTag, self).__init__(*args, **kwargs)
+        self._driver = driver
+
+    def __missing__(self, key):
+        if key not in ('template', 'udt'):
+            raise KeyError(key)
+        self._driver._resolve_struct_tag(self)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def stale_instance_retry(method):
+    """ run the method once more when a path error showed that the symbol instances used are stale
+
+    The symbols that got a path error are checked after the method, the instances are loaded again by the second run
+    only if one of them moved. The path errors of a wrong member or index are returned as they are.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._suspect_symbols = {}
+        try:
+            result = method(self, *args, **kwargs)
+        except DataError:
+            if not self._symbols_moved():
+                raise
+        else:
+            if not self._symbols_moved():
+                return result
+        logger.warning("Symbol instances stale, {0} is executed again".format(method.__name__))
+        return method(self, *args, **kwargs)
+    return wrapper
 
 
 class Driver(Base):
@@ -63,6 +138,23 @@ class Driver(Base):
 
         self._buffer = {}
         self._get_template_in_progress = False
+        self._array_data_type = None
+        self._tag_types = {}    # tag name -> data type, learnt from the replies
+        self._offline_types = {}    # tag name -> data type, from an L5X export
+        self._instance_ids = {}     # tag name -> instance of the symbol object, from get_tag_list
+        self._symbol_types = {}     # tag name -> symbol type, from get_tag_list
+        self._templates = {}        # template instance -> structure definition, see _get_template
+        self._template_definitions = {}     # template instance -> (structure makeup, raw template)
+        self._template_handles = {}         # structure handle -> template instance
+        self._templates_checked = set()     # the template instances whose makeup was read in this browse
+        self._class_attributes_in_progress = False
+        self._struct_handle = None
+        self._instance_ids_loaded = False
+        self._instance_ids_version = 0
+        self._last_rp_symbol = None     # the tag of the last request path built with a symbol instance
+        self._suspect_symbols = {}      # tag name -> instance, the symbols addressed by instance with a path error
+        # address the tags by the instance of their symbol object instead of by name
+        self.attribs['instance addressing'] = False
         self.__version__ = '0.2'
 
     def get_last_tag_read(self):
@@ -79,6 +171,170 @@ class Driver(Base):
         """
         return self._last_tag_write
 
+    def get_tag_type(self, tag):
+        """ Return the data type of a tag learnt from the previous read_tag and get_tag_list
+
+        The types are forgotten at each forward open, the program of the controller could have changed.
+
+        :return: the data type name, None if the type of the tag is not known
+        """
+        return self._tag_types.get(tag)
+
+    def load_l5x(self, filename):
+        """ learn the types of the tags from the L5X export of the controller project, without any request
+
+        The types are used by write_tag and to pack the reads, they are kept at each forward open.
+
+        :param filename: the path of the L5X file
+        :return: the L5X, see pycomm.ab_comm.l5x
+        """
+        project = load_l5x(filename)
+        types = project.tag_types()
+        # the file is parsed without the lock, the types are shared with the other threads
+        with self._lock:
+            self._offline_types = types
+            self._tag_types.update(types)
+        return project
+
+    def _forward_open_reply(self, size):
+        self._tag_types.clear()
+        self._tag_types.update(self._offline_types)
+        return super(Driver, self)._forward_open_reply(size)
+
+    def _symbol_instance(self, tag):
+        """ return the instance of the symbol of a controller scope tag, None if it cannot be addressed by instance
+        """
+        if not self.attribs['instance addressing']:
+            return None
+        if not self._instance_ids_loaded:
+            self._load_instance_ids()
+        return self._instance_ids.get(tag.split('.', 1)[0].split('[', 1)[0])
+
+    def _tag_rp(self, tag, multi_requests=False):
+        """ create the request path of a tag, by symbol instance when the 'instance addressing' attribute is set
+
+        :return: the request path, None if any error
+        """
+        instance_id = self._symbol_instance(tag)
+        self._last_rp_symbol = None if instance_id is None else tag.split('.', 1)[0].split('[', 1)[0]
+        if instance_id is None:
+            return create_tag_rp(tag, multi_requests)
+        return create_symbol_instance_rp(instance_id, tag, multi_requests)
+
+    def _load_instance_ids(self):
+        """ browse the symbol instances of the controller scope tags
+        """
+        tag_list, self._tag_list = self._tag_list, []
+        try:
+            self._get_instance_attribute_list_service()
+        finally:
+            self._tag_list = tag_list
+
+    def _forget_instance_ids(self):
+        """ a symbol instance does not name its tag anymore: the program changed, browse again on next use
+        """
+        self._instance_ids = {}
+        self._instance_ids_loaded = False
+
+    def _suspect_symbol(self, tag_name):
+        """ a path built with the instance of the symbol has been refused, by a stale instance or a wrong member
+
+        The reply is being parsed, the symbol is checked by _symbols_moved when the operation is over.
+        """
+        if tag_name in self._instance_ids:
+            self._suspect_symbols[tag_name] = self._instance_ids[tag_name]
+
+    def _check_path_error(self, tag, status):
+        """ suspect the symbol if the service of a tag addressed by instance got a path error
+        """
+        if status in PATH_ERRORS and self.attribs['instance addressing']:
+            self._suspect_symbol(tag.split('.', 1)[0].split('[', 1)[0])
+
+    def _symbols_moved(self):
+        """ read the name of the symbols suspected, forget the instances if one of them does not name its tag
+
+        :return: True if the symbol instances are stale
+        """
+        suspects, self._suspect_symbols = self._suspect_symbols, {}
+        for tag_name, instance in suspects.items():
+            if self._get_symbol_name(instance) != tag_name:
+                self._forget_instance_ids()
+                return True
+        return False
+
+    def _get_symbol_name(self, instance):
+        """ read the name attribute of a symbol instance
+
+        :return: the name of the symbol, None if the instance does not exist
+        """
+        message_request = [
+            pack_uint(self._get_sequence()),
+            chr(TAG_SERVICES_REQUEST['Get Attributes']),
+            chr(3),                         # Request Path ( 20 6B 25 00 Instance )
+            CLASS_ID["8-bit"],
+            CLASS_CODE["Symbol Object"],
+            INSTANCE_ID["16-bit"],
+            '\x00',
+            pack_uint(instance),
+            pack_uint(1),   # Number of attributes
+            pack_uint(1),   # Symbol Name STRING
+        ]
+        self._last_rp_symbol = None
+        self._class_attributes_in_progress = True
+        try:
+            if not self.send_unit_data(
+                    build_common_packet_format(DATA_ITEM['Connected'], ''.join(message_request),
+                                               ADDRESS_ITEM['Connection Based'], addr_data=self._target_cid,)):
+                return None
+        finally:
+            self._class_attributes_in_progress = False
+
+        try:
+            attribute, status, length = struct.unpack_from('<HHH', self._reply, 52)
+            if status != SUCCESS:
+                return None
+            return self._reply[58:58 + length].tobytes()
+        except struct.error:
+            return None
+
+    def _tags_without_type(self, tag, typ):
+        """ return the names of the tags to write whose type is neither given nor known
+        """
+        if isinstance(tag, list):
+            return [name for name, value, t in tag if t is None and name not in self._tag_types]
+        if isinstance(tag, tuple):
+            tag, value, typ = tag
+        return [tag] if typ is None and tag not in self._tag_types else []
+
+    def _infer_write_type(self, tag, value, typ):
+        """ fill the types missing from the arguments of write_tag with the types known
+
+        :return: the arguments of write_tag, with the types known
+        """
+        if isinstance(tag, list):
+            return [(name, v, t or self._tag_types.get(name)) for name, v, t in tag], None, None
+        if isinstance(tag, tuple):
+            tag, value, typ = tag
+        if typ is None:
+            typ = self._tag_types.get(tag)
+            if typ is None:
+                self._status = (8, "The type of tag {0} is unknown. write_tag will not be executed.".format(tag))
+                raise DataError("The type of tag {0} is unknown. write_tag will not be executed.".format(tag))
+        return tag, value, typ
+
+    def _learn_symbol(self, tag_name, instance, symbol_type):
+        """ keep the instance and the type of a controller scope tag browsed
+
+        The programs and the system symbols are not kept, their tags are addressed by name.
+        """
+        if not self._is_user_symbol(tag_name, symbol_type):
+            return
+        self._instance_ids[tag_name] = instance
+        self._symbol_types[tag_name] = symbol_type
+        if not symbol_type & 0xe000 and (symbol_type & 0xff) in DATA_CODEC:
+            # atomic and not an array, the bits 8-10 of a BOOL are its position in the word
+            self._tag_types[tag_name] = DATA_CODEC[symbol_type & 0xff].name
+
     def _parse_instance_attribute_list(self, start_tag_ptr, status):
         """ extract the tags list from the message received
 
@@ -96,7 +352,7 @@ class Driver(Base):
                 idx += 4
                 tag_length = unpack_uint(tags_returned[idx:idx+2])
                 idx += 2
-                tag_name = tags_returned[idx:idx+tag_length]
+                tag_name = tags_returned[idx:idx+tag_length].tobytes()
                 idx += tag_length
                 symbol_type = unpack_uint(tags_returned[idx:idx+2])
                 idx += 2
@@ -172,7 +428,7 @@ class Driver(Base):
         :param start_tag_ptr: The point in the message string where the tag list begin
         :param status: The status of the message receives
         """
-        tags_returned = self._reply[start_tag_ptr:]
+        tags_returned = self._reply[start_tag_ptr:].tobytes()
         bytes_received = len(tags_returned)
 
         self._buffer += tags_returned
@@ -196,28 +452,26 @@ class Driver(Base):
 
         try:
             data_type = unpack_uint(self._reply[start_ptr:start_ptr+2])
+            if data_type == STRUCTURE_TYPE:
+                # the structure handle follows the type
+                self._struct_handle = unpack_uint(self._reply[start_ptr+2:start_ptr+4])
+                start_ptr += 2
             fragment_returned = self._reply[start_ptr+2:]
         except Exception as e:
             raise DataError(e)
+        self._array_data_type = data_type
 
         fragment_returned_length = len(fragment_returned)
-        idx = 0
 
-        while idx < fragment_returned_length:
+        if self._output_raw:
+            self._tag_list += fragment_returned.tobytes()
+        else:
             try:
-                typ = I_DATA_TYPE[data_type]
-                if self._output_raw:
-                    value = fragment_returned[idx:idx+DATA_FUNCTION_SIZE[typ]]
-                else:
-                    value = UNPACK_DATA_FUNCTION[typ](fragment_returned[idx:idx+DATA_FUNCTION_SIZE[typ]])
-                idx += DATA_FUNCTION_SIZE[typ]
+                values = DATA_CODEC[data_type].unpack_array_from(fragment_returned)
             except Exception as e:
                 raise DataError(e)
-            if self._output_raw:
-                self._tag_list += value
-            else:
-                self._tag_list.append((self._last_position, value))
-                self._last_position += 1
+            self._tag_list.extend(enumerate(values, self._last_position))
+            self._last_position += len(values)
 
         if status == SUCCESS:
             self._byte_offset = -1
@@ -247,13 +501,11 @@ class Driver(Base):
                 general_status = unpack_usint(self._reply[start+2:start+3])
 
                 if general_status == 0:
-                    data_type = unpack_uint(self._reply[start+4:start+6])
-                    value_begin = start + 6
-                    value_end = value_begin + DATA_FUNCTION_SIZE[I_DATA_TYPE[data_type]]
-                    value = self._reply[value_begin:value_end]
-                    self._last_tag_read = (tags[index], UNPACK_DATA_FUNCTION[I_DATA_TYPE[data_type]](value),
-                                           I_DATA_TYPE[data_type])
+                    codec = DATA_CODEC[unpack_uint(self._reply[start+4:start+6])]
+                    self._last_tag_read = (tags[index], codec.unpack_from(self._reply, start + 6), codec.name)
+                    self._tag_types[tags[index]] = codec.name
                 else:
+                    self._check_path_error(tags[index], general_status)
                     self._last_tag_read = (tags[index], None, None)
 
                 tag_list.append(self._last_tag_read)
@@ -283,6 +535,7 @@ class Driver(Base):
                 if general_status == 0:
                     self._last_tag_write = (tags[index] + ('GOOD',))
                 else:
+                    self._check_path_error(tags[index][0], general_status)
                     self._last_tag_write = (tags[index] + ('BAD',))
 
                 tag_list.append(self._last_tag_write)
@@ -319,13 +572,16 @@ class Driver(Base):
                     return True
             elif typ == unpack_uint(ENCAPSULATION_COMMAND["send_unit_data"]):
                 status = unpack_usint(self._reply[48:49])
+                if status in PATH_ERRORS and self._last_rp_symbol is not None:
+                    self._suspect_symbol(self._last_rp_symbol)
                 if unpack_usint(self._reply[46:47]) == I_TAG_SERVICES_REPLY["Read Tag Fragmented"]:
                     self._parse_fragment(50, status)
                     return True
                 if unpack_usint(self._reply[46:47]) == I_TAG_SERVICES_REPLY["Get Instance Attributes List"]:
                     self._parse_instance_attribute_list(50, status)
                     return True
-                if unpack_usint(self._reply[46:47]) == I_TAG_SERVICES_REPLY["Get Attributes"]:
+                if unpack_usint(self._reply[46:47]) == I_TAG_SERVICES_REPLY["Get Attributes"] and \
+                        not self._class_attributes_in_progress:
                     self._parse_structure_makeup_attributes(50, status)
                     return True
                 if unpack_usint(self._reply[46:47]) == I_TAG_SERVICES_REPLY["Read Template"] and \
@@ -347,6 +603,8 @@ class Driver(Base):
         except Exception as e:
             raise DataError(e)
 
+    @serialized
+    @stale_instance_retry
     def read_tag(self, tag):
         """ read tag from a connected plc
 
@@ -361,9 +619,6 @@ class Driver(Base):
         :return: None is returned in case of error otherwise the tag list is returned
         """
         self.clear()
-        multi_requests = False
-        if isinstance(tag, list):
-            multi_requests = True
 
         if not self._target_is_connected:
             if not self.forward_open():
@@ -371,63 +626,257 @@ class Driver(Base):
                 logger.warning(self._status)
                 raise DataError("Target did not connected. read_tag will not be executed.")
 
-        if multi_requests:
-            rp_list = []
-            for t in tag:
-                rp = create_tag_rp(t, multi_requests=True)
-                if rp is None:
-                    self._status = (6, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
-                    raise DataError("Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
-                else:
-                    rp_list.append(chr(TAG_SERVICES_REQUEST['Read Tag']) + rp + pack_uint(1))
-            message_request = build_multiple_service(rp_list, Base._get_sequence())
+        if isinstance(tag, list):
+            return self._read_multiple_tags(tag)
+
+        message = self._build_read_tag_request(tag)
+        if message is None:
+            return None
+
+        if self.send_unit_data(message) is None:
+            raise DataError("send_unit_data returned not valid data")
+
+        return self._parse_read_tag_reply(tag)
+
+    def _read_multiple_tags(self, tags):
+        """ read a list of tags with the fewest multiple service packets that fit the connection
+
+        :return: the tag list in the same order of tags
+        """
+        tag_list = [None] * len(tags)
+        for indexes in self._send_plan(self._plan_read_tag(tags)):
+            for index, read in zip(indexes, self._parse_multiple_request_read([tags[i] for i in indexes])):
+                tag_list[index] = read
+        return tag_list
+
+    def prepare_read(self, tags):
+        """ encode once the read of a list of tags, for the scans repeated many times
+
+        :param tags: a list of tag names
+        :return: a PreparedRead, its execute() returns what read_tag(tags) would return
+        """
+        return PreparedRead(self, tags)
+
+    def prepare_write(self, tags, types=None):
+        """ encode once the write of a list of tags, for the writes repeated many times
+
+        :param tags: a list of tag names
+        :param types: the list of the data types of the tags, the types learnt by read_tag are used when None
+        :return: a PreparedWrite, its execute(values) returns what write_tag of the list of tuple would return
+        """
+        return PreparedWrite(self, tags, types)
+
+    def _send_plan(self, plan):
+        """ send the packets of a plan, pipelined when the 'pipeline window' attribute allows it
 
+        This is a generator: when the indexes of a packet are yielded, its reply is in self._reply.
+        :param plan: a list of tuple (indexes, message) as returned by _plan_multiple_service
+        """
+        if self.attribs['pipeline window'] > 1 and len(plan) > 1:
+            replies = self.send_unit_data_pipelined([message for indexes, message in plan])
+            for (indexes, message), reply in zip(plan, replies):
+                self._reply = reply
+                self._check_reply()
+                yield indexes
         else:
-            rp = create_tag_rp(tag)
+            for indexes, message in plan:
+                if self.send_unit_data(message) is None:
+                    raise DataError("send_unit_data returned not valid data")
+                yield indexes
+
+    def _multiple_service_replies(self):
+        """ locate the replies in the reply of a multiple service packet
+
+        :return: a list of tuple (where the reply begins, general status) for each service
+        """
+        offset = 50
+        try:
+            replies = []
+            for index in range(unpack_uint(self._reply[offset:offset+2])):
+                position = offset + 2 + index * 2
+                start = offset + unpack_uint(self._reply[position:position+2])
+                replies.append((start, unpack_usint(self._reply[start+2:start+3])))
+            return replies
+        except Exception as e:
+            raise DataError(e)
+
+    def _expected_read_size(self, tag):
+        """ return the bytes expected for the value of tag in the reply of a Read Tag
+
+        When the type of the tag is not known the size of the biggest atomic type is used.
+        """
+        typ = self._tag_types.get(tag)
+        if typ is None:
+            return 8
+        return DATA_CODEC[S_DATA_TYPE[typ]].size
+
+    def _build_read_services(self, tags):
+        """ build the Read Tag service request of each tag, to be wrapped in a multiple service packet
+
+        :return: the list of the service requests
+        """
+        rp_list = []
+        for t in tags:
+            rp = self._tag_rp(t, multi_requests=True)
+            if rp is None:
+                self._status = (6, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tags))
+                raise DataError("Cannot create tag {0} request packet. read_tag will not be executed.".format(tags))
+            else:
+                rp_list.append(chr(TAG_SERVICES_REQUEST['Read Tag']) + rp + pack_uint(1))
+        return rp_list
+
+    def _plan_multiple_requests(self, items):
+        """ pack the services in the fewest multiple service packets that fit the connection size
+
+        The packets are filled first fit, taking the items from the biggest one. Both the request and the
+        expected reply of a packet have to fit the connection size.
+
+        :param items: a list of tuple (service requests, expected reply size). The services of an item go in the
+                      same packet, the reply size is the sum of the replies of its services
+        :return: a list of batches, each one the sorted list of the indexes of the items it carries
+        """
+        limit = self._connection_size
+        # each service adds its offset (2 bytes) to the request and to the reply
+        sizes = [(sum(len(service) + 2 for service in services), reply_size + 2 * len(services))
+                 for services, reply_size in items]
+        batches = []    # [request size, reply size, indexes]
+        for index in sorted(range(len(sizes)), key=lambda i: max(sizes[i]), reverse=True):
+            request_size, reply_size = sizes[index]
+            for batch in batches:
+                if batch[0] + request_size <= limit and batch[1] + reply_size <= limit:
+                    batch[0] += request_size
+                    batch[1] += reply_size
+                    batch[2].append(index)
+                    break
+            else:
+                # an item that alone overflows the connection gets its own packet anyway
+                batches.append([MSP_REQUEST_OVERHEAD + request_size, MSP_REPLY_OVERHEAD + reply_size, [index]])
+        return [sorted(batch[2]) for batch in batches]
+
+    def _plan_read_tag(self, tags):
+        """ split the read of a list of tags in multiple service packets
+
+        :return: a list of tuple (indexes of the tags, message ready for send_unit_data) for each packet
+        """
+        services = self._build_read_services(tags)
+        return self._plan_multiple_service(
+            [([service], READ_REPLY_OVERHEAD + self._expected_read_size(t)) for service, t in zip(services, tags)])
+
+    def _plan_multiple_service(self, items):
+        """ split the items in multiple service packets
+
+        :param items: a list of tuple (service requests, expected reply size), see _plan_multiple_requests
+        :return: a list of tuple (indexes of the items, message ready for send_unit_data) for each packet
+        """
+        return [(indexes, self._build_multiple_service_request([s for i in indexes for s in items[i][0]]))
+                for indexes in self._plan_multiple_requests(items)]
+
+    def _build_multiple_service_request(self, rp_list):
+        """ wrap a list of service requests in a connected multiple service packet
+
+        :return: the message ready for send_unit_data
+        """
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(build_multiple_service(rp_list, self._get_sequence())),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,
+        )
+
+    def _build_read_tag_request(self, tag):
+        """ build the connected message of a read_tag
+
+        :param tag: a tag name or a list of tag names
+        :return: the message ready for send_unit_data, None if the request path cannot be created
+        """
+        if isinstance(tag, list):
+            return self._build_multiple_service_request(self._build_read_services(tag))
+
+        else:
+            rp = self._tag_rp(tag)
             if rp is None:
                 self._status = (6, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
                 return None
             else:
                 # Creating the Message Request Packet
                 message_request = [
-                    pack_uint(Base._get_sequence()),
+                    pack_uint(self._get_sequence()),
                     chr(TAG_SERVICES_REQUEST['Read Tag']),  # the Request Service
                     chr(len(rp) / 2),                       # the Request Path Size length in word
                     rp,                                     # the request path
                     pack_uint(1)
                 ]
 
-        if self.send_unit_data(
-                build_common_packet_format(
-                    DATA_ITEM['Connected'],
-                    ''.join(message_request),
-                    ADDRESS_ITEM['Connection Based'],
-                    addr_data=self._target_cid,
-                )) is None:
-            raise DataError("send_unit_data returned not valid data")
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,
+        )
+
+    def _parse_read_tag_reply(self, tag):
+        """ parse the reply of a read_tag
 
-        if multi_requests:
+        :param tag: the tag name or the list of tag names requested
+        :return: the value and type read, or the tag list in case of multi request
+        """
+        if isinstance(tag, list):
             return self._parse_multiple_request_read(tag)
         else:
             # Get the data type
             if self._status[0] == SUCCESS:
-                data_type = unpack_uint(self._reply[50:52])
                 try:
-                    return UNPACK_DATA_FUNCTION[I_DATA_TYPE[data_type]](self._reply[52:]), I_DATA_TYPE[data_type]
+                    codec = DATA_CODEC[unpack_uint(self._reply[50:52])]
+                    self._tag_types[tag] = codec.name
+                    return codec.unpack_from(self._reply, 52), codec.name
                 except Exception as e:
                     raise DataError(e)
             else:
                 return None
 
-    def read_array(self, tag, counts, raw=False):
+    def _init_read_array(self, raw, typed):
+        """ reset the state used by _parse_fragment before the first fragment of read_array
+        """
+        self._byte_offset = 0
+        self._last_position = 0
+        self._array_data_type = None
+        # a typed array is decoded in bulk from the raw bytes at the end
+        self._output_raw = raw or bool(typed)
+
+        if raw:
+            self._tag_list = ''
+        elif typed:
+            self._tag_list = bytearray()
+        else:
+            self._tag_list = []
+
+    def _read_array_result(self, raw, typed):
+        """ return the values collected by read_array in the format requested
+        """
+        if typed and not raw:
+            try:
+                codec = DATA_CODEC[self._array_data_type]
+            except KeyError:
+                raise DataError("read_array cannot decode the data type {0}".format(self._array_data_type))
+            return codec.unpack_typed(self._tag_list, typed)
+        return self._tag_list
+
+    @serialized
+    @stale_instance_retry
+    def read_array(self, tag, counts, raw=False, typed=False):
         """ read array of atomic data type from a connected plc
 
         At the moment there is not a strong validation for the argument passed. The user should verify
         the correctness of the format passed.
 
+        When the 'pipeline window' attribute is greater than 1, all the fragments after the first one are
+        requested without waiting for each reply.
+
         :param tag: the name of the tag to read
         :param counts: the number of element to read
         :param raw: the value should output as raw-value (hex)
+        :param typed: return the values in an array.array ('array') or a numpy array ('numpy') instead of a list
+                      of (position, value). True uses numpy when it is installed. Ignored if raw
         :return: None is returned in case of error otherwise the tag list is returned
         """
         self.clear()
@@ -437,41 +886,67 @@ class Driver(Base):
                 logger.warning(self._status)
                 raise DataError("Target did not connected. read_tag will not be executed.")
 
-        self._byte_offset = 0
-        self._last_position = 0
-        self._output_raw = raw
+        self._init_read_array(raw, typed)
 
-        if self._output_raw:
-            self._tag_list = ''
-        else:
-            self._tag_list = []
-        while self._byte_offset != -1:
-            rp = create_tag_rp(tag)
-            if rp is None:
-                self._status = (7, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
-                return None
-            else:
-                # Creating the Message Request Packet
-                message_request = [
-                    pack_uint(Base._get_sequence()),
-                    chr(TAG_SERVICES_REQUEST["Read Tag Fragmented"]),  # the Request Service
-                    chr(len(rp) / 2),                                  # the Request Path Size length in word
-                    rp,                                                # the request path
-                    pack_uint(counts),
-                    pack_dint(self._byte_offset)
-                ]
+        rp = self._tag_rp(tag)
+        if rp is None:
+            self._status = (7, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
+            return None
 
-            if self.send_unit_data(
-                    build_common_packet_format(
-                        DATA_ITEM['Connected'],
-                        ''.join(message_request),
-                        ADDRESS_ITEM['Connection Based'],
-                        addr_data=self._target_cid,
-                    )) is None:
+        fragment_size = 0
+        array_size = 0
+        while self._byte_offset != -1:
+            if fragment_size and self.attribs['pipeline window'] > 1 and self._byte_offset < array_size:
+                # All the fragments left are known: request them together and parse the replies in order
+                offsets = range(self._byte_offset, array_size, fragment_size)
+                replies = self.send_unit_data_pipelined(
+                    [self._build_read_fragment_request(rp, counts, offset) for offset in offsets])
+                for offset, reply in zip(offsets, replies):
+                    if offset != self._byte_offset:
+                        # a fragment came back shorter than expected, carry on one fragment at time
+                        break
+                    self._reply = reply
+                    self._check_reply()
+                continue
+
+            if self.send_unit_data(self._build_read_fragment_request(rp, counts, self._byte_offset)) is None:
                 raise DataError("send_unit_data returned not valid data")
 
-        return self._tag_list
+            if not fragment_size and self._byte_offset > 0:
+                # The first fragment tells how many bytes the target fits in one reply
+                try:
+                    array_size = counts * DATA_CODEC[unpack_uint(self._reply[50:52])].size
+                    fragment_size = self._byte_offset
+                except LookupError:
+                    fragment_size = 0
+
+        return self._read_array_result(raw, typed)
+
+    def _build_read_fragment_request(self, rp, counts, byte_offset):
+        """ build the connected message to read one fragment of an array
+
+        :param rp: the request path of the tag to read
+        :param counts: the number of element to read
+        :param byte_offset: the offset of the fragment within the array
+        :return: the message ready for send_unit_data
+        """
+        message_request = [
+            pack_uint(self._get_sequence()),
+            chr(TAG_SERVICES_REQUEST["Read Tag Fragmented"]),  # the Request Service
+            chr(len(rp) / 2),                                  # the Request Path Size length in word
+            rp,                                                # the request path
+            pack_uint(counts),
+            pack_dint(byte_offset)
+        ]
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,
+        )
 
+    @serialized
+    @stale_instance_retry
     def write_tag(self, tag, value=None, typ=None):
         """ write tag/tags from a connected plc
 
@@ -494,15 +969,15 @@ class Driver(Base):
             - DWORD
             - LWORD
 
+        When the data type is None, the type learnt from the previous reads is used. The tags never read are
+        read first, all together.
+
         :param tag: tag name, or an array of tuple containing (tag name, value, data type)
         :param value: the value to write or none if tag is an array of tuple or a tuple
         :param typ: the type of the tag to write or none if tag is an array of tuple or a tuple
         :return: None is returned in case of error otherwise the tag list is returned
         """
         self.clear()  # cleanup error string
-        multi_requests = False
-        if isinstance(tag, list):
-            multi_requests = True
 
         if not self._target_is_connected:
             if not self.forward_open():
@@ -510,19 +985,38 @@ class Driver(Base):
                 logger.warning(self._status)
                 raise DataError("Target did not connected. write_tag will not be executed.")
 
-        if multi_requests:
+        missing = self._tags_without_type(tag, typ)
+        if missing:
+            self._read_multiple_tags(missing)
+            self.clear()
+        tag, value, typ = self._infer_write_type(tag, value, typ)
+
+        message = self._build_write_tag_request(tag, value, typ)
+        if message is None:
+            return None
+
+        return self._parse_write_tag_reply(tag, self.send_unit_data(message))
+
+    def _build_write_tag_request(self, tag, value=None, typ=None):
+        """ build the connected message of a write_tag
+
+        The tags that cannot be packed are removed from the list of a multi request.
+
+        :return: the message ready for send_unit_data, None if the request path cannot be created
+        """
+        if isinstance(tag, list):
             rp_list = []
             tag_to_remove = []
             idx = 0
             for name, value, typ in tag:
                 # Create the request path to wrap the tag name
-                rp = create_tag_rp(name, multi_requests=True)
+                rp = self._tag_rp(name, multi_requests=True)
                 if rp is None:
                     self._status = (8, "Cannot create tag{0} req. packet. write_tag will not be executed".format(tag))
                     return None
                 else:
                     try:    # Trying to add the rp to the request path list
-                        val = PACK_DATA_FUNCTION[typ](value)
+                        val = get_codec(typ).pack(value)
                         rp_list.append(
                             chr(TAG_SERVICES_REQUEST['Write Tag'])
                             + rp
@@ -541,7 +1035,7 @@ class Driver(Base):
             for position in tag_to_remove:
                 del tag[position]
             # Create the message request
-            message_request = build_multiple_service(rp_list, Base._get_sequence())
+            message_request = build_multiple_service(rp_list, self._get_sequence())
 
         else:
             if isinstance(tag, tuple):
@@ -549,7 +1043,7 @@ class Driver(Base):
             else:
                 name = tag
 
-            rp = create_tag_rp(name)
+            rp = self._tag_rp(name)
             if rp is None:
                 self._status = (8, "Cannot create tag {0} request packet. write_tag will not be executed.".format(tag))
                 logger.warning(self._status)
@@ -557,42 +1051,53 @@ class Driver(Base):
             else:
                 # Creating the Message Request Packet
                 message_request = [
-                    pack_uint(Base._get_sequence()),
+                    pack_uint(self._get_sequence()),
                     chr(TAG_SERVICES_REQUEST["Write Tag"]),   # the Request Service
                     chr(len(rp) / 2),               # the Request Path Size length in word
                     rp,                             # the request path
                     pack_uint(S_DATA_TYPE[typ]),    # data type
                     pack_uint(1),                    # Add the number of tag to write
-                    PACK_DATA_FUNCTION[typ](value)
+                    get_codec(typ).pack(value)
                 ]
 
-        ret_val = self.send_unit_data(
-            build_common_packet_format(
-                DATA_ITEM['Connected'],
-                ''.join(message_request),
-                ADDRESS_ITEM['Connection Based'],
-                addr_data=self._target_cid,
-            )
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,
         )
 
-        if multi_requests:
+    def _parse_write_tag_reply(self, tag, ret_val):
+        """ parse the reply of a write_tag
+
+        :param tag: the tag or the list of tuple written
+        :param ret_val: the value returned by send_unit_data
+        :return: the tag list in case of multi request otherwise the value returned by send_unit_data
+        """
+        if isinstance(tag, list):
             return self._parse_multiple_request_write(tag)
         else:
             if ret_val is None:
                 raise DataError("send_unit_data returned not valid data")
             return ret_val
 
+    @serialized
     def write_array(self, tag, values, data_type, raw=False):
         """ write array of atomic data type from a connected plc
         At the moment there is not a strong validation for the argument passed. The user should verify
         the correctness of the format passed.
+
+        The array is split in fragments as big as the connection allows.
+
         :param tag: the name of the tag to read
         :param data_type: the type of tag to write
-        :param values: the array of values to write, if raw: the frame with bytes
+        :param values: the array of values to write: a list or a tuple of values, an array.array, or a str,
+                       bytearray or memoryview with the values already encoded little endian.
+                       If raw: a list with the frame with bytes of each value
         :param raw: indicates that the values are given as raw values (hex)
         """
         self.clear()
-        if not isinstance(values, list):
+        if not isinstance(values, (list, tuple, array.array, str, bytearray, memoryview)):
             self._status = (9, "A list of tags must be passed to write_array.")
             logger.warning(self._status)
             raise DataError("A list of tags must be passed to write_array.")
@@ -603,48 +1108,87 @@ class Driver(Base):
                 logger.warning(self._status)
                 raise DataError("Target did not connected. write_array will not be executed.")
 
-        array_of_values = ""
-        byte_size = 0
-        byte_offset = 0
+        codec = get_codec(data_type)
+        rp = self._tag_rp(tag)
+        if rp is None:
+            self._status = (9, "Cannot create tag {0} request packet. \
+                write_array will not be executed.".format(tag))
+            return None
 
-        for i, value in enumerate(values):
-            if raw:
-                array_of_values += value
-            else:
-                array_of_values += PACK_DATA_FUNCTION[data_type](value)
-            byte_size += DATA_FUNCTION_SIZE[data_type]
+        # sequence count, service, path size, request path, data type, number of elements and offset
+        room = self._connection_size - 12 - len(rp)
+        fragment_size = max(1, room // codec.size) * codec.size
 
-            if byte_size >= 450 or i == len(values)-1:
-                # create the message and send the fragment
-                rp = create_tag_rp(tag)
-                if rp is None:
-                    self._status = (9, "Cannot create tag {0} request packet. \
-                        write_array will not be executed.".format(tag))
-                    return None
-                else:
-                    # Creating the Message Request Packet
-                    message_request = [
-                        pack_uint(Base._get_sequence()),
-                        chr(TAG_SERVICES_REQUEST["Write Tag Fragmented"]),  # the Request Service
-                        chr(len(rp) / 2),                                   # the Request Path Size length in word
-                        rp,                                                 # the request path
-                        pack_uint(S_DATA_TYPE[data_type]),                  # Data type to write
-                        pack_uint(len(values)),                             # Number of elements to write
-                        pack_dint(byte_offset),
-                        array_of_values                                     # Fragment of elements to write
-                    ]
-                    byte_offset += byte_size
-
-                if self.send_unit_data(
-                        build_common_packet_format(
-                            DATA_ITEM['Connected'],
-                            ''.join(message_request),
-                            ADDRESS_ITEM['Connection Based'],
-                            addr_data=self._target_cid,
-                        )) is None:
+        data = self._encode_array(values, codec, raw, fragment_size)
+        if len(data) % codec.size:
+            self._status = (9, "write_array data is not a whole number of {0} values.".format(data_type))
+            logger.warning(self._status)
+            raise DataError("write_array data is not a whole number of {0} values.".format(data_type))
+
+        self._write_fragments(rp, pack_uint(codec.code), len(data) // codec.size, data, fragment_size)
+
+    def _write_fragments(self, rp, data_type, count, data, fragment_size):
+        """ write the data of a tag with Write Tag Fragmented, a fragment in each request
+
+        :param rp: the request path of the tag
+        :param data_type: the data type field of the request, the structure handle included for a structure
+        :param count: the number of elements written
+        :param data: a memoryview of the elements encoded
+        :param fragment_size: the bytes of data in each request
+        """
+        # the part of the request that does not change from a fragment to the next
+        request = ''.join([
+            chr(TAG_SERVICES_REQUEST["Write Tag Fragmented"]),  # the Request Service
+            chr(len(rp) / 2),                                   # the Request Path Size length in word
+            rp,                                                 # the request path
+            data_type,                                          # Data type to write
+            pack_uint(count),                                   # Number of elements to write
+        ])
+        messages = []
+        for byte_offset in range(0, len(data), fragment_size):
+            # Creating the Message Request Packet
+            message_request = [
+                pack_uint(self._get_sequence()),
+                request,
+                pack_dint(byte_offset),
+                data[byte_offset:byte_offset + fragment_size].tobytes()     # Fragment of elements to write
+            ]
+            messages.append(
+                build_common_packet_format(
+                    DATA_ITEM['Connected'],
+                    ''.join(message_request),
+                    ADDRESS_ITEM['Connection Based'],
+                    addr_data=self._target_cid,
+                ))
+
+        if self.attribs['pipeline window'] > 1:
+            # fragments carry their own offset, so they can all be outstanding at the same time
+            for reply in self.send_unit_data_pipelined(messages):
+                self._reply = reply
+                self._check_reply()
+        else:
+            for message in messages:
+                if self.send_unit_data(message) is None:
                     raise DataError("send_unit_data returned not valid data")
-                array_of_values = ""
-                byte_size = 0
+
+    def _encode_array(self, values, codec, raw, fragment_size):
+        """ encode the values passed to write_array
+
+        A list is packed fragment by fragment into one preallocated buffer, the other inputs are not converted.
+        :return: a memoryview of the values encoded
+        """
+        if isinstance(values, (str, bytearray, memoryview)):
+            return memoryview(values)
+        if isinstance(values, array.array):
+            return memoryview(codec.pack_typed(values))
+        if raw:
+            return memoryview(''.join(values))
+
+        data = bytearray(len(values) * codec.size)
+        count = fragment_size // codec.size
+        for first in range(0, len(values), count):
+            codec.pack_array_into(data, first * codec.size, values[first:first + count])
+        return memoryview(data)
 
     def _get_instance_attribute_list_service(self):
         """ Step 1: Finding user-created controller scope tags in a Logix5000 controller
@@ -652,6 +1196,25 @@ class Driver(Base):
         This service returns instance IDs for each created instance of the symbol class, along with a list
         of the attribute data associated with the requested attribute
         """
+        self._instance_ids = {}
+        self._symbol_types = {}
+        self._last_instance = 0
+        while self._last_instance != -1:
+            symbols, self._last_instance = self._get_symbol_page(self._last_instance)
+            for symbol in symbols:
+                self._learn_symbol(symbol['tag_name'], symbol['instance_id'], symbol['symbol_type'])
+            self._tag_list.extend(symbols)
+        self._instance_ids_loaded = True
+        self._instance_ids_version += 1
+
+    @serialized
+    def _get_symbol_page(self, instance):
+        """ read the symbols of one reply of Get Instance Attributes List
+
+        :param instance: the instance of the symbol object where the page starts
+        :return: a tuple (the list of the symbols, the instance of the next page or -1 after the last page)
+        """
+        tag_list, self._tag_list = self._tag_list, []
         try:
             if not self._target_is_connected:
                 if not self.forward_open():
@@ -659,43 +1222,44 @@ class Driver(Base):
                     logger.warning(self._status)
                     raise DataError("Target did not connected. get_tag_list will not be executed.")
 
-            self._last_instance = 0
-
+            self._last_instance = instance
             self._get_template_in_progress = True
-            while self._last_instance != -1:
 
-                # Creating the Message Request Packet
-
-                message_request = [
-                    pack_uint(Base._get_sequence()),
-                    chr(TAG_SERVICES_REQUEST['Get Instance Attributes List']),  # STEP 1
-                    # the Request Path Size length in word
-                    chr(3),
-                    # Request Path ( 20 6B 25 00 Instance )
-                    CLASS_ID["8-bit"],       # Class id = 20 from spec 0x20
-                    CLASS_CODE["Symbol Object"],  # Logical segment: Symbolic Object 0x6B
-                    INSTANCE_ID["16-bit"],   # Instance Segment: 16 Bit instance 0x25
-                    '\x00',
-                    pack_uint(self._last_instance),          # The instance
-                    # Request Data
-                    pack_uint(2),   # Number of attributes to retrieve
-                    pack_uint(1),   # Attribute 1: Symbol name
-                    pack_uint(2)    # Attribute 2: Symbol type
-                ]
+            # Creating the Message Request Packet
+
+            message_request = [
+                pack_uint(self._get_sequence()),
+                chr(TAG_SERVICES_REQUEST['Get Instance Attributes List']),  # STEP 1
+                # the Request Path Size length in word
+                chr(3),
+                # Request Path ( 20 6B 25 00 Instance )
+                CLASS_ID["8-bit"],       # Class id = 20 from spec 0x20
+                CLASS_CODE["Symbol Object"],  # Logical segment: Symbolic Object 0x6B
+                INSTANCE_ID["16-bit"],   # Instance Segment: 16 Bit instance 0x25
+                '\x00',
+                pack_uint(instance),          # The instance
+                # Request Data
+                pack_uint(2),   # Number of attributes to retrieve
+                pack_uint(1),   # Attribute 1: Symbol name
+                pack_uint(2)    # Attribute 2: Symbol type
+            ]
 
-                if self.send_unit_data(
-                        build_common_packet_format(
-                            DATA_ITEM['Connected'],
-                            ''.join(message_request),
-                            ADDRESS_ITEM['Connection Based'],
-                            addr_data=self._target_cid,
-                        )) is None:
-                    raise DataError("send_unit_data returned not valid data")
+            if self.send_unit_data(
+                    build_common_packet_format(
+                        DATA_ITEM['Connected'],
+                        ''.join(message_request),
+                        ADDRESS_ITEM['Connection Based'],
+                        addr_data=self._target_cid,
+                    )) is None:
+                raise DataError("send_unit_data returned not valid data")
 
-            self._get_template_in_progress = False
+            return self._tag_list, self._last_instance
 
         except Exception as e:
             raise DataError(e)
+        finally:
+            self._get_template_in_progress = False
+            self._tag_list = tag_list
 
     def _get_structure_makeup(self, instance_id):
         """
@@ -779,48 +1343,54 @@ class Driver(Base):
             lst = self._tag_list
             self._tag_list = []
             for tag in lst:
-                    if tag['tag_name'].find(':') != -1 or tag['tag_name'].find('__') != -1:
-                        continue
-                    if tag['symbol_type'] & 0b0001000000000000:
-                        continue
-                    dimension = (tag['symbol_type'] & 0b0110000000000000) >> 13
-
-                    if tag['symbol_type'] & 0b1000000000000000 :
-                        template_instance_id = tag['symbol_type'] & 0b0000111111111111
-                        tag_type = 'struct'
-                        data_type = 'user-created'
-                        self._tag_list.append({'instance_id': tag['instance_id'],
-                                               'template_instance_id': template_instance_id,
-                                               'tag_name': tag['tag_name'],
-                                               'dim': dimension,
-                                               'tag_type': tag_type,
-                                               'data_type': data_type,
-                                               'template': {},
-                                               'udt': {}})
-                    else:
-                        tag_type = 'atomic'
-                        datatype = tag['symbol_type'] & 0b0000000011111111
-                        data_type = I_DATA_TYPE[datatype]
-                        if datatype == 0xc1:
-                            bit_position = (tag['symbol_type'] & 0b0000011100000000) >> 8
-                            self._tag_list.append({'instance_id': tag['instance_id'],
-                                                   'tag_name':  tag['tag_name'],
-                                                   'dim': dimension,
-                                                   'tag_type': tag_type,
-                                                   'data_type': data_type,
-                                                   'bit_position' : bit_position})
-                        else:
-                            self._tag_list.append({'instance_id': tag['instance_id'],
-                                                   'tag_name':  tag['tag_name'],
-                                                   'dim': dimension,
-                                                   'tag_type': tag_type,
-                                                   'data_type': data_type})
+                user_tag = self._user_tag(tag)
+                if user_tag is None:
+                    continue
+                if user_tag['tag_type'] == 'struct':
+                    user_tag['template'] = {}
+                    user_tag['udt'] = {}
+                self._tag_list.append(user_tag)
         except Exception as e:
             raise DataError(e)
 
+    @staticmethod
+    def _is_user_symbol(tag_name, symbol_type):
+        """ tell if a symbol browsed is a controller scope tag, not a program nor a system symbol
+        """
+        return tag_name.find(':') == -1 and tag_name.find('__') == -1 and not symbol_type & 0b0001000000000000
+
+    @staticmethod
+    def _user_tag(tag):
+        """ describe a symbol browsed, structures without their template
+
+        :return: the description of the tag, None if the symbol is not an user tag
+        """
+        if not Driver._is_user_symbol(tag['tag_name'], tag['symbol_type']):
+            return None
+        dimension = (tag['symbol_type'] & 0b0110000000000000) >> 13
+
+        if tag['symbol_type'] & 0b1000000000000000:
+            template_instance_id = tag['symbol_type'] & 0b0000111111111111
+            return {'instance_id': tag['instance_id'],
+                    'template_instance_id': template_instance_id,
+                    'tag_name': tag['tag_name'],
+                    'dim': dimension,
+                    'tag_type': 'struct',
+                    'data_type': 'user-created'}
+
+        datatype = tag['symbol_type'] & 0b0000000011111111
+        user_tag = {'instance_id': tag['instance_id'],
+                    'tag_name': tag['tag_name'],
+                    'dim': dimension,
+                    'tag_type': 'atomic',
+                    'data_type': I_DATA_TYPE[datatype]}
+        if datatype == 0xc1:
+            user_tag['bit_position'] = (tag['symbol_type'] & 0b0000011100000000) >> 8
+        return user_tag
+
     def _parse_udt_raw(self, tag):
         try:
-            buff = self._read_template(tag['template_instance_id'], tag['template']['object_definition_size'])
+            buff = self._get_template_definition(tag['template_instance_id'])[1]
             member_count = tag['template']['member_count']
             names = buff.split('\00')
             lst = []
@@ -860,7 +1430,370 @@ class Driver(Base):
         except Exception as e:
             raise DataError(e)
 
-    def get_tag_list(self):
+    def _get_template_definition(self, instance_id):
+        """ return the structure makeup and the raw template of a template object
+
+        The makeup is read once per browse, the template only when the makeup, whose structure handle is a check
+        value of the definition, is not the one cached.
+
+        :param instance_id: the instance of the template object
+        :return: a tuple (structure makeup, raw template)
+        """
+        definition = self._template_definitions.get(instance_id)
+        if definition is not None and instance_id in self._templates_checked:
+            return definition
+
+        makeup = self._get_structure_makeup(instance_id)
+        if 'Error' in makeup:
+            raise DataError("Cannot get the structure makeup of template {0}: {1}".format(instance_id,
+                                                                                        makeup['Error']))
+        makeup = dict(makeup)
+        if definition is None or definition[0] != makeup:
+            definition = (makeup, self._read_template(instance_id, makeup['object_definition_size']))
+            self._template_definitions[instance_id] = definition
+            self._templates.pop(instance_id, None)
+        self._template_handles[makeup['structure_handle']] = instance_id
+        self._templates_checked.add(instance_id)
+        return definition
+
+    def get_template_by_handle(self, handle):
+        """ return the instance of the template object of a structure handle
+
+        Only the templates already read or loaded are known.
+
+        :param handle: the structure handle, as found in the reply of a structure read
+        :return: the template instance, None if the handle is not known
+        """
+        return self._template_handles.get(handle)
+
+    @serialized
+    def save_templates(self, filename):
+        """ save the templates read from the controller, so load_templates can skip reading them again
+
+        :param filename: the path of the json file written
+        """
+        with open(filename, 'w') as f:
+            json.dump({'templates': self._dump_templates()}, f)
+
+    @serialized
+    def load_templates(self, filename):
+        """ load the templates saved by save_templates
+
+        Each template loaded is checked with a read of its structure makeup the first time it is used, it is read
+        again from the controller only when it changed.
+
+        :param filename: the path of the json file
+        :return: the number of templates loaded
+        """
+        try:
+            with open(filename) as f:
+                templates = _from_json(json.load(f))['templates']
+            self._restore_templates(templates)
+        except (IOError, ValueError, KeyError, TypeError) as e:
+            raise DataError("Cannot load the templates from {0}: {1}".format(filename, e))
+        return len(templates)
+
+    def _dump_templates(self):
+        """ return the templates read from the controller in a form json can write
+        """
+        return dict((str(instance_id), {'makeup': makeup, 'raw': raw.encode('hex')})
+                    for instance_id, (makeup, raw) in self._template_definitions.items())
+
+    def _restore_templates(self, templates):
+        """ cache the templates returned by _dump_templates, they are checked the first time they are used
+        """
+        for instance_id, definition in templates.items():
+            makeup = definition['makeup']
+            instance_id = int(instance_id)
+            self._template_definitions[instance_id] = (makeup, definition['raw'].decode('hex'))
+            self._template_handles[makeup['structure_handle']] = instance_id
+            self._templates.pop(instance_id, None)
+            self._templates_checked.discard(instance_id)
+
+    def _get_template(self, instance_id):
+        """ return the definition of a structure, read from the controller the first time
+
+        :param instance_id: the instance of the template object, the low 12 bits of the symbol type
+        :return: a dict with name, handle, size and members. Each member is a dict with name, offset, count,
+                 hidden, and either template (the instance of a nested structure) or codec and bit (the position
+                 of a BOOL in its host SINT, None for the other types)
+        """
+        makeup, raw = self._get_template_definition(instance_id)
+        template = self._templates.get(instance_id)
+        if template is not None:
+            return template
+
+        member_count = makeup['member_count']
+        names = raw[member_count * 8:].split('\x00')
+        members = []
+        for index in range(member_count):
+            info, typ, offset = struct.unpack_from('<HHI', raw, index * 8)
+            name = names[index + 1]
+            member = {'name': name, 'offset': offset, 'count': 1,
+                      'hidden': name.startswith('ZZZZZZZZZZ') or name.startswith('__')}
+            if typ & 0x8000:
+                member['template'] = typ & 0x0fff
+                member['count'] = max(info, 1)
+            else:
+                try:
+                    member['codec'] = DATA_CODEC[typ & 0xff]
+                except KeyError:
+                    raise DataError("Member {0} of template {1} has an unknown type {2:#x}".format(
+                        name, instance_id, typ))
+                if typ & 0x6000:
+                    member['count'] = max(info, 1)
+                member['bit'] = info if (typ & 0xff) == S_DATA_TYPE['BOOL'] and not typ & 0x6000 else None
+            members.append(member)
+
+        template = self._templates[instance_id] = {
+            'name': names[0].split(';')[0],
+            'handle': makeup['structure_handle'],
+            'size': makeup['structure_size'],
+            'members': members,
+        }
+        return template
+
+    def _struct_template(self, tag):
+        """ find the template of a structure tag, following its members
+
+        :return: the template, see _get_template
+        """
+        members = tag.split('.')
+        name = members[0].split('[', 1)[0]
+        if name not in self._symbol_types:
+            self._load_instance_ids()
+        symbol_type = self._symbol_types.get(name)
+        if symbol_type is None or not symbol_type & 0x8000:
+            raise DataError("{0} is not a structure".format(tag))
+        template = self._get_template(symbol_type & 0x0fff)
+        for member_name in members[1:]:
+            member_name = member_name.split('[', 1)[0]
+            for member in template['members']:
+                if member['name'] == member_name:
+                    break
+            else:
+                raise DataError("{0} has no member {1}".format(template['name'], member_name))
+            if 'template' not in member:
+                raise DataError("{0} is not a structure".format(tag))
+            template = self._get_template(member['template'])
+        return template
+
+    @serialized
+    def get_struct_codec(self, tag):
+        """ return the codec of a structure tag, compiled from its template the first time
+
+        :param tag: the name of the structure tag, a member structure or an element of an array of structures
+        :return: the StructCodec decoding and encoding the bytes of the structure
+        """
+        return self._struct_codec(self._struct_template(tag))
+
+    def _struct_codec(self, template):
+        if 'struct_codec' not in template:
+            template['struct_codec'] = StructCodec(template, self._get_template)
+        return template['struct_codec']
+
+    @serialized
+    def read_struct(self, tag, counts=None, columns=False):
+        """ read a structure (UDT) with Read Tag Fragmented and decode it with its template
+
+        The templates are read from the controller the first time a structure type is met and then kept.
+
+        :param tag: the name of the structure tag, a member structure or an element of an array of structures
+        :param counts: None to read one structure, otherwise the number of elements of the array to read
+        :param columns: with counts, decode the array by column: True, 'array' or 'numpy' as the typed argument of
+                        read_array. See StructCodec.decode_columns
+        :return: an OrderedDict of the members, nested structures included, or a list of them if counts is given
+        """
+        template = self._struct_template(tag)
+        codec = self._struct_codec(template)
+        data = self.read_array(tag, counts or 1, raw=True)
+        if data is None:
+            return None
+        if self._array_data_type != STRUCTURE_TYPE or self._struct_handle != template['handle']:
+            raise DataError("{0} is not a {1} structure".format(tag, template['name']))
+        if len(data) < codec.size * (counts or 1):
+            raise DataError("{0} returned {1} bytes, {2} {3} structures need {4}".format(
+                tag, len(data), counts or 1, template['name'], codec.size * (counts or 1)))
+
+        if counts is None:
+            return codec.decode(data)
+        if columns:
+            return codec.decode_columns(data, counts, kind=columns)
+        return codec.decode_array(data, counts)
+
+    @serialized
+    @stale_instance_retry
+    def write_struct(self, tag, value):
+        """ write a structure, or an array of structures, encoded with its template
+
+        All the visible members have to be given, the hidden ones are written as 0 but the BOOL members they host.
+
+        :param tag: the name of the structure tag, a member structure or the first element of an array to write
+        :param value: an OrderedDict or a dict of the members, as read_struct returns it, or a list of them
+        """
+        self.clear()
+        template = self._struct_template(tag)
+        codec = self._struct_codec(template)
+        structures = value if isinstance(value, list) else [value]
+        data = bytearray(codec.size * len(structures))
+        for index, structure in enumerate(structures):
+            codec.encode(structure, data, index * codec.size)
+
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (9, "Target did not connected. write_struct will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. write_struct will not be executed.")
+
+        rp = self._tag_rp(tag)
+        if rp is None:
+            self._status = (9, "Cannot create tag {0} request packet. write_struct will not be executed.".format(tag))
+            return None
+
+        # sequence count, service, path size, request path, data type, structure handle, number of elements, offset
+        room = self._connection_size - 14 - len(rp)
+        self._write_fragments(rp, pack_uint(STRUCTURE_TYPE) + pack_uint(template['handle']), len(structures),
+                              memoryview(data), max(4, room - room % 4))
+
+    def _get_controller_identity(self):
+        """ read the identity object of the controller at the end of the connection path
+
+        :return: the key of the controller in the tag database: vendor, product type, product code, revision and
+                 serial number
+        """
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (10, "Target did not connected. get_tag_list will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. get_tag_list will not be executed.")
+
+        message_request = [
+            pack_uint(self._get_sequence()),
+            chr(TAG_SERVICES_REQUEST['Get Attributes All']),
+            chr(2),                         # Request Path ( 20 01 24 01 )
+            CLASS_ID["8-bit"],
+            CLASS_CODE["Identity Object"],
+            INSTANCE_ID["8-bit"],
+            '\x01'
+        ]
+        if not self.send_unit_data(
+                build_common_packet_format(DATA_ITEM['Connected'], ''.join(message_request),
+                                           ADDRESS_ITEM['Connection Based'], addr_data=self._target_cid,)):
+            raise DataError("Cannot read the identity of the controller: {0}".format(self._status))
+
+        vendor, product_type, product_code, major, minor, status, serial = struct.unpack_from(
+            '<HHHBBHI', self._reply, 50)
+        return '{0}-{1}-{2}-{3}.{4}-{5:08X}'.format(vendor, product_type, product_code, major, minor, serial)
+
+    def _get_symbol_class_attributes(self):
+        """ read the attributes of the symbol object class, they change when tags are created or deleted
+
+        :return: a list with the revision, the max instance and the number of instances, None if the controller
+                 does not answer them
+        """
+        message_request = [
+            pack_uint(self._get_sequence()),
+            chr(TAG_SERVICES_REQUEST['Get Attributes']),
+            chr(3),                         # Request Path ( 20 6B 25 00 00 00 )
+            CLASS_ID["8-bit"],
+            CLASS_CODE["Symbol Object"],
+            INSTANCE_ID["16-bit"],
+            '\x00',
+            pack_uint(0),   # the class
+            pack_uint(3),   # Number of attributes
+            pack_uint(1),   # Revision UINT
+            pack_uint(2),   # Max Instance UINT
+            pack_uint(3)    # Number of Instances UINT
+        ]
+        self._class_attributes_in_progress = True
+        try:
+            if not self.send_unit_data(
+                    build_common_packet_format(DATA_ITEM['Connected'], ''.join(message_request),
+                                               ADDRESS_ITEM['Connection Based'], addr_data=self._target_cid,)):
+                return None
+        finally:
+            self._class_attributes_in_progress = False
+
+        attributes = []
+        for index in range(unpack_uint(self._reply[50:52])):
+            attribute, status, value = struct.unpack_from('<HHH', self._reply, 52 + index * 6)
+            if status != SUCCESS:
+                return None
+            attributes.append(value)
+        return attributes
+
+    def _load_tag_database(self, database, key, symbol_class):
+        """ load the tag list of the controller saved in the database, if the controller did not change
+
+        :return: True if the tag list was loaded
+        """
+        try:
+            with open(database) as f:
+                entry = _from_json(json.load(f))['controllers'][key]
+            if entry['version'] != TAG_DATABASE_VERSION or symbol_class is None or \
+                    entry['symbol_class'] != symbol_class:
+                return False
+            self._instance_ids = {}
+            self._symbol_types = {}
+            for tag_name, (instance, symbol_type) in entry['symbols'].items():
+                self._learn_symbol(tag_name, instance, symbol_type)
+            self._restore_templates(entry['templates'])
+            for tag in entry['tag_list']:
+                if 'udt' in tag and 'data_type' in tag['udt']:
+                    tag['udt']['data_type'] = [tuple(member) for member in tag['udt']['data_type']]
+            self._tag_list = entry['tag_list']
+        except (IOError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("Tag database {0} not used: {1}".format(database, e))
+            return False
+        self._instance_ids_loaded = True
+        self._instance_ids_version += 1
+        return True
+
+    def _save_tag_database(self, database, key, symbol_class):
+        """ save the tag list browsed in the database, next to the tag lists of the other controllers
+        """
+        controllers = {}
+        try:
+            with open(database) as f:
+                controllers = json.load(f)['controllers']
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+        controllers[key] = {
+            'version': TAG_DATABASE_VERSION,
+            'symbol_class': symbol_class,
+            'symbols': dict((tag_name, (self._instance_ids[tag_name], self._symbol_types[tag_name]))
+                            for tag_name in self._instance_ids),
+            'templates': self._dump_templates(),
+            'tag_list': self._tag_list,
+        }
+        temporary = database + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'controllers': controllers}, f)
+        try:
+            os.rename(temporary, database)
+        except OSError:
+            # windows does not replace a file by rename
+            os.remove(database)
+            os.rename(temporary, database)
+
+    @serialized
+    def get_tag_list(self, database=None):
+        """ browse the controller scope tags, with their templates
+
+        With a database the tag list is saved in a json file, keyed by the identity of the controller, and loaded
+        from it the next time. The controller is browsed again only when the attributes of its symbol object class,
+        the number of tags and the highest instance, changed. The templates loaded are checked with their structure
+        makeup the first time read_struct uses them.
+
+        :param database: optional path of the json file keeping the tag lists
+        :return: the list of the user tags
+        """
+        if database is not None:
+            key = self._get_controller_identity()
+            symbol_class = self._get_symbol_class_attributes()
+            if self._load_tag_database(database, key, symbol_class):
+                return self._tag_list
+
         self._tag_list = []
         # Step 1
         self._get_instance_attribute_list_service()
@@ -868,10 +1801,11 @@ class Driver(Base):
         # Step 2
         self._isolating_user_tag()
 
-        # Step 3
+        # Step 3, each template is checked once per browse and read again only when it changed
+        self._templates_checked.clear()
         for tag in self._tag_list:
             if tag['tag_type'] == 'struct':
-                tag['template'] = self._get_structure_makeup(tag['template_instance_id'])
+                tag['template'] = dict(self._get_template_definition(tag['template_instance_id'])[0])
 
         for idx, tag in enumerate(self._tag_list):
             # print (tag)
@@ -879,34 +1813,601 @@ class Driver(Base):
                 self._parse_udt_raw(tag)
 
         # Step 4
+        if database is not None:
+            self._save_tag_database(database, key, symbol_class)
 
         return self._tag_list
 
+    def iter_tag_list(self):
+        """ browse the controller scope tags, yielding each tag as soon as the page holding it is received
+
+        Only one page of symbols is kept in memory, the symbol instances used by the 'instance addressing' attribute
+        are not learnt from it. The structure tags are StructTag: their template is read, once per browse, when
+        their key 'template' or 'udt' is first used. The driver is free between two pages, other services can run
+        while the tags are consumed.
+
+        :return: a generator of the user tags, as get_tag_list returns them
+        """
+        with self._lock:
+            self._templates_checked.clear()
+        instance = 0
+        while instance != -1:
+            symbols, instance = self._get_symbol_page(instance)
+            for symbol in symbols:
+                user_tag = self._user_tag(symbol)
+                if user_tag is None:
+                    continue
+                if user_tag['tag_type'] == 'struct':
+                    user_tag = StructTag(self, user_tag)
+                yield user_tag
+
+    @serialized
+    def _resolve_struct_tag(self, tag):
+        """ fill the template and the udt of a StructTag
+        """
+        dict.__setitem__(tag, 'template', dict(self._get_template_definition(tag['template_instance_id'])[0]))
+        dict.__setitem__(tag, 'udt', {})
+        try:
+            self._parse_udt_raw(tag)
+        except DataError:
+            del tag['template'], tag['udt']
+            raise
+
+    @serialized
     def write_string(self, tag, value, size=82):
         """
             Rockwell define different string size:
                 STRING  STRING_12   STRING_16   STRING_20   STRING_40   STRING_8
             by default we assume size 82 (STRING)
+
+            The characters used and LEN are written together in one multiple service packet.
+
+            :return: True if both DATA and LEN have been written
+        """
+        self.clear()
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (8, "Target did not connected. write_string will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. write_string will not be executed.")
+
+        message = self._build_write_string_request(tag, value, size)
+        if self.send_unit_data(message) is None:
+            raise DataError("send_unit_data returned not valid data")
+        return self._parse_write_string_reply(tag, value)
+
+    def _build_write_string_services(self, tag, value, size):
+        """ build the Write Tag services of a string: the characters from DATA[0] and then LEN
+
+        :return: the list of the service requests
         """
         if size not in string_sizes:
             raise DataError("String size is incorrect")
+        if len(value) > size:
+            raise DataError("String {0} is longer than {1} characters".format(tag, size))
+
+        services = []
+        if value:
+            rp = self._tag_rp("{0}.DATA[0]".format(tag), multi_requests=True)
+            if rp is None:
+                self._status = (8, "Cannot create tag {0} request packet. write_string will not be executed.".format(tag))
+                raise DataError("Cannot create tag {0} request packet. write_string will not be executed.".format(tag))
+            services.append(chr(TAG_SERVICES_REQUEST['Write Tag']) + rp + pack_uint(S_DATA_TYPE['SINT'])
+                            + pack_uint(len(value)) + value)
+
+        rp = self._tag_rp("{0}.LEN".format(tag), multi_requests=True)
+        if rp is None:
+            self._status = (8, "Cannot create tag {0} request packet. write_string will not be executed.".format(tag))
+            raise DataError("Cannot create tag {0} request packet. write_string will not be executed.".format(tag))
+        services.append(chr(TAG_SERVICES_REQUEST['Write Tag']) + rp + pack_uint(S_DATA_TYPE['DINT'])
+                        + pack_uint(1) + pack_dint(len(value)))
+        return services
+
+    def _build_write_string_request(self, tag, value, size=82):
+        """ build the connected message of a write_string
+
+        :return: the message ready for send_unit_data
+        """
+        return self._build_multiple_service_request(self._build_write_string_services(tag, value, size))
+
+    def _parse_write_string_reply(self, tag, value):
+        """ check the reply of a write_string
+
+        :return: True if all the services succeeded
+        """
+        writes = [("{0}.LEN".format(tag), len(value), 'DINT')]
+        if value:
+            writes.insert(0, ("{0}.DATA".format(tag), value, 'SINT'))
+        for write in self._parse_multiple_request_write(writes):
+            if write[-1] != 'GOOD':
+                self._status = (8, "write_string of {0} failed writing {1}".format(tag, write[0]))
+                logger.warning(self._status)
+                return False
+        return True
+
+    @serialized
+    def write_strings(self, values, size=82):
+        """ write many strings packing the writes in the fewest multiple service packets
+
+        The characters and LEN of each string go in the same packet.
+
+        :param values: a dict {tag: string} or a list of tuple (tag, string)
+        :param size: the size of the strings, see write_string
+        :return: a list of tuple (tag name, string, 'STRING', 'GOOD'), 'BAD' instead of 'GOOD' if the write failed
+        """
+        self.clear()
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (8, "Target did not connected. write_strings will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. write_strings will not be executed.")
+
+        values = self._string_items(values)
+        tag_list = [None] * len(values)
+        for indexes in self._send_plan(self._plan_write_strings(values, size)):
+            self._parse_write_strings_reply(values, indexes, tag_list)
+        return tag_list
+
+    def _string_items(self, values):
+        """ return the list of tuple (tag, string) passed to write_strings as a dict or a list
+        """
+        if isinstance(values, dict):
+            return values.items()
+        return list(values)
+
+    def _plan_write_strings(self, values, size):
+        """ split the writes of write_strings in multiple service packets
 
-        data_tag = ".".join((tag, "DATA"))
-        len_tag = ".".join((tag, "LEN"))
+        :return: a list of tuple (indexes of the strings, message ready for send_unit_data) for each packet
+        """
+        items = []
+        for tag, value in values:
+            services = self._build_write_string_services(tag, value, size)
+            items.append((services, WRITE_REPLY_SIZE * len(services)))
+        return self._plan_multiple_service(items)
+
+    def _parse_write_strings_reply(self, values, indexes, tag_list):
+        """ store in tag_list the status of the strings written by one packet
+        """
+        replies = iter(self._multiple_service_replies())
+        for index in indexes:
+            tag, value = values[index]
+            good = True
+            for service in range(2 if value else 1):
+                start, status = next(replies, (None, None))
+                good = good and status == SUCCESS
+            tag_list[index] = (tag, value, 'STRING', 'GOOD' if good else 'BAD')
+
+    @serialized
+    def read_strings(self, tags):
+        """ read many strings packing the reads in the fewest multiple service packets
+
+        :param tags: the list of the string tags
+        :return: a list of tuple (tag name, string, 'STRING'), (tag name, None, None) if the read failed
+        """
+        self.clear()
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (6, "Target did not connected. read_strings will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. read_strings will not be executed.")
 
-        # create an empty array
-        data_to_send = [0] * size
-        for idx, val in enumerate(value):
-            data_to_send[idx] = ord(val)
+        tag_list = [None] * len(tags)
+        for indexes in self._send_plan(self._plan_read_strings(tags)):
+            self._parse_read_strings_reply(tags, indexes, tag_list)
+        return tag_list
 
-        self.write_tag(len_tag, len(value), 'DINT')
-        self.write_array(data_tag, data_to_send, 'SINT')
+    def _plan_read_strings(self, tags):
+        """ split the reads of read_strings in multiple service packets
+
+        :return: a list of tuple (indexes of the tags, message ready for send_unit_data) for each packet
+        """
+        return self._plan_multiple_service(
+            [([service], READ_REPLY_OVERHEAD + string_value_size) for service in self._build_read_services(tags)])
+
+    def _parse_read_strings_reply(self, tags, indexes, tag_list):
+        """ store in tag_list the strings read by one packet
+        """
+        for index, (start, status) in zip(indexes, self._multiple_service_replies()):
+            value = None
+            if status == SUCCESS:
+                try:
+                    value = self._unpack_string(self._reply, start + 4, tags[index])
+                except DataError:
+                    pass
+            if value is None:
+                tag_list[index] = (tags[index], None, None)
+            else:
+                tag_list[index] = (tags[index], value, 'STRING')
+
+    @serialized
+    def read_string(self, tag):
+        """ read a string with one Read Tag of the whole structure
+
+        :return: the string, None in case of error
+        """
+        self.clear()
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (6, "Target did not connected. read_string will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. read_string will not be executed.")
+
+        message = self._build_read_tag_request(tag)
+        if message is None:
+            return None
+        if self.send_unit_data(message) is None:
+            raise DataError("send_unit_data returned not valid data")
+        return self._parse_read_string_reply(tag)
+
+    def _parse_read_string_reply(self, tag):
+        """ parse the reply of a read_string
+
+        :return: the string, None in case of error
+        """
+        if self._status[0] != SUCCESS:
+            return None
+        return self._unpack_string(self._reply, 50, tag)
+
+    def _unpack_string(self, reply, start, tag):
+        """ extract the string read as a structure: data type, structure handle, LEN (DINT) and DATA
+
+        :param reply: the reply received
+        :param start: where the data type of the value begins
+        :param tag: the tag read, for the error messages
+        :return: the string
+        """
+        try:
+            if unpack_uint(reply[start:start+2]) != STRUCTURE_TYPE:
+                raise DataError("{0} is not a string".format(tag))
+            length = unpack_dint(reply[start+4:start+8])
+            data = reply[start+8:start+8+length]
+            if length < 0 or len(data) < length:
+                raise DataError("{0} has a not valid LEN {1}".format(tag, length))
+            return data.tobytes()
+        except DataError as e:
+            self._status = (6, str(e))
+            logger.warning(self._status)
+            raise
+        except Exception as e:
+            raise DataError(e)
+
+
+class PreparedRequest(object):
+    """ A request of many tags encoded once in complete send_unit_data messages
+
+    At each execution only the session handle, the connection id and the sequence count are patched in the
+    messages. The messages are encoded again when the connection size or the symbol instances change. The
+    subclasses define _items, returning the items to pack in multiple service packets, see
+    Driver._plan_multiple_service.
+    """
+    def __init__(self, driver, tags):
+        self.driver = driver
+        self.tags = list(tags)
+        self._frames = []               # list of [indexes of the tags, message, data used to parse the reply]
+        self._encoded_for = None        # the connection size and the version of the symbol instances
+
+    def _frame_data(self, indexes, frame):
+        """ return what execute needs about a message, computed once when the message is encoded
+        """
+        return None
+
+    def _encode(self):
+        driver = self.driver
+        self._frames = []
+        for indexes, message in driver._plan_multiple_service(self._items()):
+            frame = bytearray(driver.build_header(ENCAPSULATION_COMMAND["send_unit_data"], len(message)) + message)
+            self._frames.append([indexes, frame, self._frame_data(indexes, frame)])
+        self._encoded_for = (driver.get_connection_size(), driver._instance_ids_version)
+
+    def _connect(self, operation):
+        """ forward open if the target is not connected, then encode the messages for the connection size
+
+        The driver lock must be held.
+        """
+        driver = self.driver
+        driver.clear()
+        driver._suspect_symbols = {}
+        if not driver._target_is_connected:
+            if not driver.forward_open():
+                driver._status = (6, "Target did not connected. {0} will not be executed.".format(operation))
+                logger.warning(driver._status)
+                raise DataError("Target did not connected. {0} will not be executed.".format(operation))
+        if driver.attribs['instance addressing'] and not driver._instance_ids_loaded:
+            driver._load_instance_ids()
+        if self._encoded_for != (driver.get_connection_size(), driver._instance_ids_version):
+            self._encode()
+
+    def _run(self, operation, method, *args):
+        """ connect and run the method, once more when a path error showed that the symbol instances used are stale
+
+        The second run encodes the messages again with the instances loaded again, as stale_instance_retry does for
+        the methods of Driver. The driver lock must be held.
+        """
+        self._connect(operation)
+        try:
+            result = method(*args)
+        except DataError:
+            if not self.driver._symbols_moved():
+                raise
+        else:
+            if not self.driver._symbols_moved():
+                return result
+        logger.warning("Symbol instances stale, the prepared {0} is executed again".format(operation))
+        self._connect(operation)
+        return method(*args)
+
+    def _send(self):
+        """ send the messages, pipelined when the 'pipeline window' attribute allows it
+
+        This is a generator: when a frame is yielded, its reply is in driver._reply. The driver lock must be held.
+        """
+        driver = self.driver
+        for indexes, frame, data in self._frames:
+            struct.pack_into('<I', frame, 4, driver._session)
+            frame[36:40] = driver._target_cid
+            struct.pack_into('<H', frame, 44, driver._get_sequence())
+
+        if driver.attribs['pipeline window'] > 1 and len(self._frames) > 1:
+            replies = driver.send_frames_pipelined([frame for indexes, frame, data in self._frames])
+            for item, reply in zip(self._frames, replies):
+                driver._reply = reply
+                driver._check_reply()
+                yield item
+        else:
+            for item in self._frames:
+                if driver.send_frame(item[1]) is None:
+                    raise DataError("send_unit_data returned not valid data")
+                yield item
+
+
+class PreparedRead(PreparedRequest):
+    """ The read of a list of tags prepared by Driver.prepare_read
+    """
+    def _items(self):
+        driver = self.driver
+        return [([service], READ_REPLY_OVERHEAD + driver._expected_read_size(tag))
+                for service, tag in zip(driver._build_read_services(self.tags), self.tags)]
+
+    def _frame_data(self, indexes, frame):
+        return [self.tags[i] for i in indexes]
+
+    def execute(self):
+        """ read the tags
+
+        :return: the list of tuple (tag, value, type) in the order of the tags, see Driver.read_tag
+        """
+        with self.driver._lock:
+            return self._run('read_tag', self._read)
+
+    def _read(self):
+        tag_list = [None] * len(self.tags)
+        for indexes, frame, tags in self._send():
+            for index, read in zip(indexes, self.driver._parse_multiple_request_read(tags)):
+                tag_list[index] = read
+        return tag_list
+
+
+class PreparedWrite(PreparedRequest):
+    """ The write of a list of tags prepared by Driver.prepare_write, the values are packed in place at each
+    execution
+    """
+    def __init__(self, driver, tags, types=None):
+        super(PreparedWrite, self).__init__(driver, tags)
+        if types is None:
+            types = [None] * len(self.tags)
+        if len(types) != len(self.tags):
+            raise DataError("prepare_write needs one type for each tag")
+        missing = [tag for tag, typ in zip(self.tags, types) if typ is None and driver.get_tag_type(tag) is None]
+        if missing:
+            driver.read_tag(missing)
+        self.types = [typ or driver.get_tag_type(tag) for tag, typ in zip(self.tags, types)]
+        try:
+            self._codecs = [get_codec(typ) for typ in self.types]
+        except LookupError:
+            raise DataError("prepare_write cannot write the types {0}".format(self.types))
+
+    def _items(self):
+        items = []
+        for tag, typ, codec in zip(self.tags, self.types, self._codecs):
+            rp = self.driver._tag_rp(tag, multi_requests=True)
+            if rp is None:
+                raise DataError("Cannot create tag {0} request packet. write_tag will not be executed.".format(tag))
+            service = chr(TAG_SERVICES_REQUEST['Write Tag']) + rp + pack_uint(S_DATA_TYPE[typ]) + pack_uint(1) + \
+                codec.pack(0)
+            items.append(([service], WRITE_REPLY_SIZE))
+        return items
+
+    def _frame_data(self, indexes, frame):
+        """ locate the value of each service in the message
+
+        :return: a list of tuple (index of the tag, offset of its value)
+        """
+        # the number of services follows the sequence count and the multiple service path, the offsets of the
+        # services count from there. The value is the end of each service
+        count = HEADER_SIZE + 28
+        starts = [count + unpack_uint(frame[count+2+2*k:count+4+2*k]) for k in range(len(indexes))] + [len(frame)]
+        return [(index, starts[k+1] - self._codecs[index].size) for k, index in enumerate(indexes)]
+
+    def execute(self, values):
+        """ write the values
+
+        :param values: the values, in the order of the tags
+        :return: the list of tuple (tag, value, type, 'GOOD' or 'BAD') in the order of the tags
+        """
+        if len(values) != len(self.tags):
+            raise DataError("execute needs one value for each tag")
+        with self.driver._lock:
+            return self._run('write_tag', self._write, values)
+
+    def _write(self, values):
+        # the messages may have been encoded again, the values are packed in the current ones
+        try:
+            for indexes, frame, offsets in self._frames:
+                for index, offset in offsets:
+                    self._codecs[index].pack_into(frame, offset, values[index])
+        except struct.error as e:
+            raise DataError(e)
+
+        tag_list = [None] * len(self.tags)
+        for indexes, frame, offsets in self._send():
+            for index, (start, status) in zip(indexes, self.driver._multiple_service_replies()):
+                self.driver._check_path_error(self.tags[index], status)
+                tag_list[index] = (self.tags[index], values[index], self.types[index],
+                                   'GOOD' if status == SUCCESS else 'BAD')
+        return tag_list
+
+
+def _blocking_only(name):
+    """ a method of Driver that needs the blocking socket, AsyncDriver refuses it
+    """
+    def method(self, *args, **kwargs):
+        self._status = (3, "{0} is not supported by AsyncDriver, use Driver".format(name))
+        raise DataError("{0} is not supported by AsyncDriver, use Driver".format(name))
+    method.__name__ = name
+    return method
+
+
+class AsyncDriver(AsyncBase, Driver):
+    """
+    The same client of Driver running on a non blocking socket, so that one thread can drive many PLCs.
+
+    open, close, register_session, forward_open, read_tag, read_array, write_tag, read_string, write_string,
+    read_strings and write_strings take the same arguments of the Driver methods, but they queue the operation and return a pycomm.cip.cip_async.Future. The event loop has
+    to run (pycomm.cip.cip_async.loop or wait) for the operations to progress.
+
+    write_array, read_struct, write_struct, get_tag_list, iter_tag_list, prepare_read and prepare_write are not
+    supported, they raise DataError.
+    """
+
+    def __init__(self, sock_map=None, timeout=5.0):
+        super(AsyncDriver, self).__init__(sock_map, timeout)
+
+    write_array = _blocking_only('write_array')
+    read_struct = _blocking_only('read_struct')
+    write_struct = _blocking_only('write_struct')
+    get_tag_list = _blocking_only('get_tag_list')
+    iter_tag_list = _blocking_only('iter_tag_list')
+    prepare_read = _blocking_only('prepare_read')
+    prepare_write = _blocking_only('prepare_write')
+
+    def _load_instance_ids(self):
+        # the browse cannot run inside an operation, the tags without a known instance are addressed by name
+        self._instance_ids_loaded = True
+
+    def _suspect_symbol(self, tag_name):
+        # the symbol cannot be checked inside an operation, it is addressed by name from now on
+        self._instance_ids.pop(tag_name, None)
+
+    def read_tag(self, tag):
+        return self._queue(self._read_tag(tag))
+
+    def _read_tag(self, tag):
+        self.clear()
+        yield self._connect_target(6, 'read_tag')
+
+        if isinstance(tag, list):
+            tag_list = [None] * len(tag)
+            for indexes, message in self._plan_read_tag(tag):
+                yield self._send_unit_data(message)
+                for index, read in zip(indexes, self._parse_multiple_request_read([tag[i] for i in indexes])):
+                    tag_list[index] = read
+            raise Return(tag_list)
+
+        message = self._build_read_tag_request(tag)
+        if message is None:
+            raise Return(None)
+
+        yield self._send_unit_data(message)
+        raise Return(self._parse_read_tag_reply(tag))
 
     def read_string(self, tag):
-        data_tag = ".".join((tag, "DATA"))
-        len_tag = ".".join((tag, "LEN"))
-        length = self.read_tag(len_tag)
-        values = self.read_array(data_tag, length[0])
-        values = [val[1] for val in values]
-        char_array = [chr(ch) for ch in values]
-        return ''.join(char_array)
+        return self._queue(self._read_string(tag))
+
+    def _read_string(self, tag):
+        self.clear()
+        yield self._connect_target(6, 'read_string')
+
+        message = self._build_read_tag_request(tag)
+        if message is None:
+            raise Return(None)
+
+        yield self._send_unit_data(message)
+        raise Return(self._parse_read_string_reply(tag))
+
+    def write_string(self, tag, value, size=82):
+        return self._queue(self._write_string(tag, value, size))
+
+    def _write_string(self, tag, value, size):
+        self.clear()
+        yield self._connect_target(8, 'write_string')
+
+        yield self._send_unit_data(self._build_write_string_request(tag, value, size))
+        raise Return(self._parse_write_string_reply(tag, value))
+
+    def read_strings(self, tags):
+        return self._queue(self._read_strings(tags))
+
+    def _read_strings(self, tags):
+        self.clear()
+        yield self._connect_target(6, 'read_strings')
+
+        tag_list = [None] * len(tags)
+        for indexes, message in self._plan_read_strings(tags):
+            yield self._send_unit_data(message)
+            self._parse_read_strings_reply(tags, indexes, tag_list)
+        raise Return(tag_list)
+
+    def write_strings(self, values, size=82):
+        return self._queue(self._write_strings(values, size))
+
+    def _write_strings(self, values, size):
+        self.clear()
+        yield self._connect_target(8, 'write_strings')
+
+        values = self._string_items(values)
+        tag_list = [None] * len(values)
+        for indexes, message in self._plan_write_strings(values, size):
+            yield self._send_unit_data(message)
+            self._parse_write_strings_reply(values, indexes, tag_list)
+        raise Return(tag_list)
+
+    def read_array(self, tag, counts, raw=False, typed=False):
+        return self._queue(self._read_array(tag, counts, raw, typed))
+
+    def _read_array(self, tag, counts, raw, typed):
+        self.clear()
+        yield self._connect_target(7, 'read_tag')
+
+        self._init_read_array(raw, typed)
+
+        rp = self._tag_rp(tag)
+        if rp is None:
+            self._status = (7, "Cannot create tag {0} request packet. read_tag will not be executed.".format(tag))
+            raise Return(None)
+
+        while self._byte_offset != -1:
+            if not (yield self._send_unit_data(self._build_read_fragment_request(rp, counts, self._byte_offset))):
+                raise DataError("send_unit_data returned not valid data")
+
+        raise Return(self._read_array_result(raw, typed))
+
+    def write_tag(self, tag, value=None, typ=None):
+        return self._queue(self._write_tag(tag, value, typ))
+
+    def _write_tag(self, tag, value, typ):
+        self.clear()
+        yield self._connect_target(8, 'write_tag')
+
+        missing = self._tags_without_type(tag, typ)
+        if missing:
+            yield self._read_tag(missing)
+            self.clear()
+        tag, value, typ = self._infer_write_type(tag, value, typ)
+
+        message = self._build_write_tag_request(tag, value, typ)
+        if message is None:
+            raise Return(None)
+
+        ret_val = yield self._send_unit_data(message)
+        raise Return(self._parse_write_tag_reply(tag, ret_val))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# l5x.py - Tags and data types of a ControlLogix project read from its L5X export
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+The L5X export of a Studio 5000 project describes the controller scope tags and the user data types without any
+request to the controller. The file is parsed as a stream, the tag values it holds are skipped:
+
+    from pycomm.ab_comm.clx import Driver
+
+    c = Driver()
+    c.open('192.168.1.10')
+    project = c.load_l5x('Line2.L5X')
+    print project.tags[0], project.templates['Recipe']['size']
+
+The offsets of the members follow the layout of the controller: every member aligned to its size, the arrays to
+4 bytes, the BOOL members packed in the hidden SINT the export names, the size of a structure rounded to 4 bytes,
+8 when it holds a 64 bits member.
+"""
+import re
+
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+from pycomm.cip.cip_base import DataError, DATA_CODEC
+from pycomm.cip.cip_const import S_DATA_TYPE
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+_dimensions = re.compile(r'[ ,]+')
+
+# The atomic data types of the controller, STRING is a structure
+ATOMIC_TYPES = ('BOOL', 'SINT', 'INT', 'DINT', 'LINT', 'USINT', 'UINT', 'UDINT', 'ULINT', 'REAL', 'LREAL', 'DWORD')
+
+# The predefined structures, not in the export: member name, data type, dimension, host member and bit
+PREDEFINED_TYPES = {
+    'STRING': [('LEN', 'DINT', 0, None, None), ('DATA', 'SINT', 82, None, None)],
+    'TIMER': [('CTL', 'DINT', 0, None, None), ('PRE', 'DINT', 0, None, None), ('ACC', 'DINT', 0, None, None),
+              ('EN', 'BIT', 0, 'CTL', 31), ('TT', 'BIT', 0, 'CTL', 30), ('DN', 'BIT', 0, 'CTL', 29)],
+    'COUNTER': [('CTL', 'DINT', 0, None, None), ('PRE', 'DINT', 0, None, None), ('ACC', 'DINT', 0, None, None),
+                ('CU', 'BIT', 0, 'CTL', 31), ('CD', 'BIT', 0, 'CTL', 30), ('DN', 'BIT', 0, 'CTL', 29),
+                ('OV', 'BIT', 0, 'CTL', 28), ('UN', 'BIT', 0, 'CTL', 27)],
+    'CONTROL': [('CTL', 'DINT', 0, None, None), ('LEN', 'DINT', 0, None, None), ('POS', 'DINT', 0, None, None),
+                ('EN', 'BIT', 0, 'CTL', 31), ('EU', 'BIT', 0, 'CTL', 30), ('DN', 'BIT', 0, 'CTL', 29),
+                ('EM', 'BIT', 0, 'CTL', 28), ('ER', 'BIT', 0, 'CTL', 27), ('UL', 'BIT', 0, 'CTL', 26),
+                ('IN', 'BIT', 0, 'CTL', 25), ('FD', 'BIT', 0, 'CTL', 24)],
+}
+# the members hidden by the controller
+_HIDDEN = set(['CTL'])
+
+
+class L5X(object):
+    """ The controller scope tags and the structures of an L5X export
+
+    The tags are dicts as clx.Driver.get_tag_list returns them, plus 'dimensions', the list of the size of each
+    dimension. The templates are dicts as the driver decodes them for read_struct, indexed by the name of the data
+    type, with the nested structures referred by name and the handle None. StructCodec(template, templates.get)
+    decodes the bytes of a structure with them.
+    """
+    def __init__(self):
+        self.controller = None
+        self.tags = []
+        self.templates = {}
+        self._data_types = dict(PREDEFINED_TYPES)
+        self._unknown = set()
+
+    def _template(self, name, pending=()):
+        """ build the template of a data type from its members, the first time it is needed
+
+        :return: the template, None if the data type is not defined by the export nor predefined
+        """
+        if name in self.templates:
+            return self.templates[name]
+        if name not in self._data_types or name in pending or name in self._unknown:
+            return None
+
+        members = []
+        hosts = {}
+        offset = 0
+        alignment = 4
+        for member_name, data_type, dimension, target, bit in self._data_types[name]:
+            if data_type == 'BIT':
+                host = hosts.get(target)
+                if host is None:
+                    raise DataError("Member {0} of {1} is in the unknown member {2}".format(member_name, name, target))
+                members.append({'name': member_name, 'offset': host['offset'] + bit // 8, 'count': 1,
+                                'hidden': False, 'codec': DATA_CODEC[S_DATA_TYPE['BOOL']], 'bit': bit % 8})
+                continue
+
+            member = {'name': member_name, 'count': max(dimension, 1),
+                      'hidden': member_name.startswith('ZZZZZZZZZZ') or member_name in _HIDDEN}
+            if data_type == 'BOOL' and dimension:
+                # BOOL arrays are stored in DWORDs
+                data_type = 'DWORD'
+                member['count'] = -(-dimension // 32)
+            if data_type in ATOMIC_TYPES:
+                member['codec'] = DATA_CODEC[S_DATA_TYPE[data_type]]
+                member['bit'] = None
+                size = align = member['codec'].size
+            else:
+                nested = self._template(data_type, pending + (name,))
+                if nested is None:
+                    logger.warning("Data type {0} of {1}.{2} is not known, {1} has no template".format(
+                        data_type, name, member_name))
+                    self._unknown.add(name)
+                    return None
+                member['template'] = data_type
+                size, align = nested['size'], nested['alignment']
+            if dimension:
+                align = max(align, 4)
+            offset = -(-offset // align) * align
+            member['offset'] = offset
+            offset += size * member['count']
+            alignment = max(alignment, align)
+            hosts[member_name] = member
+            members.append(member)
+
+        template = self.templates[name] = {
+            'name': name,
+            'handle': None,
+            'size': -(-offset // alignment) * alignment,
+            'alignment': alignment,
+            'members': members,
+        }
+        return template
+
+    def _add_tag(self, name, data_type, dimensions):
+        tag = {'tag_name': name,
+               'dim': len(dimensions),
+               'dimensions': dimensions}
+        if data_type in ATOMIC_TYPES:
+            tag['tag_type'] = 'atomic'
+            tag['data_type'] = data_type
+            if data_type == 'BOOL':
+                tag['bit_position'] = 0
+        else:
+            tag['tag_type'] = 'struct'
+            tag['data_type'] = 'user-created'
+            template = self._template(data_type)
+            tag['udt'] = {'name': data_type}
+            if template is not None:
+                visible = [m for m in template['members'] if not m['hidden']]
+                tag['template'] = {'structure_size': template['size'], 'member_count': len(template['members'])}
+                tag['udt']['internal_tags'] = [m['name'] for m in visible]
+                tag['udt']['data_type'] = [(m['count'] if m['count'] > 1 else 0,
+                                            m['template'] if 'template' in m else m['codec'].name, m['offset'])
+                                           for m in visible]
+        self.tags.append(tag)
+
+    def tag_types(self):
+        """ return the atomic type of the tags and of the members of the structure tags, arrays excluded
+
+        :return: a dict tag name -> data type, as clx.Driver.get_tag_type returns them
+        """
+        types = {}
+
+        def add(name, template):
+            for member in template['members']:
+                if member['hidden'] or member['count'] > 1:
+                    continue
+                if 'template' in member:
+                    add(name + '.' + member['name'], self.templates[member['template']])
+                else:
+                    types[name + '.' + member['name']] = member['codec'].name
+
+        for tag in self.tags:
+            if tag['dim']:
+                continue
+            if tag['tag_type'] == 'atomic':
+                types[tag['tag_name']] = tag['data_type']
+            elif tag['udt']['name'] in self.templates:
+                add(tag['tag_name'], self.templates[tag['udt']['name']])
+        return types
+
+
+def load_l5x(filename):
+    """ parse an L5X export with a streaming parser
+
+    Only the controller scope tags are kept, like get_tag_list does. The alias tags and the tags of the add-on
+    instructions and of the module defined types, whose layout is not in the export, have no template.
+
+    :param filename: the path of the L5X file, or a file object
+    :return: the L5X
+    """
+    project = L5X()
+    data_type = None
+    path = []
+    parents = []    # the elements open, a processed element is removed from its parent
+    tags = []
+    try:
+        for event, element in ElementTree.iterparse(filename, events=('start', 'end')):
+            if event == 'start':
+                path.append(element.tag)
+                parents.append(element)
+                if element.tag == 'Controller':
+                    project.controller = element.get('Name')
+                elif element.tag == 'DataType' and path[-2:-1] == ['DataTypes']:
+                    data_type = project._data_types[element.get('Name')] = []
+                continue
+
+            path.pop()
+            parents.pop()
+            if element.tag == 'Member' and data_type is not None and path[-1:] == ['Members']:
+                bit = element.get('BitNumber')
+                data_type.append((element.get('Name'), element.get('DataType'),
+                                  int(element.get('Dimension', '0')), element.get('Target'),
+                                  None if bit is None else int(bit)))
+            elif element.tag == 'DataType':
+                data_type = None
+            elif element.tag == 'Tag' and path[-2:] == ['Controller', 'Tags'] and \
+                    element.get('TagType', 'Base') != 'Alias':
+                dimensions = element.get('Dimensions', '').strip()
+                tags.append((element.get('Name'), element.get('DataType'),
+                             [int(d) for d in _dimensions.split(dimensions)] if dimensions else []))
+            if element.tag in ('Tag', 'DataType', 'Program', 'AddOnInstructionDefinition', 'Module'):
+                element.clear()
+                if parents:
+                    parents[-1].remove(element)
+    except (IOError, SyntaxError) as e:
+        # cElementTree raises a SyntaxError subclass for the malformed files
+        raise DataError("Cannot parse the L5X file {0}: {1}".format(filename, e))
+
+    for name, typ, dimensions in tags:
+        project._add_tag(name, typ, dimensions)
+    for name in list(project._data_types):
+        project._template(name)
+    return project
@@ -24,6 +24,11 @@
 # SOFTWARE.
 #
 from pycomm.cip.cip_base import *
+try:
+    from pycomm.cip.cip_async import AsyncBase, Return
+except ImportError:
+    # asyncore is missing, only the asynchronous driver needs it
+    AsyncBase, Return = AsyncUnavailable, None
 import re
 import math
 #import binascii
@@ -163,6 +168,8 @@ class Driver(Base):
 
         self.__version__ = '0.1'
         self._last_sequence = 0
+        # SLC and PLC-5 do not know the Large Forward Open
+        self.attribs['connection size'] = CONNECTION_PARAMETER['Default'] & MAX_FORWARD_OPEN_SIZE
 
     def _check_reply(self):
         """
@@ -225,9 +232,18 @@ class Driver(Base):
 
         :return: None is returned in case of error
         """
+        if self.send_unit_data(self._build_queue_data_available(queue_number)):
+            return self._queue_data_available_reply()
+        else:
+            raise DataError("read_queue [send_unit_data] returned not valid data")
 
+    def _build_queue_data_available(self, queue_number):
+        """ build the message to read the next record of the queue
+
+        :return: the message ready for send_unit_data
+        """
         # Creating the Message Request Packet
-        self._last_sequence = pack_uint(Base._get_sequence())
+        self._last_sequence = pack_uint(self._get_sequence())
 
         #  PCCC_Cmd_Rd_w3_Q2 = [0x0f, 0x00, 0x30, 0x00, 0xa2, 0x6d, 0x00, 0xa5, 0x02, 0x00]
         message_request = [
@@ -250,32 +266,44 @@ class Driver(Base):
             pack_uint(queue_number)
         ]
 
-        if self.send_unit_data(
-            build_common_packet_format(
-                DATA_ITEM['Connected'],
-                ''.join(message_request),
-                ADDRESS_ITEM['Connection Based'],
-                addr_data=self._target_cid,)):
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,)
 
-            sts = int(unpack_uint(self._reply[2:4]))
-            if sts == 146:
-                return True
-            else:
-                return False
+    def _queue_data_available_reply(self):
+        """ check if the reply to the queue read carries a record
+
+        :return: True if a record has been returned
+        """
+        sts = int(unpack_uint(self._reply[2:4]))
+        if sts == 146:
+            return True
         else:
-            raise DataError("read_queue [send_unit_data] returned not valid data")
+            return False
 
-    def __save_record(self, filename):
+    def _save_record(self, filename):
         with open(filename, "a") as csv_file:
-            logger.debug("SLC __save_record read:{0}".format(self._reply[61:]))
-            csv_file.write(self._reply[61:]+'\n')
+            logger.debug("SLC __save_record read:{0}".format(self._reply[61:].tobytes()))
+            csv_file.write(self._reply[61:].tobytes()+'\n')
             csv_file.close()
 
     def __get_queue_size(self, queue_number):
         """ get queue size
         """
+        if self.send_unit_data(self._build_get_queue_size(queue_number)):
+            return self._get_queue_size_reply(queue_number)
+        else:
+            raise DataError("read_queue [send_unit_data] returned not valid data")
+
+    def _build_get_queue_size(self, queue_number):
+        """ build the message to get the queue size
+
+        :return: the message ready for send_unit_data
+        """
         # Creating the Message Request Packet
-        self._last_sequence = pack_uint(Base._get_sequence())
+        self._last_sequence = pack_uint(self._get_sequence())
 
         message_request = [
             self._last_sequence,
@@ -300,18 +328,22 @@ class Driver(Base):
             pack_uint(queue_number)
         ]
 
-        if self.send_unit_data(
-            build_common_packet_format(
-                DATA_ITEM['Connected'],
-                ''.join(message_request),
-                ADDRESS_ITEM['Connection Based'],
-                addr_data=self._target_cid,)):
-            sts = int(unpack_uint(self._reply[65:67]))
-            logger.debug("SLC __get_queue_size({0}) returned {1}".format(queue_number, sts))
-            return sts
-        else:
-            raise DataError("read_queue [send_unit_data] returned not valid data")
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,)
 
+    def _get_queue_size_reply(self, queue_number):
+        """ extract the queue size from the reply
+
+        :return: the queue size
+        """
+        sts = int(unpack_uint(self._reply[65:67]))
+        logger.debug("SLC __get_queue_size({0}) returned {1}".format(queue_number, sts))
+        return sts
+
+    @serialized
     def read_queue(self, queue_number, file_name):
         """ read the queue
 
@@ -324,17 +356,18 @@ class Driver(Base):
 
         if self.__queue_data_available(queue_number):
             logger.debug("SLC read_queue: Queue {0} has data".format(queue_number))
-            self.__save_record(file_name)
+            self._save_record(file_name)
             size = self.__get_queue_size(queue_number)
             if size > 0:
                 for i in range(0, size):
                     if self.__queue_data_available(queue_number):
-                        self.__save_record(file_name)
+                        self._save_record(file_name)
 
                 logger.debug("SLC read_queue: {0} record extract from queue {1}".format(size, queue_number))
         else:
             logger.debug("SLC read_queue: Queue {0} has no data".format(queue_number))
 
+    @serialized
     def read_tag(self, tag, n=1):
         """ read tag from a connected plc
 
@@ -346,18 +379,7 @@ class Driver(Base):
 
         :return: None is returned in case of error
         """
-        res = parse_tag(tag)
-        if not res[0]:
-            self._status = (1000, "Error parsing the tag passed to read_tag({0},{1})".format(tag, n))
-            logger.warning(self._status)
-            raise DataError("Error parsing the tag passed to read_tag({0},{1})".format(tag, n))
-
-        bit_read = False
-        bit_position = 0
-        sub_element = 0
-        if int(res[2]['address_field'] == 3):
-            bit_read = True
-            bit_position = int(res[2]['sub_element'])
+        res = self._parse_read_tag(tag, n)
 
         if not self._target_is_connected:
             if not self.forward_open():
@@ -365,10 +387,38 @@ class Driver(Base):
                 logger.warning(self._status)
                 raise DataError("Target did not connected. read_tag will not be executed.")
 
+        message = self._build_read_tag_request(res, n)
+
+        logger.debug("SLC read_tag({0},{1})".format(tag, n))
+        if self.send_unit_data(message):
+            return self._parse_read_tag_reply(tag, n, res)
+        else:
+            raise DataError("send_unit_data returned not valid data")
+
+    def _parse_read_tag(self, tag, n):
+        """ parse and validate the tag passed to read_tag
+
+        :return: the tag parsed by parse_tag
+        """
+        res = parse_tag(tag)
+        if not res[0]:
+            self._status = (1000, "Error parsing the tag passed to read_tag({0},{1})".format(tag, n))
+            logger.warning(self._status)
+            raise DataError("Error parsing the tag passed to read_tag({0},{1})".format(tag, n))
+        return res
+
+    def _build_read_tag_request(self, res, n=1):
+        """ build the message of a read_tag
+
+        :param res: the tag parsed by parse_tag
+        :param n: the number of elements to read
+        :return: the message ready for send_unit_data
+        """
+        sub_element = 0
         data_size = PCCC_DATA_SIZE[res[2]['file_type']]
 
         # Creating the Message Request Packet
-        self._last_sequence = pack_uint(Base._get_sequence())
+        self._last_sequence = pack_uint(self._get_sequence())
 
         message_request = [
             self._last_sequence,
@@ -391,55 +441,67 @@ class Driver(Base):
             pack_usint(sub_element)
         ]
 
-        logger.debug("SLC read_tag({0},{1})".format(tag, n))
-        if self.send_unit_data(
-            build_common_packet_format(
-                DATA_ITEM['Connected'],
-                ''.join(message_request),
-                ADDRESS_ITEM['Connection Based'],
-                addr_data=self._target_cid,)):
-            sts = int(unpack_usint(self._reply[58]))
-            try:
-                if sts != 0:
-                    sts_txt = PCCC_ERROR_CODE[sts]
-                    self._status = (1000, "Error({0}) returned from read_tag({1},{2})".format(sts_txt, tag, n))
-                    logger.warning(self._status)
-                    raise DataError("Error({0}) returned from read_tag({1},{2})".format(sts_txt, tag, n))
-
-                new_value = 61
-                if bit_read:
-                    if res[2]['file_type'] == 'T' or res[2]['file_type'] == 'C':
-                        if bit_position == PCCC_CT['PRE']:
-                            return UNPACK_PCCC_DATA_FUNCTION[res[2]['file_type']](
-                                self._reply[new_value+2:new_value+2+data_size])
-                        elif bit_position == PCCC_CT['ACC']:
-                            return UNPACK_PCCC_DATA_FUNCTION[res[2]['file_type']](
-                                self._reply[new_value+4:new_value+4+data_size])
-
-                    tag_value = UNPACK_PCCC_DATA_FUNCTION[res[2]['file_type']](
-                        self._reply[new_value:new_value+data_size])
-                    return get_bit(tag_value, bit_position)
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request),
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,)
 
-                else:
-                    values_list = []
-                    while len(self._reply[new_value:]) >= data_size:
-                        values_list.append(
-                            UNPACK_PCCC_DATA_FUNCTION[res[2]['file_type']](self._reply[new_value:new_value+data_size])
-                        )
-                        new_value = new_value+data_size
-
-                    if len(values_list) > 1:
-                        return values_list
-                    else:
-                        return values_list[0]
+    def _parse_read_tag_reply(self, tag, n, res):
+        """ parse the reply of a read_tag
 
-            except Exception as e:
-                self._status = (1000, "Error({0}) parsing the data returned from read_tag({1},{2})".format(e, tag, n))
+        :param tag: the tag read
+        :param n: the number of elements read
+        :param res: the tag parsed by parse_tag
+        :return: the value, or the list of values, read
+        """
+        bit_read = False
+        bit_position = 0
+        if int(res[2]['address_field'] == 3):
+            bit_read = True
+            bit_position = int(res[2]['sub_element'])
+
+        data_size = PCCC_DATA_SIZE[res[2]['file_type']]
+        codec = PCCC_DATA_CODEC[res[2]['file_type']]
+
+        sts = int(unpack_usint(self._reply[58]))
+        try:
+            if sts != 0:
+                sts_txt = PCCC_ERROR_CODE[sts]
+                self._status = (1000, "Error({0}) returned from read_tag({1},{2})".format(sts_txt, tag, n))
                 logger.warning(self._status)
-                raise DataError("Error({0}) parsing the data returned from read_tag({1},{2})".format(e, tag, n))
-        else:
-            raise DataError("send_unit_data returned not valid data")
+                raise DataError("Error({0}) returned from read_tag({1},{2})".format(sts_txt, tag, n))
+
+            new_value = 61
+            if bit_read:
+                if res[2]['file_type'] == 'T' or res[2]['file_type'] == 'C':
+                    if bit_position == PCCC_CT['PRE']:
+                        return codec.unpack_from(self._reply, new_value+2)
+                    elif bit_position == PCCC_CT['ACC']:
+                        return codec.unpack_from(self._reply, new_value+4)
+
+                tag_value = codec.unpack_from(self._reply, new_value)
+                return get_bit(tag_value, bit_position)
+
+            else:
+                count = (len(self._reply) - new_value) // data_size
+                if data_size == codec.size:
+                    values_list = list(codec.unpack_array_from(self._reply, new_value, count))
+                else:
+                    # the value is the first word of a bigger element (timer, counter, ...)
+                    values_list = [codec.unpack_from(self._reply, new_value + i * data_size) for i in range(count)]
 
+                if len(values_list) > 1:
+                    return values_list
+                else:
+                    return values_list[0]
+
+        except Exception as e:
+            self._status = (1000, "Error({0}) parsing the data returned from read_tag({1},{2})".format(e, tag, n))
+            logger.warning(self._status)
+            raise DataError("Error({0}) parsing the data returned from read_tag({1},{2})".format(e, tag, n))
+
+    @serialized
     def write_tag(self, tag, value):
         """ write tag from a connected plc
 
@@ -452,6 +514,27 @@ class Driver(Base):
 
         :return: None is returned in case of error
         """
+        res = self._parse_write_tag(tag, value)
+
+        if not self._target_is_connected:
+            if not self.forward_open():
+                self._status = (1000, "Target did not connected. write_tag will not be executed.")
+                logger.warning(self._status)
+                raise DataError("Target did not connected. write_tag will not be executed.")
+
+        message = self._build_write_tag_request(tag, value, res)
+
+        logger.debug("SLC write_tag({0},{1})".format(tag, value))
+        if self.send_unit_data(message):
+            return self._parse_write_tag_reply(tag, value)
+        else:
+            raise DataError("send_unit_data returned not valid data")
+
+    def _parse_write_tag(self, tag, value):
+        """ parse and validate the tag and the value passed to write_tag
+
+        :return: the tag parsed by parse_tag
+        """
         res = parse_tag(tag)
         if not res[0]:
             self._status = (1000, "Error parsing the tag passed to read_tag({0},{1})".format(tag, value))
@@ -462,12 +545,16 @@ class Driver(Base):
             self._status = (1000, "Function's parameters error.  read_tag({0},{1})".format(tag, value))
             logger.warning(self._status)
             raise DataError("Function's parameters error.  read_tag({0},{1})".format(tag, value))
+        return res
 
-        if isinstance(value, list) and int(res[2]['address_field'] == 3):
-            self._status = (1000, "Function's parameters error.  read_tag({0},{1})".format(tag, value))
-            logger.warning(self._status)
-            raise DataError("Function's parameters error.  read_tag({0},{1})".format(tag, value))
+    def _build_write_tag_request(self, tag, value, res):
+        """ build the message of a write_tag
 
+        :param tag: the tag to write
+        :param value: the value or the list of values to write
+        :param res: the tag parsed by parse_tag
+        :return: the message ready for send_unit_data
+        """
         bit_field = False
         bit_position = 0
         sub_element = 0
@@ -482,19 +569,12 @@ class Driver(Base):
         if isinstance(value, list):
             multi_requests = True
 
-        if not self._target_is_connected:
-            if not self.forward_open():
-                self._status = (1000, "Target did not connected. write_tag will not be executed.")
-                logger.warning(self._status)
-                raise DataError("Target did not connected. write_tag will not be executed.")
-
         try:
             n = 0
             if multi_requests:
                 data_size = PCCC_DATA_SIZE[res[2]['file_type']]
-                for v in value:
-                    values_list += PACK_PCCC_DATA_FUNCTION[res[2]['file_type']](v)
-                    n += 1
+                values_list += PCCC_DATA_CODEC[res[2]['file_type']].pack_array(value)
+                n = len(value)
             else:
                 n = 1
                 if bit_field:
@@ -503,7 +583,7 @@ class Driver(Base):
                     if (res[2]['file_type'] == 'T' or res[2]['file_type'] == 'C') \
                             and (bit_position == PCCC_CT['PRE'] or bit_position == PCCC_CT['ACC']):
                         sub_element = bit_position
-                        values_list = '\xff\xff' + PACK_PCCC_DATA_FUNCTION[res[2]['file_type']](value)
+                        values_list = '\xff\xff' + PCCC_DATA_CODEC[res[2]['file_type']].pack(value)
                     else:
                         sub_element = 0
                         if value > 0:
@@ -512,7 +592,7 @@ class Driver(Base):
                             values_list = pack_uint(math.pow(2, bit_position)) + pack_uint(0)
 
                 else:
-                    values_list += PACK_PCCC_DATA_FUNCTION[res[2]['file_type']](value)
+                    values_list += PCCC_DATA_CODEC[res[2]['file_type']].pack(value)
                     data_size = PCCC_DATA_SIZE[res[2]['file_type']]
 
         except Exception as e:
@@ -525,7 +605,7 @@ class Driver(Base):
         data_to_write = values_list
 
         # Creating the Message Request Packet
-        self._last_sequence = pack_uint(Base._get_sequence())
+        self._last_sequence = pack_uint(self._get_sequence())
 
         message_request = [
             self._last_sequence,
@@ -548,27 +628,93 @@ class Driver(Base):
             pack_usint(sub_element)
         ]
 
-        logger.debug("SLC write_tag({0},{1})".format(tag, value))
-        if self.send_unit_data(
-            build_common_packet_format(
-                DATA_ITEM['Connected'],
-                ''.join(message_request) + data_to_write,
-                ADDRESS_ITEM['Connection Based'],
-                addr_data=self._target_cid,)):
-            sts = int(unpack_usint(self._reply[58]))
-            try:
-                if sts != 0:
-                    sts_txt = PCCC_ERROR_CODE[sts]
-                    self._status = (1000, "Error({0}) returned from SLC write_tag({1},{2})".format(sts_txt, tag, value))
-                    logger.warning(self._status)
-                    raise DataError("Error({0}) returned from SLC write_tag({1},{2})".format(sts_txt, tag, value))
-
-                return True
-            except Exception as e:
-                self._status = (1000, "Error({0}) parsing the data returned from "
-                                      "SLC write_tag({1},{2})".format(e, tag, value))
+        return build_common_packet_format(
+            DATA_ITEM['Connected'],
+            ''.join(message_request) + data_to_write,
+            ADDRESS_ITEM['Connection Based'],
+            addr_data=self._target_cid,)
+
+    def _parse_write_tag_reply(self, tag, value):
+        """ check the reply of a write_tag
+
+        :return: True if the PLC accepted the write
+        """
+        sts = int(unpack_usint(self._reply[58]))
+        try:
+            if sts != 0:
+                sts_txt = PCCC_ERROR_CODE[sts]
+                self._status = (1000, "Error({0}) returned from SLC write_tag({1},{2})".format(sts_txt, tag, value))
                 logger.warning(self._status)
-                raise DataError("Error({0}) parsing the data returned from "
+                raise DataError("Error({0}) returned from SLC write_tag({1},{2})".format(sts_txt, tag, value))
+
+            return True
+        except Exception as e:
+            self._status = (1000, "Error({0}) parsing the data returned from "
+                                  "SLC write_tag({1},{2})".format(e, tag, value))
+            logger.warning(self._status)
+            raise DataError("Error({0}) parsing the data returned from "
                             "SLC write_tag({1},{2})".format(e, tag, value))
+
+
+class AsyncDriver(AsyncBase, Driver):
+    """
+    The same SLC/PLC_5 client of Driver running on a non blocking socket, so that one thread can drive many PLCs.
+
+    open, close, register_session, forward_open, read_tag, write_tag and read_queue take the same arguments of
+    the Driver methods, but they queue the operation and return a pycomm.cip.cip_async.Future. The event loop has
+    to run (pycomm.cip.cip_async.loop or wait) for the operations to progress.
+    """
+
+    def __init__(self, sock_map=None, timeout=5.0):
+        super(AsyncDriver, self).__init__(sock_map, timeout)
+
+    def read_tag(self, tag, n=1):
+        return self._queue(self._read_tag(tag, n))
+
+    def _read_tag(self, tag, n):
+        res = self._parse_read_tag(tag, n)
+        yield self._connect_target(5, 'read_tag')
+
+        logger.debug("SLC read_tag({0},{1})".format(tag, n))
+        if (yield self._send_unit_data(self._build_read_tag_request(res, n))):
+            raise Return(self._parse_read_tag_reply(tag, n, res))
+        raise DataError("send_unit_data returned not valid data")
+
+    def write_tag(self, tag, value):
+        return self._queue(self._write_tag(tag, value))
+
+    def _write_tag(self, tag, value):
+        res = self._parse_write_tag(tag, value)
+        yield self._connect_target(1000, 'write_tag')
+
+        message = self._build_write_tag_request(tag, value, res)
+        logger.debug("SLC write_tag({0},{1})".format(tag, value))
+        if (yield self._send_unit_data(message)):
+            raise Return(self._parse_write_tag_reply(tag, value))
+        raise DataError("send_unit_data returned not valid data")
+
+    def read_queue(self, queue_number, file_name):
+        return self._queue(self._read_queue(queue_number, file_name))
+
+    def _read_queue(self, queue_number, file_name):
+        yield self._connect_target(5, 'is_queue_available')
+
+        if (yield self._queue_data_available(queue_number)):
+            logger.debug("SLC read_queue: Queue {0} has data".format(queue_number))
+            self._save_record(file_name)
+            if not (yield self._send_unit_data(self._build_get_queue_size(queue_number))):
+                raise DataError("read_queue [send_unit_data] returned not valid data")
+            size = self._get_queue_size_reply(queue_number)
+            if size > 0:
+                for i in range(0, size):
+                    if (yield self._queue_data_available(queue_number)):
+                        self._save_record(file_name)
+
+                logger.debug("SLC read_queue: {0} record extract from queue {1}".format(size, queue_number))
         else:
-            raise DataError("send_unit_data returned not valid data")
+            logger.debug("SLC read_queue: Queue {0} has no data".format(queue_number))
+
+    def _queue_data_available(self, queue_number):
+        if (yield self._send_unit_data(self._build_queue_data_available(queue_number))):
+            raise Return(self._queue_data_available_reply())
+        raise DataError("read_queue [send_unit_data] returned not valid data")
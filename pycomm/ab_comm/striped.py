@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# striped.py - Bulk reads spread over many connections to the same ControlLogix controller
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+A controller serves many CIP connections in parallel. The StripedReader opens some of them and spreads a bulk read
+over all, so a snapshot of thousands of tags fills the communication time slice of the controller:
+
+    from pycomm.ab_comm.striped import StripedReader
+
+    reader = StripedReader(connections=4)
+    reader.open('192.168.1.10')
+    values = reader.read_tag(['T{0:03d}'.format(i) for i in range(2000)])
+    reader.close()
+"""
+import re
+import array
+import threading
+
+from pycomm.ab_comm.clx import Driver
+from pycomm.cip.cip_base import CommError, DataError, numpy
+from pycomm.cip.cip_const import READ_REPLY_OVERHEAD
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+_element = re.compile(r'^(.*)\[(\d+)\]$')
+
+
+class StripedReader(object):
+    """ Many drivers connected to the same controller, each one with its own session and forward open
+
+    :param connections: the number of connections opened to the controller
+    :param driver_class: the driver of each connection, pycomm.ab_comm.clx.Driver or a subclass
+    :param attribs: the driver attributes, with the spaces of the names replaced by underscores (ex. cpu_slot=2)
+    """
+    def __init__(self, connections=2, driver_class=Driver, **attribs):
+        if connections < 1:
+            raise DataError("StripedReader needs at least one connection")
+        self._drivers = []
+        for i in range(connections):
+            driver = driver_class()
+            for name, value in attribs.items():
+                driver.attribs[name.replace('_', ' ')] = value
+            self._drivers.append(driver)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def drivers(self):
+        return list(self._drivers)
+
+    def open(self, ip_address, direct_connection=False):
+        """ open the session and the forward open of every connection
+
+        :return: True when all the connections are open
+        """
+        try:
+            for driver in self._drivers:
+                if not driver.open(ip_address, direct_connection):
+                    raise CommError("Cannot open the session to {0}".format(ip_address))
+                if not driver.forward_open():
+                    raise CommError("Forward open to {0} failed: {1}".format(ip_address, driver.get_status()))
+        except Exception:
+            self.close()
+            raise
+        return True
+
+    def close(self):
+        """ close every connection
+        """
+        for driver in self._drivers:
+            try:
+                driver.close()
+            except CommError as e:
+                logger.warning("Closing a striped connection: {0}".format(e))
+
+    def _run(self, jobs):
+        """ run each job on its own connection, at the same time
+
+        :param jobs: a list of callable taking the driver, at most one per connection
+        :return: the list of the results, in the order of jobs
+        """
+        results = [None] * len(jobs)
+        errors = []
+
+        def work(index, driver):
+            try:
+                results[index] = jobs[index](driver)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(index, self._drivers[index])) for index in range(1, len(jobs))]
+        for thread in threads:
+            thread.start()
+        # the calling thread serves the first connection
+        if jobs:
+            work(0, self._drivers[0])
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def read_tag(self, tags):
+        """ read a list of tags over all the connections
+
+        The tags are packed in multiple service packets as Driver.read_tag does, then the packets are dealt to the
+        connections.
+
+        :param tags: a list of tag names
+        :return: the tag list in the same order of tags, see Driver.read_tag
+        """
+        if not isinstance(tags, list):
+            return self._drivers[0].read_tag(tags)
+
+        # plan with the smallest connection, every packet fits any of them
+        planner = min(self._drivers, key=lambda d: d.get_connection_size())
+        services = planner._build_read_services(tags)
+        batches = planner._plan_multiple_requests(
+            [([service], READ_REPLY_OVERHEAD + planner._expected_read_size(t)) for service, t in zip(services, tags)])
+
+        # deal the packets, biggest first, to the connection carrying the fewest tags
+        stripes = [[] for driver in self._drivers]
+        for batch in sorted(batches, key=len, reverse=True):
+            min(stripes, key=len).extend(batch)
+        stripes = [sorted(indexes) for indexes in stripes if indexes]
+
+        results = self._run([lambda driver, indexes=indexes: driver.read_tag([tags[i] for i in indexes])
+                             for indexes in stripes])
+        tag_list = [None] * len(tags)
+        for indexes, values in zip(stripes, results):
+            for index, value in zip(indexes, values):
+                tag_list[index] = value
+        return tag_list
+
+    def _dimensions(self, name):
+        """ return the number of dimensions of a controller scope tag browsed by the first connection, 0 if unknown
+        """
+        symbol_type = self._drivers[0]._symbol_types.get(name)
+        if symbol_type is None:
+            return 0
+        return (symbol_type & 0b0110000000000000) >> 13
+
+    def read_array(self, tag, counts, raw=False, typed=False):
+        """ read an array splitting the elements in equal slices, one for each connection
+
+        Only one dimension arrays are split, the other ones are read on the first connection. The dimensions of a tag
+        are known once the first connection browsed the tags, by get_tag_list or the 'instance addressing' attribute:
+        give the index of the first element of the unknown arrays of more dimensions (ex. 'Matrix[0,0]').
+
+        :param tag: the name of the tag to read, optionally with the index of the first element (ex. 'Data[100]')
+        :param counts: the number of element to read
+        :param raw: see Driver.read_array
+        :param typed: see Driver.read_array
+        :return: None is returned in case of error otherwise the values as Driver.read_array returns them
+        """
+        match = _element.match(tag)
+        if match is None and tag.endswith(']'):
+            return self._drivers[0].read_array(tag, counts, raw, typed)
+        name, first = (match.group(1), int(match.group(2))) if match else (tag, 0)
+        if match is None and self._dimensions(name) > 1:
+            # one index cannot address the elements of the slices
+            return self._drivers[0].read_array(tag, counts, raw, typed)
+
+        size = -(-counts // len(self._drivers))
+        slices = [(start, min(size, counts - start)) for start in range(0, counts, size)]
+        results = self._run([lambda driver, start=start, count=count:
+                             driver.read_array('{0}[{1}]'.format(name, first + start), count, raw, typed)
+                             for start, count in slices])
+        if any(result is None for result in results):
+            return None
+
+        if raw:
+            return ''.join(results)
+        if typed:
+            if isinstance(results[0], array.array):
+                values = results[0]
+                for result in results[1:]:
+                    values.extend(result)
+                return values
+            return numpy.concatenate(results)
+        return [(start + position, value) for (start, count), result in zip(slices, results)
+                for position, value in result]
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# subscription.py - Report by exception on top of the polling drivers
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+The subscriptions scan the tags at their own rate and report only the values that moved past their deadband:
+
+    from Queue import Queue
+    from pycomm.ab_comm.clx import Driver
+    from pycomm.ab_comm.subscription import Subscriptions
+
+    c = Driver()
+    c.open('192.168.1.10')
+    changes = Queue()
+    subscriptions = Subscriptions(c, changes)
+    subscriptions.subscribe('Counts', rate=0.5)
+    subscriptions.subscribe('Temperature', rate=1.0, deadband=2, percent=True)
+    subscriptions.start()
+    while True:
+        tag, value, typ = changes.get()
+
+The tags of a clx.Driver due at the same time are read together in multiple service packets, the tags of a
+slc.Driver are read one by one. A tag that cannot be read is reported once as (tag, None, None). When the
+connection fails the session is closed and opened again after retry_interval seconds.
+"""
+import time
+import threading
+import numbers
+
+from pycomm.ab_comm import clx
+from pycomm.ab_comm.slc import parse_tag
+from pycomm.cip.cip_base import CommError, DataError
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+_NOT_READ = object()
+
+
+class Subscription(object):
+    """ A tag scanned at a rate, with the value last reported
+
+    :param tag: the tag name
+    :param rate: seconds between two reads of the tag
+    :param deadband: the change of a numeric value needed to report it, 0 reports every change
+    :param percent: the deadband is a percent of the value last reported
+    :param callback: called as callback(tag, value, type) when the value is reported
+    """
+    def __init__(self, tag, rate, deadband=0, percent=False, callback=None):
+        self.tag = tag
+        self.rate = rate
+        self.deadband = deadband
+        self.percent = percent
+        self.callback = callback
+        self.value = _NOT_READ
+        self.typ = None
+
+    def changed(self, value, typ):
+        """ tell if a value read has to be reported
+        """
+        if self.value is _NOT_READ or typ != self.typ:
+            return True
+        if isinstance(value, bool) or not isinstance(value, numbers.Real) or \
+                not isinstance(self.value, numbers.Real):
+            return value != self.value
+        delta = abs(value - self.value)
+        if self.percent:
+            return delta > abs(self.value) * self.deadband / 100.0
+        return delta > self.deadband
+
+
+class Subscriptions(object):
+    """ Scan the subscribed tags of a driver and report the values changed
+
+    :param driver: a connected clx.Driver or slc.Driver
+    :param queue: optional Queue.Queue receiving a tuple (tag, value, type) for each value reported
+    :param retry_interval: seconds waited before opening again the session of the driver after a failure
+    """
+    def __init__(self, driver, queue=None, retry_interval=5.0):
+        self.driver = driver
+        self.queue = queue
+        self.retry_interval = retry_interval
+        self._retry_time = None     # when the session failed is opened again
+        self._subscriptions = {}
+        self._next_time = {}    # rate -> when the tags at that rate are due
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    def subscribe(self, tag, rate=1.0, deadband=0, percent=False, callback=None):
+        """ Start scanning a tag, its first value read is always reported
+
+        :return: the Subscription
+        """
+        if rate <= 0:
+            raise DataError("The scan rate of {0} has to be greater than 0".format(tag))
+        subscription = Subscription(tag, rate, deadband, percent, callback)
+        with self._lock:
+            self._subscriptions[tag] = subscription
+            self._next_time.setdefault(rate, time.time())
+        return subscription
+
+    def unsubscribe(self, tag):
+        with self._lock:
+            subscription = self._subscriptions.pop(tag)
+            if all(s.rate != subscription.rate for s in self._subscriptions.values()):
+                del self._next_time[subscription.rate]
+
+    def _read(self, tags):
+        """ read the tags with the driver
+
+        :return: a list of tuple (tag, value, type), value and type are None when the tag cannot be read
+        """
+        if isinstance(self.driver, clx.Driver):
+            return self.driver.read_tag(list(tags))
+        values = []
+        for tag in tags:
+            try:
+                values.append((tag, self.driver.read_tag(tag), parse_tag(tag)[2]['file_type']))
+            except DataError as e:
+                logger.warning("Subscription cannot read {0}: {1}".format(tag, e))
+                values.append((tag, None, None))
+        return values
+
+    def _fail(self, now):
+        """ close the session of the driver, it is opened again by the first scan after retry_interval
+        """
+        try:
+            self.driver.close()
+        except CommError as e:
+            logger.warning("Subscription cannot close the session: {0}".format(e))
+        self._retry_time = now + self.retry_interval
+
+    def _reopen(self, now):
+        """ open again the session of the driver when retry_interval is over
+
+        :return: True if the session is open
+        """
+        if self._retry_time is None:
+            return True
+        if now < self._retry_time:
+            return False
+        try:
+            if self.driver.open(self.driver.attribs['ip address'], self.driver._direct_connections):
+                self._retry_time = None
+                return True
+            logger.warning("Subscription cannot open the session: {0}".format(self.driver.get_status()))
+        except CommError as e:
+            logger.warning("Subscription cannot open the session: {0}".format(e))
+        self._fail(now)
+        return False
+
+    def scan(self, now=None):
+        """ Read the tags that are due and report the changes
+
+        :return: the list of the tuple (tag, value, type) reported
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            due = [rate for rate, next_time in self._next_time.items() if next_time <= now]
+            for rate in due:
+                self._next_time[rate] = max(self._next_time[rate] + rate, now)
+            subscriptions = [s for s in self._subscriptions.values() if s.rate in due]
+        if not subscriptions:
+            return []
+
+        values = None
+        if self._reopen(now):
+            try:
+                values = self._read([s.tag for s in subscriptions])
+            except CommError as e:
+                logger.warning("Subscription scan failed: {0}".format(e))
+                self._fail(now)
+            except DataError as e:
+                logger.warning("Subscription scan failed: {0}".format(e))
+        if values is None:
+            values = [(s.tag, None, None) for s in subscriptions]
+
+        changes = []
+        for subscription, (tag, value, typ) in zip(subscriptions, values):
+            if subscription.changed(value, typ):
+                subscription.value = value
+                subscription.typ = typ
+                changes.append((tag, value, typ))
+                if subscription.callback is not None:
+                    try:
+                        subscription.callback(tag, value, typ)
+                    except Exception as e:
+                        logger.warning("Subscription callback of {0} failed: {1}".format(tag, e))
+                if self.queue is not None:
+                    self.queue.put((tag, value, typ))
+        return changes
+
+    def wait_time(self, now=None):
+        """ return the seconds until the next scan is due
+        """
+        if now is None:
+            now = time.time()
+        with self._lock:
+            if not self._next_time:
+                return None
+            return max(0.0, min(self._next_time.values()) - now)
+
+    def run(self, duration=None):
+        """ Scan until stop() is called or for duration seconds
+        """
+        deadline = None if duration is None else time.time() + duration
+        self._running = True
+        while self._running and (deadline is None or time.time() < deadline):
+            self.scan()
+            wait = self.wait_time()
+            if wait is None:
+                wait = 0.1
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.time()))
+            time.sleep(wait)
+
+    def start(self):
+        """ Scan in a daemon thread
+        """
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
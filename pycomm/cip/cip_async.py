@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+#
+# cip_async.py - Non blocking Ethernet/IP sessions driven by a single event loop
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+The asynchronous drivers share the request builders and the reply parsers of the blocking drivers, only the
+transport changes: every operation is a generator that yields the messages to exchange with the target and it is
+resumed by the event loop when the reply arrives. Each call returns a Future right away, so a single thread can
+keep hundreds of controllers busy:
+
+    from pycomm.ab_comm.clx import AsyncDriver
+    from pycomm.cip.cip_async import wait
+
+    plcs = [AsyncDriver() for ip in addresses]
+    for c, ip in zip(plcs, addresses):
+        c.open(ip)
+    futures = [c.read_tag('Counts') for c in plcs]
+    wait(futures, timeout=10)
+    print [f.result() for f in futures]
+
+The operations queued on the same driver run one after the other, in the order they have been called.
+"""
+import asyncore
+import select
+import socket
+import sys
+import time
+import types
+from collections import deque
+
+from pycomm.cip.cip_base import *
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+# What an operation can yield to the event loop
+EXCHANGE = 0    # send a message and wait for the reply
+POST = 1        # send a message that has no reply
+CONNECT = 2     # wait for the socket connection
+
+
+class Return(Exception):
+    """ Raised inside an operation to end it with a value
+
+    Python 2 generators cannot return a value.
+    """
+    def __init__(self, value=None):
+        super(Return, self).__init__(value)
+        self.value = value
+
+
+class Future(object):
+    """ The result of an operation queued on an asynchronous driver
+
+    The interface follows the one of concurrent.futures.Future, but result() never blocks: the event loop has to
+    run until the future is done.
+    """
+    def __init__(self):
+        self._done = False
+        self._result = None
+        self._exception = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def result(self):
+        if not self._done:
+            raise CommError("The operation is still in progress")
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self):
+        if not self._done:
+            raise CommError("The operation is still in progress")
+        return self._exception
+
+    def add_done_callback(self, fn):
+        """ Call fn(future) when the operation is done, or right now if it is already done
+        """
+        if self._done:
+            self._invoke(fn)
+        else:
+            self._callbacks.append(fn)
+
+    def set_result(self, result):
+        self._result = result
+        self._complete()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._complete()
+
+    def _complete(self):
+        self._done = True
+        callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            self._invoke(fn)
+
+    def _invoke(self, fn):
+        try:
+            fn(self)
+        except Exception as e:
+            logger.warning("Exception in future callback {0}: {1}".format(fn, e))
+
+
+class Connection(asyncore.dispatcher):
+    """ Non blocking TCP connection that splits the received stream in encapsulated messages
+    """
+    def __init__(self, owner, sock_map=None):
+        asyncore.dispatcher.__init__(self, map=sock_map)
+        self.owner = owner
+        self.out_buffer = ''
+        self.in_buffer = ''
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+    def post(self, msg):
+        self.out_buffer += msg
+
+    def writable(self):
+        return not self.connected or len(self.out_buffer) > 0
+
+    def handle_connect(self):
+        self.owner._handle_connect()
+
+    def handle_write(self):
+        if self.out_buffer:
+            sent = self.send(self.out_buffer)
+            self.out_buffer = self.out_buffer[sent:]
+
+    def handle_read(self):
+        self.in_buffer += self.recv(8192)
+        while len(self.in_buffer) >= HEADER_SIZE:
+            msg_len = HEADER_SIZE + unpack_uint(self.in_buffer[2:4])
+            if len(self.in_buffer) < msg_len:
+                break
+            msg, self.in_buffer = self.in_buffer[:msg_len], self.in_buffer[msg_len:]
+            self.owner._handle_message(memoryview(msg))
+
+    def handle_close(self):
+        self.close()
+        self.owner._handle_lost(CommError("socket connection broken."))
+
+    def handle_error(self):
+        error = sys.exc_info()[1]
+        self.close()
+        self.owner._handle_lost(CommError(error))
+
+
+def check_timeouts(sock_map=None, now=None):
+    """ Fail the operations waiting past their timeout on the connections of the map
+    """
+    if sock_map is None:
+        sock_map = asyncore.socket_map
+    if now is None:
+        now = time.time()
+    for dispatcher in list(sock_map.values()):
+        if isinstance(dispatcher, Connection):
+            dispatcher.owner.check_timeout(now)
+
+
+def loop(timeout=0.1, count=None, sock_map=None):
+    """ Run the event loop, like asyncore.loop, expiring the operations timed out
+
+    :param timeout: the max time spent waiting for events at each iteration
+    :param count: the number of iterations, None to run until all the connections are closed
+    :param sock_map: the map of the connections, by default the asyncore global map
+    """
+    if sock_map is None:
+        sock_map = asyncore.socket_map
+    use_poll = hasattr(select, 'poll')
+    while sock_map and (count is None or count > 0):
+        asyncore.loop(timeout, use_poll, sock_map, 1)
+        check_timeouts(sock_map)
+        if count is not None:
+            count -= 1
+
+
+def wait(futures, timeout=None, sock_map=None):
+    """ Run the event loop until all the futures are done
+
+    :param futures: a future or a list of futures
+    :param timeout: max time to wait in seconds, None to wait forever
+    :param sock_map: the map of the connections, by default the asyncore global map
+    :return: True if all the futures are done
+    """
+    if isinstance(futures, Future):
+        futures = [futures]
+    if sock_map is None:
+        sock_map = asyncore.socket_map
+    deadline = None if timeout is None else time.time() + timeout
+    while not all(f.done() for f in futures):
+        if not sock_map or (deadline is not None and time.time() > deadline):
+            break
+        loop(0.05, 1, sock_map)
+    return all(f.done() for f in futures)
+
+
+class AsyncBase(object):
+    """ Run the operations of a driver over a non blocking socket
+
+    This class is mixed in front of a blocking driver. Each public method queues a generator and returns a Future.
+    The generators yield (EXCHANGE, message), (POST, message), (CONNECT, address) or another generator, whose
+    value is sent back when it ends.
+    """
+    def __init__(self, sock_map=None, timeout=5.0):
+        super(AsyncBase, self).__init__()
+        self._map = sock_map
+        self._timeout = timeout
+        self._connection = None
+        self._operations = deque()
+        self._running = []
+        self._deadline = None
+
+    def _queue(self, operation):
+        """ Queue an operation, it starts immediately if the driver is idle
+
+        :return: the Future of the operation
+        """
+        future = Future()
+        self._operations.append((operation, future))
+        if not self._running:
+            self._running = [operation]
+            self._step()
+        return future
+
+    def _step(self, value=None, error=None):
+        """ Resume the running operation until it waits for the network or it ends
+        """
+        while True:
+            operation = self._running[-1]
+            try:
+                if error is not None:
+                    request = operation.throw(error)
+                else:
+                    request = operation.send(value)
+            except (Return, StopIteration) as e:
+                self._running.pop()
+                value, error = getattr(e, 'value', None), None
+                if not self._running:
+                    return self._finish(value, None)
+                continue
+            except Exception as e:
+                self._running.pop()
+                value, error = None, e
+                if not self._running:
+                    return self._finish(None, e)
+                continue
+
+            value, error = None, None
+            if isinstance(request, types.GeneratorType):
+                self._running.append(request)
+                continue
+
+            kind, data = request
+            if kind == CONNECT:
+                self._connection = Connection(self, self._map)
+                self._deadline = time.time() + self._timeout
+                try:
+                    # handle_connect could resume the operation before connect returns
+                    self._connection.connect(data)
+                except socket.error as e:
+                    self._connection.close()
+                    self._connection = None
+                    self._deadline = None
+                    error = CommError(e)
+                    continue
+                return
+
+            if self._connection is None:
+                error = CommError("socket connection broken.")
+                continue
+            self._message = data
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(print_bytes_msg(self._message, '-------------- SEND --------------'))
+            self._connection.post(data)
+            if kind == EXCHANGE:
+                self._deadline = time.time() + self._timeout
+                return
+
+    def _finish(self, result, error):
+        operation, future = self._operations.popleft()
+        self._deadline = None
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+        # a callback of the future may have queued and started the next operation already
+        if self._operations and not self._running:
+            self._running = [self._operations[0][0]]
+            self._step()
+
+    def _handle_connect(self):
+        if self._deadline is not None:
+            self._deadline = None
+            self._step(True)
+
+    def _handle_message(self, msg):
+        if self._deadline is None:
+            logger.warning("Unexpected message received and discarded")
+            return
+        self._deadline = None
+        self._reply = msg
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(print_bytes_msg(self._reply, '----------- RECEIVE -----------'))
+        self._step(msg)
+
+    def _handle_lost(self, error):
+        self._connection = None
+        self.clean_up()
+        if self._deadline is not None:
+            self._deadline = None
+            self._step(error=error)
+
+    def check_timeout(self, now=None):
+        """ Fail the running operation if its reply is late
+
+        The connection is closed because a late reply would be matched to the next request.
+        """
+        if self._deadline is None:
+            return
+        if now is None:
+            now = time.time()
+        if now > self._deadline:
+            self._status = (3, "Timeout waiting for the reply from {0}".format(self.attribs['ip address']))
+            logger.warning(self._status)
+            if self._connection is not None:
+                self._connection.close()
+            self._handle_lost(CommError(self._status[1]))
+
+    def _send_rr_data(self, msg):
+        yield EXCHANGE, self.build_header(ENCAPSULATION_COMMAND["send_rr_data"], len(msg)) + msg
+        raise Return(self._check_reply())
+
+    def _send_unit_data(self, msg):
+        yield EXCHANGE, self.build_header(ENCAPSULATION_COMMAND["send_unit_data"], len(msg)) + msg
+        raise Return(self._check_reply())
+
+    def open(self, ip_address, direct_connection=False):
+        """ connect, register a session and clean up any previous connection
+
+        :return: a Future, its result is True if the session has been registered
+        """
+        return self._queue(self._open(ip_address, direct_connection))
+
+    def _open(self, ip_address, direct_connection):
+        if self._connection_opened:
+            raise Return(None)
+        self._direct_connections = direct_connection
+        yield CONNECT, (ip_address, self.attribs['port'])
+        self._connection_opened = True
+        self.attribs['ip address'] = ip_address
+        self.generate_cid()
+        self.generate_vsn()
+        session = yield self._register_session()
+        if session is None:
+            self._status = (13, "Session not registered")
+            raise Return(False)
+
+        yield self._forward_close()
+        raise Return(True)
+
+    def register_session(self):
+        """ Register a new session with the communication partner
+
+        :return: a Future, its result is None if any error, otherwise the session number
+        """
+        return self._queue(self._register_session())
+
+    def _register_session(self):
+        if self._session:
+            raise Return(self._session)
+        self._session = 0
+        yield EXCHANGE, self._build_register_session()
+        raise Return(self._register_session_reply())
+
+    def forward_open(self):
+        """ CIP implementation of the forward open message
+
+        :return: a Future, its result is False if any error in the replayed message
+        """
+        return self._queue(self._forward_open())
+
+    def _forward_open(self):
+        if self._session == 0:
+            self._status = (4, "A session need to be registered before to call forward_open.")
+            raise CommError("A session need to be registered before to call forward open")
+
+        size = self.attribs['connection size']
+        if size > MAX_FORWARD_OPEN_SIZE:
+            if (yield self._send_rr_data(self._build_forward_open(size))):
+                raise Return(self._forward_open_reply(size))
+            logger.warning("Large Forward Open refused {0}, falling back to Forward Open".format(self._status))
+            self.clear()
+
+        if (yield self._send_rr_data(self._build_forward_open())):
+            raise Return(self._forward_open_reply(CONNECTION_PARAMETER['Default'] & MAX_FORWARD_OPEN_SIZE))
+        self._status = (4, "forward_open returned False")
+        raise Return(False)
+
+    def forward_close(self):
+        """ CIP implementation of the forward close message
+
+        :return: a Future, its result is False if any error in the replayed message
+        """
+        return self._queue(self._forward_close())
+
+    def _forward_close(self):
+        if self._session == 0:
+            self._status = (5, "A session need to be registered before to call forward_close.")
+            raise CommError("A session need to be registered before to call forward_close.")
+
+        if (yield self._send_rr_data(self._build_forward_close())):
+            self._target_is_connected = False
+            raise Return(True)
+        self._status = (5, "forward_close returned False")
+        logger.warning(self._status)
+        raise Return(False)
+
+    def _connect_target(self, error_code, operation):
+        """ forward open if the target is not connected yet, raise DataError if it fails
+        """
+        if not self._target_is_connected:
+            if not (yield self._forward_open()):
+                self._status = (error_code, "Target did not connected. {0} will not be executed.".format(operation))
+                logger.warning(self._status)
+                raise DataError("Target did not connected. {0} will not be executed.".format(operation))
+
+    def close(self):
+        """ close the connection with the target
+
+        :return: a Future done when the socket has been closed
+        """
+        return self._queue(self._close())
+
+    def _close(self):
+        try:
+            if self._target_is_connected:
+                yield self._forward_close()
+            if self._session != 0:
+                yield POST, self.build_header(ENCAPSULATION_COMMAND['unregister_session'], 0)
+        except CommError as e:
+            logger.warning("Error on close() -> session Err: %s" % e)
+
+        if self._connection is not None:
+            # give the unregister session a chance to leave before closing the socket
+            if self._connection.out_buffer:
+                self._connection.handle_write()
+            self._connection.close()
+            self._connection = None
+        self.clean_up()
@@ -24,14 +24,23 @@
 # SOFTWARE.
 #
 
+import array
+import functools
 import struct
 import socket
 import random
+import sys
+import threading
 
+from collections import OrderedDict
 from os import getpid
 from pycomm.cip.cip_const import *
 from pycomm.common import PycommError
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import logging
 try:  # Python 2.7+
@@ -52,6 +61,28 @@ class DataError(PycommError):
     pass
 
 
+class AsyncUnavailable(object):
+    """ Stands for pycomm.cip.cip_async.AsyncBase when asyncore cannot be imported, it was removed from Python 3.12
+
+    The asynchronous drivers are still defined but cannot be created, the blocking drivers do not need asyncore.
+    """
+    def __init__(self, *args, **kwargs):
+        raise CommError("The asynchronous drivers need asyncore, which cannot be imported")
+
+
+def serialized(method):
+    """ Run the method holding the lock of the driver
+
+    The lock is reentrant, so serialized methods can call each other. Many threads can share one driver: their
+    requests go on the connection one at a time.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 def pack_sint(n):
     return struct.pack('b', n)
 
@@ -202,6 +233,446 @@ PACK_PCCC_DATA_FUNCTION = {
     'I': pack_int
 }
 
+
+def _array_typecode(fmt):
+    """ return the type code of the array module with the same size of a struct format character
+
+    :return: the type code, None if the platform has not one (ex. 64 bits integers on Windows)
+    """
+    if fmt in 'fd':
+        return fmt
+    for code in ('bhil' if fmt.islower() else 'BHIL'):
+        if array.array(code).itemsize == struct.calcsize(fmt):
+            return code
+    return None
+
+
+class DataCodec(object):
+    """ Pack and unpack the values of a data type with precompiled structs
+
+    The structs used for arrays are compiled the first time a count is used and then reused.
+    """
+    MAX_ARRAY_STRUCTS = 64
+
+    def __init__(self, name, code, fmt):
+        """
+        :param name: the name of the data type (ex. 'DINT')
+        :param code: the CIP code of the data type (ex. 0xc4)
+        :param fmt: the struct format character of one value (ex. 'i')
+        """
+        self.name = name
+        self.code = code
+        self.fmt = fmt
+        self.struct = struct.Struct('<' + fmt)
+        self.size = self.struct.size
+        self.typecode = _array_typecode(fmt)
+        self._arrays = {}
+
+    def pack(self, value):
+        return self.struct.pack(value)
+
+    def pack_into(self, buf, offset, value):
+        self.struct.pack_into(buf, offset, value)
+
+    def unpack_from(self, buf, offset=0):
+        """ unpack the value starting at offset of any buffer (str, bytearray, memoryview)
+        """
+        return self.struct.unpack_from(buf, offset)[0]
+
+    def array(self, count):
+        """ return the struct packing count values
+        """
+        try:
+            return self._arrays[count]
+        except KeyError:
+            if len(self._arrays) >= self.MAX_ARRAY_STRUCTS:
+                self._arrays.clear()
+            s = self._arrays[count] = struct.Struct('<{0}{1}'.format(count, self.fmt))
+            return s
+
+    def pack_array(self, values):
+        return self.array(len(values)).pack(*values)
+
+    def pack_array_into(self, buf, offset, values):
+        """ pack the values in a writable buffer starting at offset, with one struct call
+        """
+        self.array(len(values)).pack_into(buf, offset, *values)
+
+    def pack_typed(self, values):
+        """ encode an array.array of values
+
+        The memory of the array is used as it is when its type code matches the codec one.
+        :return: the values encoded little endian
+        """
+        if values.typecode != self.typecode:
+            return self.pack_array(values)
+        if sys.byteorder == 'big':
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        return values.tostring()
+
+    def unpack_array_from(self, buf, offset=0, count=None):
+        """ unpack count values starting at offset, by default all the values that fit in the buffer
+
+        :return: a tuple with the values
+        """
+        if count is None:
+            count = (len(buf) - offset) // self.size
+        return self.array(count).unpack_from(buf, offset)
+
+    def unpack_typed(self, buf, kind=True):
+        """ decode in bulk all the values of a buffer in a typed array
+
+        :param buf: a str, bytearray or memoryview holding only whole values
+        :param kind: 'array' for an array.array, 'numpy' for a numpy array, True for numpy when it is installed
+                     otherwise array.array
+        :return: the array of the values
+        """
+        if kind is True:
+            kind = 'array' if numpy is None else 'numpy'
+
+        if kind == 'numpy':
+            if numpy is None:
+                raise DataError("numpy is required to decode {0} values in a numpy array".format(self.name))
+            return numpy.frombuffer(buf, dtype=self.struct.format)
+
+        if kind == 'array':
+            if self.typecode is None:
+                raise DataError("array module has no type code for {0} values".format(self.name))
+            if isinstance(buf, memoryview):
+                buf = buf.tobytes()
+            elif isinstance(buf, bytearray):
+                buf = buffer(buf)
+            values = array.array(self.typecode)
+            values.fromstring(buf)
+            if sys.byteorder == 'big':
+                values.byteswap()
+            return values
+
+        raise DataError("Unknown typed array kind {0}".format(kind))
+
+
+class BoolCodec(DataCodec):
+    """ BOOL values are unpacked as 1 or 0, whatever not zero value the target sends
+    """
+    def unpack_from(self, buf, offset=0):
+        return 1 if self.struct.unpack_from(buf, offset)[0] else 0
+
+    def unpack_array_from(self, buf, offset=0, count=None):
+        return tuple(1 if v else 0 for v in DataCodec.unpack_array_from(self, buf, offset, count))
+
+    def unpack_typed(self, buf, kind=True):
+        values = DataCodec.unpack_typed(self, buf, kind)
+        if isinstance(values, array.array):
+            return array.array(self.typecode, (1 if v else 0 for v in values))
+        return (values != 0).astype(values.dtype)
+
+
+def _codec(name, fmt, cls=DataCodec):
+    return cls(name, S_DATA_TYPE[name], fmt)
+
+
+# The codecs of the atomic data types indexed by CIP type code
+DATA_CODEC = dict((c.code, c) for c in [
+    _codec('BOOL', 'b', BoolCodec),
+    _codec('SINT', 'b'),
+    _codec('INT', 'h'),
+    _codec('DINT', 'i'),
+    _codec('LINT', 'q'),
+    _codec('USINT', 'B'),
+    _codec('UINT', 'H'),
+    _codec('UDINT', 'I'),
+    _codec('ULINT', 'Q'),
+    _codec('REAL', 'f'),
+    _codec('LREAL', 'd'),
+    _codec('BYTE', 'b'),
+    _codec('WORD', 'H'),
+    _codec('DWORD', 'i'),
+    _codec('STRING', 'q'),   # same as PACK_DATA_FUNCTION
+])
+
+
+def get_codec(typ):
+    """ return the codec of a data type
+
+    :param typ: the CIP code or the name of the data type
+    :return: the DataCodec, LookupError if the type is not atomic
+    """
+    if isinstance(typ, basestring):
+        typ = S_DATA_TYPE[typ]
+    return DATA_CODEC[typ]
+
+
+# The codecs of the values in the PCCC files, the element size is in PCCC_DATA_SIZE
+PCCC_DATA_CODEC = {
+    'N': get_codec('INT'),
+    'B': get_codec('INT'),
+    'T': get_codec('INT'),
+    'C': get_codec('INT'),
+    'S': get_codec('INT'),
+    'F': get_codec('REAL'),
+    'A': get_codec('SINT'),
+    'R': get_codec('DINT'),
+    'O': get_codec('INT'),
+    'I': get_codec('INT')
+}
+
+
+class StructCodec(object):
+    """ Decode and encode whole structures with one struct compiled from their template
+
+    The members stored are laid out in a single struct format, with pad bytes for the gaps, so a structure is
+    decoded with one unpack. The BOOL members kept in a bit of their host are read and written at their byte offset
+    and bit. An array of structures can be decoded by column, one array of values for each member.
+    """
+    MAX_ARRAY_STRUCTS = 16
+
+    def __init__(self, template, resolve):
+        """
+        :param template: the definition of the structure, a dict with name, size and members as clx.Driver reads
+                         it from the template object
+        :param resolve: called with the 'template' of a nested structure member, returns its definition
+        """
+        self.name = template['name']
+        self.size = template['size']
+        self._leaves = []   # (byte offset, struct format, number of values) of each member stored
+        plan = self._compile(template, resolve, 0)
+
+        # lay out the leaves by offset, then the plan gets the position of the values of each leaf
+        order = sorted(range(len(self._leaves)), key=lambda leaf: self._leaves[leaf][0])
+        positions = [0] * len(self._leaves)
+        fmt = []
+        end = 0
+        position = 0
+        for leaf in order:
+            offset, leaf_fmt, count = self._leaves[leaf]
+            if offset < end:
+                raise DataError("The members of {0} overlap at offset {1}".format(self.name, offset))
+            if offset > end:
+                fmt.append('{0}x'.format(offset - end))
+            fmt.append(leaf_fmt)
+            end = offset + struct.calcsize('<' + leaf_fmt)
+            positions[leaf] = position
+            position += count
+        if end > self.size:
+            raise DataError("The members of {0} do not fit in {1} bytes".format(self.name, self.size))
+        if self.size > end:
+            fmt.append('{0}x'.format(self.size - end))
+
+        self.fmt = ''.join(fmt)
+        self.struct = struct.Struct('<' + self.fmt)
+        self.length = position      # the number of values unpacked for one structure
+        self._plan = self._place(plan, positions)
+        self._defaults = self.struct.unpack('\x00' * self.size)
+        self._arrays = {}
+
+    def _compile(self, template, resolve, base, name=None):
+        """ build the node of a structure, with a node for each visible member, and the leaves of the members stored
+
+        A node is a tuple (kind, name, a, b):
+            - ('struct', name, nodes, None) and ('structs', name, nodes, None) for an array of structures
+            - ('string', name, (leaf of LEN, leaf of DATA), size of DATA)
+            - ('value', name, leaf, codec), ('bool', name, leaf, codec) and ('array', name, leaf, count)
+            - ('bit', name, byte offset, bit)
+        """
+        members = template['members']
+        if [member['name'] for member in members] == ['LEN', 'DATA']:
+            return ('string', name, (self._leaf(base + members[0]['offset'], 'i', 1),
+                                     self._leaf(base + members[1]['offset'], '{0}s'.format(members[1]['count']), 1)),
+                    members[1]['count'])
+
+        nodes = []
+        for member in members:
+            offset = base + member['offset']
+            if 'template' in member:
+                nested = resolve(member['template'])
+                if member['count'] > 1:
+                    node = ('structs', member['name'], [self._compile(nested, resolve, offset + i * nested['size'])
+                                                        for i in range(member['count'])], None)
+                else:
+                    node = self._compile(nested, resolve, offset, member['name'])
+            elif member['bit'] is not None:
+                node = ('bit', member['name'], offset, member['bit'])
+            elif member['count'] > 1:
+                leaf_fmt = '{0}{1}'.format(member['count'], member['codec'].fmt)
+                node = ('array', member['name'], self._leaf(offset, leaf_fmt, member['count']), member['count'])
+            else:
+                node = ('bool' if member['codec'].code == S_DATA_TYPE['BOOL'] else 'value', member['name'],
+                        self._leaf(offset, member['codec'].fmt, 1), member['codec'])
+            if not member['hidden']:
+                nodes.append(node)
+        return 'struct', name, nodes, None
+
+    def _leaf(self, offset, fmt, count):
+        self._leaves.append((offset, fmt, count))
+        return len(self._leaves) - 1
+
+    def _place(self, node, positions):
+        """ replace the leaves of a node with the positions of their values in the tuple unpacked
+        """
+        kind, name, a, b = node
+        if kind in ('struct', 'structs'):
+            return kind, name, [self._place(n, positions) for n in a], None
+        if kind == 'string':
+            return kind, name, (positions[a[0]], positions[a[1]]), b
+        if kind in ('value', 'bool', 'array'):
+            return kind, name, positions[a], b
+        return node
+
+    def array(self, count):
+        """ return the struct packing count structures
+        """
+        try:
+            return self._arrays[count]
+        except KeyError:
+            if len(self._arrays) >= self.MAX_ARRAY_STRUCTS:
+                self._arrays.clear()
+            s = self._arrays[count] = struct.Struct('<' + self.fmt * count)
+            return s
+
+    def decode(self, buf, offset=0):
+        """ decode the structure starting at offset of any buffer (str, bytearray, memoryview)
+
+        :return: an OrderedDict of the visible members, in the order of the template, a str for a string
+        """
+        if not isinstance(buf, bytearray):
+            buf = bytearray(buf)
+        return self._decode(self._plan, self.struct.unpack_from(buf, offset), 0, buf, offset)
+
+    def decode_array(self, buf, count, offset=0):
+        """ decode count structures one after the other
+
+        :return: a list of the structures decoded
+        """
+        if not isinstance(buf, bytearray):
+            buf = bytearray(buf)
+        values = self.array(count).unpack_from(buf, offset)
+        return [self._decode(self._plan, values, i * self.length, buf, offset + i * self.size)
+                for i in range(count)]
+
+    def _decode(self, node, values, first, buf, offset):
+        kind, name, a, b = node
+        if kind == 'struct':
+            result = OrderedDict()
+            for n in a:
+                result[n[1]] = self._decode(n, values, first, buf, offset)
+            return result
+        if kind == 'value':
+            return values[first + a]
+        if kind == 'bool':
+            return 1 if values[first + a] else 0
+        if kind == 'bit':
+            return (buf[offset + a] >> b) & 1
+        if kind == 'array':
+            return list(values[first + a:first + a + b])
+        if kind == 'string':
+            return values[first + a[1]][:values[first + a[0]]]
+        return [self._decode(n, values, first, buf, offset) for n in a]
+
+    def decode_columns(self, buf, count, offset=0, kind=True):
+        """ decode count structures by column
+
+        :param kind: the type of the columns of the atomic members, as DataCodec.unpack_typed
+        :return: an OrderedDict with a column for each member, nested members named by their path (ex. 'Pos.X').
+                 The columns of the arrays and of the strings are lists. A list of str for an array of strings
+        """
+        if kind is True:
+            kind = 'array' if numpy is None else 'numpy'
+        if kind not in ('array', 'numpy'):
+            raise DataError("Unknown typed array kind {0}".format(kind))
+        if kind == 'numpy' and numpy is None:
+            raise DataError("numpy is required to decode {0} values in a numpy array".format(self.name))
+        if not isinstance(buf, bytearray):
+            buf = bytearray(buf)
+        values = self.array(count).unpack_from(buf, offset)
+        columns = OrderedDict()
+        self._columns(self._plan, '', values, buf, offset, count, kind, columns)
+        if self._plan[0] == 'string':
+            return columns['']
+        return columns
+
+    def _columns(self, node, prefix, values, buf, offset, count, kind, columns):
+        typ, name, a, b = node
+        if name is not None:
+            prefix += name
+        step = self.length
+        if typ == 'struct':
+            for n in a:
+                self._columns(n, prefix + '.' if prefix else '', values, buf, offset, count, kind, columns)
+        elif typ == 'structs':
+            for index, n in enumerate(a):
+                self._columns(n, '{0}[{1}]'.format(prefix, index), values, buf, offset, count, kind, columns)
+        elif typ == 'value':
+            columns[prefix] = self._typed(b, values[a::step], kind)
+        elif typ == 'bool':
+            columns[prefix] = self._typed(b, [1 if v else 0 for v in values[a::step]], kind)
+        elif typ == 'bit':
+            columns[prefix] = self._typed(DATA_CODEC[S_DATA_TYPE['BOOL']],
+                                          [(buf[offset + a + i * self.size] >> b) & 1 for i in range(count)], kind)
+        elif typ == 'array':
+            columns[prefix] = [list(values[a + i * step:a + i * step + b]) for i in range(count)]
+        else:
+            columns[prefix] = [values[a[1] + i * step][:values[a[0] + i * step]] for i in range(count)]
+
+    @staticmethod
+    def _typed(codec, values, kind):
+        if kind == 'numpy':
+            return numpy.array(values, dtype=codec.struct.format)
+        if codec.typecode is None:
+            raise DataError("array module has no type code for {0} values".format(codec.name))
+        return array.array(codec.typecode, values)
+
+    def encode(self, value, buf=None, offset=0):
+        """ encode a structure, as decode returns it
+
+        :param value: the OrderedDict or dict of the visible members, a str for a string
+        :param buf: optional bytearray holding the structure, the bytes of the hidden members are kept
+        :param offset: where the structure starts in buf
+        :return: the bytearray with the structure encoded
+        """
+        if buf is None:
+            buf = bytearray(self.size)
+            values = list(self._defaults)
+        else:
+            values = list(self.struct.unpack_from(buf, offset))
+        bits = []
+        try:
+            self._encode(self._plan, value, values, bits)
+            self.struct.pack_into(buf, offset, *values)
+        except (KeyError, TypeError, IndexError, struct.error) as e:
+            raise DataError("Cannot encode {0}: {1}".format(self.name, e))
+        for byte_offset, bit, v in bits:
+            if v:
+                buf[offset + byte_offset] |= 1 << bit
+            else:
+                buf[offset + byte_offset] &= ~(1 << bit) & 0xff
+        return buf
+
+    def _encode(self, node, value, values, bits):
+        kind, name, a, b = node
+        if kind == 'struct':
+            for n in a:
+                self._encode(n, value[n[1]], values, bits)
+        elif kind == 'structs':
+            if len(value) != len(a):
+                raise IndexError("{0} needs {1} structures".format(name, len(a)))
+            for n, v in zip(a, value):
+                self._encode(n, v, values, bits)
+        elif kind in ('value', 'bool'):
+            values[a] = value
+        elif kind == 'bit':
+            bits.append((a, b, value))
+        elif kind == 'array':
+            if len(value) != b:
+                raise IndexError("{0} needs {1} values".format(name, b))
+            values[a:a + b] = value
+        else:
+            if len(value) > b:
+                raise IndexError("{0} holds up to {1} characters".format(name or self.name, b))
+            values[a[0]] = len(value)
+            values[a[1]] = value
+
+
 def print_bytes_line(msg):
     out = ''
     for ch in msg:
@@ -214,11 +685,11 @@ def print_bytes_msg(msg, info=''):
     new_line = True
     line = 0
     column = 0
-    for idx, ch in enumerate(msg):
+    for idx, ch in enumerate(bytearray(msg)):
         if new_line:
             out += "\n({:0>4d}) ".format(line * 10)
             new_line = False
-        out += "{:0>2x} ".format(ord(ch))
+        out += "{:0>2x} ".format(ch)
         if column == 9:
             new_line = True
             column = 0
@@ -257,64 +728,145 @@ def get_extended_status(msg, start):
         return "Extended Status info not present"
 
 
+class LRUCache(object):
+    """ A dictionary bounded to maxsize entries, the least recently used entry goes when a new one comes
+
+    The cache can be shared by many threads. hits and misses count the lookups.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ return the value of key, None if it is not cached
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            # the entries are kept from the least to the most recently used
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ return a dictionary with hits, misses, size and maxsize of the cache
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+
+# The request paths created by create_tag_rp, by (tag, multi_requests)
+TAG_RP_CACHE = LRUCache(4096)
+
+
+def get_tag_rp_cache_stats():
+    """ Return the hits, misses, size and maxsize of the cache of the request paths
+    """
+    return TAG_RP_CACHE.stats()
+
+
 def create_tag_rp(tag, multi_requests=False):
     """ Create tag Request Packet
 
     It returns the request packed wrapped around the tag passed.
     If any error it returns none
+
+    The request paths are kept in TAG_RP_CACHE, so a tag is encoded only the first time.
+    """
+    key = (tag, multi_requests)
+    request_path = TAG_RP_CACHE.get(key)
+    if request_path is None:
+        request_path = _build_tag_rp(tag)
+        if request_path is None:
+            return None
+        if multi_requests:
+            request_path = chr(len(request_path) / 2) + request_path
+        TAG_RP_CACHE.put(key, request_path)
+    return request_path
+
+
+def create_symbol_instance_rp(instance_id, tag, multi_requests=False):
+    """ Create the Request Packet of a tag addressed by the instance of its Symbol Object (class 0x6B)
+
+    The name of the tag is replaced by the class and instance logical segments, its indexes and members are
+    encoded as in create_tag_rp. If any error it returns none
+
+    :param instance_id: the instance of the symbol, as returned by get_tag_list
+    :param tag: the tag name, with its indexes and members
+    """
+    key = (tag, multi_requests, instance_id)
+    request_path = TAG_RP_CACHE.get(key)
+    if request_path is None:
+        symbolic = _build_tag_rp(tag)
+        if symbolic is None:
+            return None
+        name_length = ord(symbolic[1])
+        if instance_id <= 0xffff:
+            instance = INSTANCE_ID["16-bit"] + PADDING_BYTE + pack_uint(instance_id)
+        else:
+            instance = INSTANCE_ID["32-bit"] + PADDING_BYTE + pack_dint(instance_id)
+        # the symbolic segment of the name is 2 bytes plus the name, word aligned
+        request_path = CLASS_ID["8-bit"] + CLASS_CODE["Symbol Object"] + instance + \
+            symbolic[2 + name_length + name_length % 2:]
+        if multi_requests:
+            request_path = chr(len(request_path) / 2) + request_path
+        TAG_RP_CACHE.put(key, request_path)
+    return request_path
+
+
+def _build_tag_rp(tag):
+    """ Encode the request path of a tag, a symbolic segment for each member followed by its indexes
+
+    :return: the request path, None if an index is out of range
     """
-    tags = tag.split('.')
     rp = []
-    index = []
-    for tag in tags:
-        add_index = False
+    for member in tag.split('.'):
+        index = []
         # Check if is an array tag
-        if tag.find('[') != -1:
-            # Remove the last square bracket
-            tag = tag[:len(tag)-1]
-            # Isolate the value inside bracket
-            inside_value = tag[tag.find('[')+1:]
-            # Now split the inside value in case part of multidimensional array
-            index = inside_value.split(',')
-            # Flag the existence of one o more index
-            add_index = True
-            # Get only the tag part
-            tag = tag[:tag.find('[')]
-        tag_length = len(tag)
-
-        # Create the request path
-        rp.append(EXTENDED_SYMBOL)  # ANSI Ext. symbolic segment
-        rp.append(chr(tag_length))  # Length of the tag
-
-        # Add the tag to the Request path
-        for char in tag:
-            rp.append(char)
-        # Add pad byte because total length of Request path must be word-aligned
-        if tag_length % 2:
+        bracket = member.find('[')
+        if bracket != -1:
+            # Split the value inside the brackets in case of multidimensional array
+            index = member[bracket+1:-1].split(',')
+            member = member[:bracket]
+
+        # ANSI Ext. symbolic segment, with a pad byte because the request path must be word-aligned
+        rp.append(EXTENDED_SYMBOL + chr(len(member)) + member)
+        if len(member) % 2:
             rp.append(PADDING_BYTE)
-        # Add any index
-        if add_index:
-            for idx in index:
-                val = int(idx)
-                if val <= 0xff:
-                    rp.append(ELEMENT_ID["8-bit"])
-                    rp.append(pack_usint(val))
-                elif val <= 0xffff:
-                    rp.append(ELEMENT_ID["16-bit"]+PADDING_BYTE)
-                    rp.append(pack_uint(val))
-                elif val <= 0xfffffffff:
-                    rp.append(ELEMENT_ID["32-bit"]+PADDING_BYTE)
-                    rp.append(pack_dint(val))
-                else:
-                    # Cannot create a valid request packet
-                    return None
-
-    # At this point the Request Path is completed,
-    if multi_requests:
-        request_path = chr(len(rp)/2) + ''.join(rp)
-    else:
-        request_path = ''.join(rp)
-    return request_path
+        for idx in index:
+            val = int(idx)
+            if val <= 0xff:
+                rp.append(ELEMENT_ID["8-bit"] + pack_usint(val))
+            elif val <= 0xffff:
+                rp.append(ELEMENT_ID["16-bit"] + PADDING_BYTE + pack_uint(val))
+            elif val <= 0xffffffff:
+                rp.append(ELEMENT_ID["32-bit"] + PADDING_BYTE + pack_dint(val))
+            else:
+                # Cannot create a valid request packet
+                return None
+    return ''.join(rp)
 
 
 def build_common_packet_format(message_type, message, addr_type, addr_data=None, timeout=10):
@@ -391,12 +943,8 @@ def parse_multiple_request(message, tags, typ):
             if typ == "READ":
                 data_type = unpack_uint(message[start+4:start+6])
                 try:
-                    value_begin = start + 6
-                    value_end = value_begin + DATA_FUNCTION_SIZE[I_DATA_TYPE[data_type]]
-                    value = message[value_begin:value_end]
-                    tag_list.append((tags[index],
-                                    UNPACK_DATA_FUNCTION[I_DATA_TYPE[data_type]](value),
-                                    I_DATA_TYPE[data_type]))
+                    codec = DATA_CODEC[data_type]
+                    tag_list.append((tags[index], codec.unpack_from(message, start + 6), codec.name))
                 except LookupError:
                     tag_list.append((tags[index], None, None))
             else:
@@ -411,10 +959,12 @@ def parse_multiple_request(message, tags, typ):
 
 class Socket:
 
-    def __init__(self, timeout=5.0):
+    def __init__(self, timeout=5.0, buffer_size=4096):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(timeout)
         self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
 
     def connect(self, host, port):
         try:
@@ -436,28 +986,35 @@ class Socket:
                 raise CommError("socket connection broken.")
         return total_sent
 
-    def receive(self, timeout=0):
-        if timeout != 0:
-            self.sock.settimeout(timeout)
-        msg_len = 28
-        chunks = []
-        bytes_recd = 0
-        one_shot = True
-        while bytes_recd < msg_len:
+    def _receive_into(self, start, end):
+        while start < end:
             try:
-                chunk = self.sock.recv(min(msg_len - bytes_recd, 2048))
-                if chunk == '':
-                    raise CommError("socket connection broken.")
-                if one_shot:
-                    data_size = int(struct.unpack('<H', chunk[2:4])[0])  # Length
-                    msg_len = HEADER_SIZE + data_size
-                    one_shot = False
-
-                chunks.append(chunk)
-                bytes_recd += len(chunk)
+                bytes_recd = self.sock.recv_into(self._view[start:end], end - start)
             except socket.error as e:
                 raise CommError(e)
-        return ''.join(chunks)
+            if bytes_recd == 0:
+                raise CommError("socket connection broken.")
+            start += bytes_recd
+
+    def receive(self, timeout=0):
+        """ receive one encapsulated message in the buffer of the connection
+
+        The message is not copied: the memoryview returned is overwritten by the next receive, so who needs to keep
+        part of it has to call tobytes()
+        :return: a memoryview of the message received
+        """
+        if timeout != 0:
+            self.sock.settimeout(timeout)
+        self._receive_into(0, HEADER_SIZE)
+        msg_len = HEADER_SIZE + unpack_uint(self._view[2:4])  # Length
+        if msg_len > len(self._buffer):
+            # a bytearray cannot be resized while it is exported, the buffer is replaced
+            buf = bytearray(msg_len)
+            buf[:HEADER_SIZE] = self._view[:HEADER_SIZE]
+            self._buffer = buf
+            self._view = memoryview(self._buffer)
+        self._receive_into(HEADER_SIZE, msg_len)
+        return self._view[:msg_len]
 
     def close(self):
         self.sock.close()
@@ -476,18 +1033,21 @@ def parse_symbol_type(symbol):
 
 
 class Base(object):
-    _sequence = 0
-
+    _sequence_seed = 0
 
     def __init__(self):
-        if Base._sequence == 0:
-            Base._sequence = getpid()
-        else:
-            Base._sequence = Base._get_sequence()
+        # each driver counts its own sequence, the seed makes the drivers of the process start apart
+        if Base._sequence_seed == 0:
+            Base._sequence_seed = getpid() % 65535
+        Base._sequence_seed = Base._sequence_seed % 65535 + 1
+        self._sequence = Base._sequence_seed
+        # serialize the requests of the threads sharing the driver, the status is kept per thread
+        self._lock = threading.RLock()
+        self._local = threading.local()
 
         self.__version__ = '0.3'
         self.__sock = None
-        self.__direct_connections = False
+        self._direct_connections = False
         self._session = 0
         self._connection_opened = False
         self._reply = None
@@ -505,10 +1065,13 @@ class Base(object):
         self._last_tag_write = ()
         self._status = (0, "")
         self._output_raw = False    # indicating value should be output as raw (hex)
+        # bytes of a connected message, sequence count included, allowed by the connection
+        self._connection_size = CONNECTION_PARAMETER['Default'] & MAX_FORWARD_OPEN_SIZE
 
         self.attribs = {'context': '_pycomm_', 'protocol version': 1, 'rpi': 5000, 'port': 0xAF12, 'timeout': 10,
                         'backplane': 1, 'cpu slot': 0, 'option': 0, 'cid': '\x27\x04\x19\x71', 'csn': '\x27\x04',
-                        'vid': '\x09\x10', 'vsn': '\x09\x10\x19\x71', 'name': 'Base', 'ip address': None}
+                        'vid': '\x09\x10', 'vsn': '\x09\x10\x19\x71', 'name': 'Base', 'ip address': None,
+                        'pipeline window': 1, 'connection size': 4002}
 
     def __len__(self):
         return len(self.attribs)
@@ -534,18 +1097,28 @@ class Base(object):
     def _check_reply(self):
         raise Socket.ImplementationError("The method has not been implemented")
 
-    @staticmethod
-    def _get_sequence():
+    def _get_sequence(self):
         """ Increase and return the sequence used with connected messages
 
         :return: The New sequence
         """
-        if Base._sequence < 65535:
-            Base._sequence += 1
+        if self._sequence < 65535:
+            self._sequence += 1
         else:
-            Base._sequence = getpid() % 65535
-        return Base._sequence
+            self._sequence = getpid() % 65535
+        return self._sequence
+
+    @property
+    def _status(self):
+        """ the status of the last call of the current thread
+        """
+        return getattr(self._local, 'status', (0, ""))
 
+    @_status.setter
+    def _status(self, value):
+        self._local.status = value
+
+    @serialized
     def nop(self):
         """ No replay command
 
@@ -568,6 +1141,7 @@ class Base(object):
     def description(self):
         return self._device_description
 
+    @serialized
     def list_identity(self):
         """ ListIdentity command to locate and identify potential target
 
@@ -578,12 +1152,13 @@ class Base(object):
         self._receive()
         if self._check_reply():
             try:
-                self._device_description = self._reply[63:-1]
+                self._device_description = self._reply[63:-1].tobytes()
                 return True
             except Exception as e:
                 raise CommError(e)
         return False
 
+    @serialized
     def send_rr_data(self, msg):
         """ SendRRData transfer an encapsulated request/reply packet between the originator and target
 
@@ -596,6 +1171,7 @@ class Base(object):
         self._receive()
         return self._check_reply()
 
+    @serialized
     def send_unit_data(self, msg):
         """ SendUnitData send encapsulated connected messages.
 
@@ -608,6 +1184,91 @@ class Base(object):
         self._receive()
         return self._check_reply()
 
+    @serialized
+    def send_unit_data_pipelined(self, messages, window=None):
+        """ SendUnitData with more than one connected message outstanding on the connection
+
+        Up to window messages are sent before waiting for a reply. Each reply is matched back to its request
+        through the sequence count carried by the connected message, so the target can answer in any order.
+        The replies are not checked, the caller has to load each one in self._reply and call _check_reply.
+
+        :param messages: list of connected messages (common packet format) to be send to the target
+        :param window: max number of outstanding messages, by default the 'pipeline window' attribute
+        :return: the list of replies received from the target, in the same order of the messages
+        """
+        return self.send_frames_pipelined(
+            [self.build_header(ENCAPSULATION_COMMAND["send_unit_data"], len(msg)) + msg for msg in messages], window)
+
+    @serialized
+    def send_frames_pipelined(self, frames, window=None):
+        """ send_unit_data_pipelined of messages already encapsulated, see send_frame
+
+        :param frames: list of complete send_unit_data messages, header included
+        :param window: max number of outstanding messages, by default the 'pipeline window' attribute
+        :return: the list of replies received from the target, in the same order of the frames
+        """
+        if window is None:
+            window = self.attribs['pipeline window']
+        window = max(1, window)
+
+        replies = [None] * len(frames)
+        pending = {}
+        next_message = 0
+        while next_message < len(frames) or pending:
+            while next_message < len(frames) and len(pending) < window:
+                self._message = frames[next_message]
+                # sequence count is the first word of the connected data item, after the address item
+                sequence_offset = HEADER_SIZE + 16 + unpack_uint(self._message[34:36])
+                pending[unpack_uint(self._message[sequence_offset:sequence_offset+2])] = next_message
+                self._send()
+                next_message += 1
+
+            self._receive()
+            if unpack_dint(self._reply[8:12]) != SUCCESS:
+                self._check_reply()
+                status = self._status
+                # the replies still outstanding must not be taken by the next request as its own
+                for outstanding in range(len(pending) - 1):
+                    self._receive()
+                self._status = status
+                raise CommError("send_unit_data_pipelined reply status:{0}".format(self._status))
+
+            sequence_offset = HEADER_SIZE + 16 + unpack_uint(self._reply[34:36])
+            sequence = unpack_uint(self._reply[sequence_offset:sequence_offset+2])
+            try:
+                # the receive buffer is reused, keep a copy of the reply
+                replies[pending.pop(sequence)] = memoryview(self._reply.tobytes())
+            except KeyError:
+                # the replies are out of step with the requests, none of the next ones can be trusted
+                self._drop_connection()
+                self._status = (3, "send_unit_data_pipelined received an unexpected sequence count {0}, "
+                                   "connection closed".format(sequence))
+                logger.warning(self._status)
+                raise CommError(self._status[1])
+        return replies
+
+    def _drop_connection(self):
+        """ close the socket without the forward close and the unregister session, the target is disconnected
+        """
+        try:
+            if self.__sock:
+                self.__sock.close()
+        except Exception as e:
+            logger.warning("_drop_connection() -> __sock.close Err: %s" % e)
+        self.clean_up()
+
+    @serialized
+    def send_frame(self, frame):
+        """ SendUnitData of a message already encapsulated, ex. a frame prepared once and patched for each send
+
+        :param frame: the complete send_unit_data message, header included
+        :return: the replay received from the target
+        """
+        self._message = frame
+        self._send()
+        self._receive()
+        return self._check_reply()
+
     def get_status(self):
         """ Get the last status/error
 
@@ -641,6 +1302,7 @@ class Base(object):
         except Exception as e:
             raise CommError(e)
 
+    @serialized
     def register_session(self):
         """ Register a new session with the communication partner
 
@@ -650,11 +1312,26 @@ class Base(object):
             return self._session
 
         self._session = 0
-        self._message = self.build_header(ENCAPSULATION_COMMAND['register_session'], 4)
-        self._message += pack_uint(self.attribs['protocol version'])
-        self._message += pack_uint(0)
+        self._message = self._build_register_session()
         self._send()
         self._receive()
+        return self._register_session_reply()
+
+    def _build_register_session(self):
+        """ Build the register session message
+
+        :return: the message ready to be sent to the target
+        """
+        msg = self.build_header(ENCAPSULATION_COMMAND['register_session'], 4)
+        msg += pack_uint(self.attribs['protocol version'])
+        msg += pack_uint(0)
+        return msg
+
+    def _register_session_reply(self):
+        """ Check the reply to a register session message and store the session received
+
+        :return: None if any error, otherwise return the session number
+        """
         if self._check_reply():
             self._session = unpack_dint(self._reply[4:8])
             logger.debug("Session ={0} has been registered.".format(print_bytes_line(self._reply[4:8])))
@@ -664,19 +1341,67 @@ class Base(object):
         logger.warning(self._status)
         return None
 
+    @serialized
     def forward_open(self):
         """ CIP implementation of the forward open message
 
         Refer to ODVA documentation Volume 1 3-5.5.2
 
+        When the 'connection size' attribute is bigger than a Forward Open allows, a Large Forward Open is tried
+        first and, if the target refuses it, a Forward Open with the default size. get_connection_size returns
+        the size negotiated.
+
         :return: False if any error in the replayed message
         """
         if self._session == 0:
             self._status = (4, "A session need to be registered before to call forward_open.")
             raise CommError("A session need to be registered before to call forward open")
 
+        size = self.attribs['connection size']
+        if size > MAX_FORWARD_OPEN_SIZE:
+            if self.send_rr_data(self._build_forward_open(size)):
+                return self._forward_open_reply(size)
+            logger.warning("Large Forward Open refused {0}, falling back to Forward Open".format(self._status))
+            self.clear()
+
+        if self.send_rr_data(self._build_forward_open()):
+            return self._forward_open_reply(CONNECTION_PARAMETER['Default'] & MAX_FORWARD_OPEN_SIZE)
+        self._status = (4, "forward_open returned False")
+        return False
+
+    def _forward_open_reply(self, size):
+        """ store the connection opened by a forward open
+
+        :param size: the connection size requested, the target grants it or refuses the connection
+        :return: True
+        """
+        self._target_cid = self._reply[44:48].tobytes()
+        self._target_is_connected = True
+        self._connection_size = size
+        return True
+
+    def get_connection_size(self):
+        """ Return the size of the connected messages negotiated with the target by the forward open
+
+        :return: the size in bytes, sequence count included
+        """
+        return self._connection_size
+
+    def _build_forward_open(self, large_size=None):
+        """ Build the forward open message
+
+        :param large_size: build a Large Forward Open asking for a connection of this size
+        :return: the message ready for send_rr_data
+        """
+        if large_size is None:
+            service = FORWARD_OPEN
+            connection_parameter = pack_uint(CONNECTION_PARAMETER['Default'])
+        else:
+            service = LARGE_FORWARD_OPEN
+            connection_parameter = pack_dint(LARGE_CONNECTION_PARAMETER | large_size)
+
         forward_open_msg = [
-            FORWARD_OPEN,
+            service,
             pack_usint(2),
             CLASS_ID["8-bit"],
             CLASS_CODE["Connection Manager"],  # Volume 1: 5-1
@@ -692,9 +1417,9 @@ class Base(object):
             TIMEOUT_MULTIPLIER,
             '\x00\x00\x00',
             pack_dint(self.attribs['rpi'] * 1000),
-            pack_uint(CONNECTION_PARAMETER['Default']),
+            connection_parameter,
             pack_dint(self.attribs['rpi'] * 1000),
-            pack_uint(CONNECTION_PARAMETER['Default']),
+            connection_parameter,
             TRANSPORT_CLASS,  # Transport Class
             # CONNECTION_SIZE['Backplane'],
             # pack_usint(self.attribs['backplane']),
@@ -705,7 +1430,7 @@ class Base(object):
             pack_usint(1)
         ]
 
-        if self.__direct_connections:
+        if self._direct_connections:
             forward_open_msg[20:1] = [
                 CONNECTION_SIZE['Direct Network'],
             ]
@@ -716,14 +1441,9 @@ class Base(object):
                 pack_usint(self.attribs['cpu slot'])
             ]
 
-        if self.send_rr_data(
-                build_common_packet_format(DATA_ITEM['Unconnected'], ''.join(forward_open_msg), ADDRESS_ITEM['UCMM'],)):
-            self._target_cid = self._reply[44:48]
-            self._target_is_connected = True
-            return True
-        self._status = (4, "forward_open returned False")
-        return False
+        return build_common_packet_format(DATA_ITEM['Unconnected'], ''.join(forward_open_msg), ADDRESS_ITEM['UCMM'],)
 
+    @serialized
     def forward_close(self):
         """ CIP implementation of the forward close message
 
@@ -737,6 +1457,18 @@ class Base(object):
             self._status = (5, "A session need to be registered before to call forward_close.")
             raise CommError("A session need to be registered before to call forward_close.")
 
+        if self.send_rr_data(self._build_forward_close()):
+            self._target_is_connected = False
+            return True
+        self._status = (5, "forward_close returned False")
+        logger.warning(self._status)
+        return False
+
+    def _build_forward_close(self):
+        """ Build the forward close message
+
+        :return: the message ready for send_rr_data
+        """
         forward_close_msg = [
             FORWARD_CLOSE,
             pack_usint(2),
@@ -759,7 +1491,7 @@ class Base(object):
             pack_usint(1)
         ]
 
-        if self.__direct_connections:
+        if self._direct_connections:
             forward_close_msg[11:2] = [
                 CONNECTION_SIZE['Direct Network'],
                 '\x00'
@@ -772,14 +1504,9 @@ class Base(object):
                 pack_usint(self.attribs['cpu slot'])
             ]
 
-        if self.send_rr_data(
-                build_common_packet_format(DATA_ITEM['Unconnected'], ''.join(forward_close_msg), ADDRESS_ITEM['UCMM'])):
-            self._target_is_connected = False
-            return True
-        self._status = (5, "forward_close returned False")
-        logger.warning(self._status)
-        return False
+        return build_common_packet_format(DATA_ITEM['Unconnected'], ''.join(forward_close_msg), ADDRESS_ITEM['UCMM'])
 
+    @serialized
     def un_register_session(self):
         """ Un-register a connection
 
@@ -794,7 +1521,8 @@ class Base(object):
         :return: true if no error otherwise false
         """
         try:
-            logger.debug(print_bytes_msg(self._message, '-------------- SEND --------------'))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(print_bytes_msg(self._message, '-------------- SEND --------------'))
             self.__sock.send(self._message)
         except Exception as e:
             # self.clean_up()
@@ -807,11 +1535,13 @@ class Base(object):
         """
         try:
             self._reply = self.__sock.receive()
-            logger.debug(print_bytes_msg(self._reply, '----------- RECEIVE -----------'))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(print_bytes_msg(self._reply, '----------- RECEIVE -----------'))
         except Exception as e:
             # self.clean_up()
             raise CommError(e)
 
+    @serialized
     def open(self, ip_address, direct_connection=False):
         """
         socket open
@@ -819,7 +1549,7 @@ class Base(object):
         :return: true if no error otherwise false
         """
         # set type of connection needed
-        self.__direct_connections = direct_connection
+        self._direct_connections = direct_connection
 
         # handle the socket layer
         if not self._connection_opened:
@@ -842,6 +1572,7 @@ class Base(object):
                 # self.clean_up()
                 raise CommError(e)
 
+    @serialized
     def close(self):
         """
         socket close
@@ -37,7 +37,8 @@ CLASS_ID = {
 
 INSTANCE_ID = {
     "8-bit": '\x24',
-    "16-bit": '\x25'
+    "16-bit": '\x25',
+    "32-bit": '\x26'
 }
 
 ATTRIBUTE_ID = {
@@ -77,6 +78,7 @@ When a UDT is created, an instance of the Template object (Class ID 0x6C) is
 created to hold information about the structure makeup.
 """
 CLASS_CODE = {
+    "Identity Object": '\x01',
     "Message Router": '\x02',  # Volume 1: 5-1
     "Symbol Object": '\x6b',
     "Template Object": '\x6c',
@@ -103,6 +105,7 @@ TAG_SERVICES_REQUEST = {
     "Multiple Service Packet": 0x0a,
     "Get Instance Attributes List": 0x55,
     "Get Attributes": 0x03,
+    "Get Attributes All": 0x01,
     "Read Template": 0x4c,
 }
 
@@ -115,6 +118,7 @@ TAG_SERVICES_REPLY = {
     0x8a: "Multiple Service Packet",
     0xd5: "Get Instance Attributes List",
     0x83: "Get Attributes",
+    0x81: "Get Attributes All",
     0xcc: "Read Template"
 }
 
@@ -128,6 +132,7 @@ I_TAG_SERVICES_REPLY = {
     "Multiple Service Packet": 0x8a,
     "Get Instance Attributes List": 0xd5,
     "Get Attributes": 0x83,
+    "Get Attributes All": 0x81,
     "Read Template": 0xcc
 }
 
@@ -308,6 +313,17 @@ GET_CONNECTION_DATA = '\x56'
 SEARCH_CONNECTION_DATA = '\x57'
 GET_CONNECTION_OWNER = '\x5a'
 MR_SERVICE_SIZE = 2
+# Bytes around the services of a connected Multiple Service Packet:
+# request: sequence count, service, path size, path (4) and number of services
+# reply: sequence count, service, reserved, status, extended status size and number of replies
+MSP_REQUEST_OVERHEAD = 10
+MSP_REPLY_OVERHEAD = 8
+# Bytes of the reply of a Read Tag before the value: service, reserved, status, extended status size and data type
+READ_REPLY_OVERHEAD = 6
+# Bytes of the reply of a Write Tag: service, reserved, status and extended status size
+WRITE_REPLY_SIZE = 4
+# Data type of a structure read or written as a whole, it is followed by the 2 bytes of the structure handle
+STRUCTURE_TYPE = 0x02a0
 
 PADDING_BYTE = '\x00'
 PRIORITY = '\x0a'
@@ -323,6 +339,12 @@ CONNECTION_PARAMETER = {
     'Default': 0x43f8,
 }
 
+# Large Forward Open network connection parameters: point to point, low priority, variable size. The size goes in
+# the low 16 bits
+LARGE_CONNECTION_PARAMETER = 0x42000000
+# The biggest connection size allowed by the Forward Open (9 bits), above it the Large Forward Open is needed
+MAX_FORWARD_OPEN_SIZE = 0x1ff
+
 """
 Atomic Data Type:
 
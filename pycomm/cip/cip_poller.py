@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+#
+# cip_poller.py - Scan lists run against many controllers from a single thread
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+The poller owns the asynchronous drivers of many controllers and runs their scan lists from the thread calling
+run(). Every target goes through its own connect, register session and forward open, and reconnects after an
+error, while the others keep scanning:
+
+    from pycomm.ab_comm import clx, slc
+    from pycomm.cip.cip_poller import Poller
+
+    def changed(name, values):
+        print name, values
+
+    poller = Poller()
+    poller.add_target('press', clx.AsyncDriver, '192.168.1.10', [['Counts', 'ControlWord']], 1.0, changed)
+    poller.add_target('line2', slc.AsyncDriver, '192.168.1.20', ['N7:0', ('F8:0', 4)], 0.5, changed)
+    poller.run()
+
+Each item of a scan list holds the arguments of one read_tag of the driver: a tag, a list of tags or a tuple.
+"""
+import asyncore
+import select
+import time
+
+from pycomm.cip.cip_async import check_timeouts
+from pycomm.cip.cip_base import CommError, DataError
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+# The states of a target
+DOWN = 0        # waiting to connect
+CONNECTING = 1  # open and forward open in progress
+CONNECTED = 2   # scanning
+
+
+class Target(object):
+    """ A controller of the poller: its driver, its scan list and where it is in the connection state machine
+    """
+    def __init__(self, name, driver, ip_address, scan_list, interval, callback, errback, direct_connection):
+        self.name = name
+        self.driver = driver
+        self.ip_address = ip_address
+        self.scan_list = list(scan_list)
+        self.interval = interval
+        self.callback = callback
+        self.errback = errback
+        self.direct_connection = direct_connection
+        self.state = DOWN
+        self.next_time = 0.0    # when the next connect or scan is due
+        self.scanning = False
+        self.values = None      # the results of the last scan
+        self.scan_count = 0
+        self.error_count = 0
+
+
+class Poller(object):
+    """ Run the scan lists of many controllers on non blocking sessions
+
+    :param retry_interval: seconds waited before connecting again to a target that failed
+    """
+    def __init__(self, retry_interval=5.0):
+        self.retry_interval = retry_interval
+        self._map = {}
+        self._targets = {}
+        self._running = False
+
+    def add_target(self, name, driver_class, ip_address, scan_list, interval, callback=None, errback=None,
+                   direct_connection=False, timeout=5.0, **attribs):
+        """ Add a controller to poll
+
+        :param name: the name of the target, passed to the callbacks
+        :param driver_class: an asynchronous driver, ex. pycomm.ab_comm.clx.AsyncDriver or slc.AsyncDriver
+        :param ip_address: the ip address of the controller
+        :param scan_list: the list of the read_tag to run at each scan, each item is a tag, a list or a tuple of
+                          arguments
+        :param interval: seconds between the start of two scans
+        :param callback: called as callback(name, values) at the end of each scan, values in the order of scan_list
+        :param errback: called as errback(name, error) when the target fails and the session is closed
+        :param direct_connection: see Base.open
+        :param timeout: seconds waited for each reply of this target
+        :param attribs: the driver attributes, with the spaces of the names replaced by underscores (ex. cpu_slot=2)
+        :return: the Target
+        """
+        if name in self._targets:
+            raise DataError("Target {0} already added".format(name))
+        driver = driver_class(sock_map=self._map, timeout=timeout)
+        for attrib, value in attribs.items():
+            driver.attribs[attrib.replace('_', ' ')] = value
+        target = Target(name, driver, ip_address, scan_list, interval, callback, errback, direct_connection)
+        self._targets[name] = target
+        return target
+
+    def remove_target(self, name):
+        """ Stop polling a controller and close its session
+        """
+        target = self._targets.pop(name)
+        target.state = DOWN
+        target.driver.close()
+
+    def get_target(self, name):
+        return self._targets[name]
+
+    def _connect(self, target):
+        target.state = CONNECTING
+
+        def opened(future):
+            if future.exception() is not None or not future.result():
+                return self._fail(target, future.exception() or CommError(target.driver.get_status()))
+            target.driver.forward_open().add_done_callback(connected)
+
+        def connected(future):
+            if future.exception() is not None or not future.result():
+                return self._fail(target, future.exception() or CommError(target.driver.get_status()))
+            target.state = CONNECTED
+            target.next_time = time.time()
+            logger.debug("Target {0} connected".format(target.name))
+
+        target.driver.open(target.ip_address, target.direct_connection).add_done_callback(opened)
+
+    def _scan(self, target):
+        target.scanning = True
+        target.next_time = max(target.next_time + target.interval, time.time())
+        futures = [target.driver.read_tag(*(item if isinstance(item, tuple) else (item,)))
+                   for item in target.scan_list]
+        pending = [len(futures)]
+
+        def done(future):
+            pending[0] -= 1
+            if pending[0] or target.state != CONNECTED:
+                return
+            target.scanning = False
+            values = []
+            for item, f in zip(target.scan_list, futures):
+                error = f.exception()
+                if isinstance(error, CommError):
+                    return self._fail(target, error)
+                if error is not None:
+                    logger.warning("Target {0} cannot read {1}: {2}".format(target.name, item, error))
+                values.append(None if error is not None else f.result())
+            target.values = values
+            target.scan_count += 1
+            if target.callback is not None:
+                target.callback(target.name, values)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    def _fail(self, target, error):
+        """ close the session of a failed target, it is connected again after retry_interval
+        """
+        if target.state == DOWN:
+            return
+        logger.warning("Target {0} failed: {1}".format(target.name, error))
+        target.state = DOWN
+        target.scanning = False
+        target.error_count += 1
+        target.next_time = time.time() + self.retry_interval
+        target.driver.close()
+        if target.errback is not None:
+            target.errback(target.name, error)
+
+    def poll(self, timeout=0.1):
+        """ Start the connections and the scans that are due, then serve the network for at most timeout seconds
+
+        :return: the number of targets connected
+        """
+        now = time.time()
+        wake_up = now + timeout
+        for target in self._targets.values():
+            if target.state == DOWN and now >= target.next_time:
+                self._connect(target)
+            elif target.state == CONNECTED and not target.scanning and now >= target.next_time:
+                self._scan(target)
+            if target.state != CONNECTING and not target.scanning:
+                wake_up = min(wake_up, target.next_time)
+
+        wait = max(0.0, wake_up - time.time())
+        if self._map:
+            asyncore.loop(wait, hasattr(select, 'poll'), self._map, 1)
+        else:
+            time.sleep(wait)
+        check_timeouts(self._map)
+        return sum(1 for target in self._targets.values() if target.state == CONNECTED)
+
+    def run(self, duration=None):
+        """ Poll until stop() is called or for duration seconds
+        """
+        deadline = None if duration is None else time.time() + duration
+        self._running = True
+        while self._running and (deadline is None or time.time() < deadline):
+            self.poll()
+
+    def stop(self):
+        self._running = False
+
+    def close(self):
+        """ Close the sessions of all the targets, waiting for the operations in progress to end or time out
+        """
+        timeout = max([target.driver._timeout for target in self._targets.values()] or [0.0])
+        for name in list(self._targets):
+            self.remove_target(name)
+        deadline = time.time() + timeout + 1.0
+        while self._map and time.time() < deadline:
+            asyncore.loop(0.05, hasattr(select, 'poll'), self._map, 1)
+            check_timeouts(self._map)
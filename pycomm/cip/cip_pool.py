@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# cip_pool.py - Pool of Ethernet/IP sessions shared by the requests to the same controllers
+#
+#
+# Copyright (c) 2014 Agostino Ruscito <ruscito@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+"""
+A pool keeps the sessions to the controllers open between the requests, so a request pays only the round trip of
+its own services:
+
+    from pycomm.ab_comm.clx import Driver
+    from pycomm.cip.cip_pool import ConnectionPool
+
+    pool = ConnectionPool(Driver, max_sessions=4, idle_timeout=300)
+    with pool.connection('192.168.1.10') as c:
+        print c.read_tag('Counts')
+
+The sessions are keyed by ip address, type of connection and driver attributes (backplane, cpu slot, port...), so
+the same pool can serve many controllers.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from pycomm.cip.cip_base import CommError, DataError
+
+import logging
+try:  # Python 2.7+
+    from logging import NullHandler
+except ImportError:
+    class NullHandler(logging.Handler):
+        def emit(self, record):
+            pass
+logger = logging.getLogger(__name__)
+logger.addHandler(NullHandler())
+
+
+class ConnectionPool(object):
+    """ Pool of open drivers, with the forward open already done, for each controller
+
+    :param driver_class: the driver to create, ex. pycomm.ab_comm.clx.Driver
+    :param min_sessions: the sessions of a controller kept open even when idle
+    :param max_sessions: the max number of sessions open to a controller, checkout waits when all are in use
+    :param idle_timeout: seconds after which an idle session beyond min_sessions is closed
+    :param check_interval: a session idle for more than these seconds is checked with list_identity before being
+                           handed out
+    :param checkout_timeout: max seconds checkout waits for a session, None to wait forever
+    """
+    def __init__(self, driver_class, min_sessions=0, max_sessions=4, idle_timeout=60.0, check_interval=10.0,
+                 checkout_timeout=None):
+        if max_sessions < 1 or min_sessions > max_sessions:
+            raise DataError("ConnectionPool needs 0 <= min_sessions <= max_sessions and max_sessions >= 1")
+        self.driver_class = driver_class
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.checkout_timeout = checkout_timeout
+        self._condition = threading.Condition()
+        self._idle = {}         # key -> deque of (driver, time of the checkin)
+        self._open = {}         # key -> number of sessions open, idle or in use
+        self._keys = {}         # id(driver) -> key
+        self._closed = False
+
+    def _key(self, ip_address, direct_connection, attribs):
+        return ip_address, direct_connection, tuple(sorted(attribs.items()))
+
+    def checkout(self, ip_address, direct_connection=False, **attribs):
+        """ Take a session to the controller, opening it if no idle one is available
+
+        :param ip_address: the ip address of the controller
+        :param direct_connection: the type of connection, see Base.open
+        :param attribs: the driver attributes to set before opening, with the spaces of the names replaced by
+                        underscores (ex. cpu_slot=2)
+        :return: a driver connected to the controller, to be given back with checkin
+        """
+        attribs = dict((name.replace('_', ' '), value) for name, value in attribs.items())
+        key = self._key(ip_address, direct_connection, attribs)
+        deadline = None if self.checkout_timeout is None else time.time() + self.checkout_timeout
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise CommError("The connection pool is closed")
+                idle = self._idle.get(key)
+                if idle:
+                    driver, last_used = idle.pop()
+                    break
+                if self._open.get(key, 0) < self.max_sessions:
+                    self._open[key] = self._open.get(key, 0) + 1
+                    driver, last_used = None, None
+                    break
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    raise CommError("No session available for {0} in {1} seconds".format(
+                        ip_address, self.checkout_timeout))
+                self._condition.wait(remaining)
+
+        # the network is used out of the lock
+        if driver is not None and time.time() - last_used > self.check_interval and not self._healthy(driver):
+            logger.warning("Session to {0} failed the health check, opening a new one".format(ip_address))
+            self._close(driver)
+            driver = None
+        if driver is None:
+            try:
+                driver = self._connect(ip_address, direct_connection, attribs)
+            except Exception:
+                with self._condition:
+                    self._open[key] -= 1
+                    self._condition.notify()
+                raise
+        with self._condition:
+            self._keys[id(driver)] = key
+        return driver
+
+    def checkin(self, driver, discard=False):
+        """ Give back a session taken with checkout
+
+        :param driver: the driver returned by checkout
+        :param discard: close the session instead of keeping it, ex. after a communication error
+        """
+        with self._condition:
+            key = self._keys.pop(id(driver), None)
+            if key is None:
+                raise DataError("checkin of a driver not checked out from this pool, or already checked in")
+            if discard or self._closed or not driver.is_connected():
+                self._open[key] -= 1
+                driver_to_close = driver
+            else:
+                self._idle.setdefault(key, deque()).append((driver, time.time()))
+                driver_to_close = None
+            self._condition.notify()
+        if driver_to_close is not None:
+            self._close(driver_to_close)
+        self.evict_idle()
+
+    @contextmanager
+    def connection(self, ip_address, direct_connection=False, **attribs):
+        """ checkout a session for the with block, the session is discarded if the block raises CommError
+        """
+        driver = self.checkout(ip_address, direct_connection, **attribs)
+        try:
+            yield driver
+        except CommError:
+            self.checkin(driver, discard=True)
+            raise
+        except:
+            self.checkin(driver)
+            raise
+        else:
+            self.checkin(driver)
+
+    def warm_up(self, ip_address, direct_connection=False, **attribs):
+        """ Open the min_sessions of a controller in advance
+        """
+        drivers = [self.checkout(ip_address, direct_connection, **attribs) for i in range(self.min_sessions)]
+        for driver in drivers:
+            self.checkin(driver)
+
+    def evict_idle(self, now=None):
+        """ Close the sessions idle for more than idle_timeout, keeping min_sessions open for each controller
+
+        It runs at every checkin, call it periodically if the pool may stay unused for long.
+        """
+        if now is None:
+            now = time.time()
+        expired = []
+        with self._condition:
+            for key, idle in self._idle.items():
+                # the oldest sessions are on the left
+                while idle and self._open[key] > self.min_sessions and now - idle[0][1] > self.idle_timeout:
+                    expired.append(idle.popleft()[0])
+                    self._open[key] -= 1
+        for driver in expired:
+            self._close(driver)
+
+    def close(self):
+        """ Close all the idle sessions, the sessions in use are closed when they are given back
+        """
+        with self._condition:
+            self._closed = True
+            idle = [driver for sessions in self._idle.values() for driver, last_used in sessions]
+            for key, sessions in self._idle.items():
+                self._open[key] -= len(sessions)
+            self._idle = {}
+            self._condition.notify_all()
+        for driver in idle:
+            self._close(driver)
+
+    def _connect(self, ip_address, direct_connection, attribs):
+        driver = self.driver_class()
+        for name, value in attribs.items():
+            driver.attribs[name] = value
+        if not driver.open(ip_address, direct_connection):
+            status = driver.get_status()
+            self._close(driver)
+            raise CommError("Cannot open a session with {0}: {1}".format(ip_address, status))
+        if not driver.forward_open():
+            status = driver.get_status()
+            self._close(driver)
+            raise CommError("Forward open to {0} failed: {1}".format(ip_address, status))
+        return driver
+
+    def _healthy(self, driver):
+        try:
+            return driver.list_identity()
+        except Exception as e:
+            logger.warning("Health check error: {0}".format(e))
+            return False
+
+    def _close(self, driver):
+        try:
+            driver.close()
+        except Exception as e:
+            logger.warning("Error closing a pooled session: {0}".format(e))
@@ -1,6 +1,6 @@
 __author__ = 'Agostino Ruscito'
-__version__ = "1.0.8"
-__date__ = "08 03 2015"
+__version__ = "1.1.0"
+__date__ = "18 10 2026"
 
 
 class PycommError(Exception):
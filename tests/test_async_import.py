@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+""" The blocking drivers import without asyncore, removed from Python 3.12
+"""
+import sys
+import unittest
+from importlib import import_module
+
+from pycomm.cip.cip_base import CommError
+
+MODULES = ('asyncore', 'pycomm.cip.cip_async', 'pycomm.ab_comm.clx', 'pycomm.ab_comm.slc')
+
+
+class WithoutAsyncoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved = dict((name, sys.modules.get(name)) for name in MODULES)
+        for name in MODULES:
+            sys.modules.pop(name, None)
+        # a None entry makes the import fail
+        sys.modules['asyncore'] = None
+
+    def tearDown(self):
+        for name, module in self.saved.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+                if '.' in name:
+                    package, child = name.rsplit('.', 1)
+                    setattr(sys.modules[package], child, module)
+
+    def test_drivers(self):
+        for name in ('pycomm.ab_comm.clx', 'pycomm.ab_comm.slc'):
+            module = import_module(name)
+            module.Driver()
+            self.assertRaises(CommError, module.AsyncDriver)
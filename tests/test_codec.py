@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+""" DataCodec: the codecs of the atomic types agree with the pack and unpack functions they replace
+"""
+import array
+import struct
+import unittest
+
+from pycomm.cip.cip_base import DataError, DATA_CODEC, PCCC_DATA_CODEC, PACK_DATA_FUNCTION, \
+    UNPACK_DATA_FUNCTION, PACK_PCCC_DATA_FUNCTION, UNPACK_PCCC_DATA_FUNCTION, get_codec
+
+SAMPLES = {
+    'BOOL': [0, 1],
+    'SINT': [-128, 0, 127],
+    'INT': [-32768, -1, 32767],
+    'DINT': [-2 ** 31, 7, 2 ** 31 - 1],
+    'LINT': [-2 ** 63, 1099511627776, 2 ** 63 - 1],
+    'REAL': [-1.5, 0.0, 72.25],
+}
+
+
+class DataCodecTest(unittest.TestCase):
+
+    def test_same_as_the_functions(self):
+        for name, values in SAMPLES.items():
+            codec = get_codec(name)
+            for value in values:
+                self.assertEqual(codec.pack(value), PACK_DATA_FUNCTION[name](value))
+                self.assertEqual(codec.unpack_from(PACK_DATA_FUNCTION[name](value)),
+                                 UNPACK_DATA_FUNCTION[name](PACK_DATA_FUNCTION[name](value)))
+
+    def test_lookup(self):
+        self.assertIs(get_codec('DINT'), DATA_CODEC[0xc4])
+        self.assertEqual(get_codec(0xca).name, 'REAL')
+        self.assertRaises(LookupError, get_codec, 'Recipe')
+
+    def test_arrays(self):
+        codec = get_codec('DINT')
+        data = codec.pack_array([1, -2, 3])
+        self.assertEqual(data, struct.pack('<3i', 1, -2, 3))
+        self.assertEqual(codec.unpack_array_from('xx' + data, 2), (1, -2, 3))
+        self.assertEqual(codec.unpack_array_from(memoryview(data), 4, 1), (-2,))
+        buf = bytearray(14)
+        codec.pack_array_into(buf, 2, [1, -2, 3])
+        self.assertEqual(str(buf[2:]), data)
+        self.assertIs(codec.array(3), codec.array(3))
+
+    def test_bool_not_zero_is_one(self):
+        codec = get_codec('BOOL')
+        self.assertEqual(codec.unpack_from('\xff'), 1)
+        self.assertEqual(codec.unpack_array_from('\x00\x05\xff'), (0, 1, 1))
+        self.assertEqual(list(codec.unpack_typed('\x00\x05', 'array')), [0, 1])
+
+    def test_typed(self):
+        codec = get_codec('INT')
+        values = codec.unpack_typed(bytearray(codec.pack_array([5, -6])), 'array')
+        self.assertEqual(values, array.array(values.typecode, [5, -6]))
+        self.assertEqual(codec.pack_typed(values), codec.pack_array([5, -6]))
+        self.assertEqual(codec.pack_typed(array.array('i', [5, -6])), codec.pack_array([5, -6]))
+        self.assertRaises(DataError, codec.unpack_typed, '', 'list')
+
+    def test_pccc(self):
+        for file_type, codec in PCCC_DATA_CODEC.items():
+            value = 2.5 if file_type == 'F' else -7
+            self.assertEqual(codec.pack(value), PACK_PCCC_DATA_FUNCTION[file_type](value))
+            self.assertEqual(codec.unpack_from(codec.pack(value)),
+                             UNPACK_PCCC_DATA_FUNCTION[file_type](codec.pack(value)))
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" load_l5x: the tags and the templates of an L5X export
+"""
+import unittest
+from StringIO import StringIO
+
+from pycomm.ab_comm.l5x import load_l5x
+from pycomm.cip.cip_base import DataError, StructCodec
+
+PROJECT = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<RSLogix5000Content SchemaRevision="1.0" SoftwareRevision="30.00" TargetName="Line" TargetType="Controller">
+<Controller Use="Target" Name="Line" ProcessorType="1756-L75">
+<DataTypes>
+<DataType Name="Point" Family="NoFamily" Class="User">
+<Members>
+<Member Name="X" DataType="INT" Dimension="0" Hidden="false"/>
+<Member Name="Y" DataType="INT" Dimension="0" Hidden="false"/>
+<Member Name="Z" DataType="DINT" Dimension="0" Hidden="false"/>
+</Members>
+</DataType>
+<DataType Name="Recipe" Family="NoFamily" Class="User">
+<Members>
+<Member Name="ZZZZZZZZZZRecipe0" DataType="SINT" Dimension="0" Hidden="true"/>
+<Member Name="Enable" DataType="BIT" Dimension="0" Hidden="false" Target="ZZZZZZZZZZRecipe0" BitNumber="0"/>
+<Member Name="Done" DataType="BIT" Dimension="0" Hidden="false" Target="ZZZZZZZZZZRecipe0" BitNumber="3"/>
+<Member Name="Speed" DataType="REAL" Dimension="0" Hidden="false"/>
+<Member Name="Steps" DataType="INT" Dimension="3" Hidden="false"/>
+<Member Name="Pos" DataType="Point" Dimension="0" Hidden="false"/>
+<Member Name="Big" DataType="LINT" Dimension="0" Hidden="false"/>
+</Members>
+</DataType>
+<DataType Name="Uses" Family="NoFamily" Class="User">
+<Members>
+<Member Name="M" DataType="AB:Embedded_Module:I:0" Dimension="0" Hidden="false"/>
+</Members>
+</DataType>
+</DataTypes>
+<Tags>
+<Tag Name="Counts" TagType="Base" DataType="INT">
+<Data Format="L5K"><![CDATA[26]]></Data>
+</Tag>
+<Tag Name="Flag" TagType="Base" DataType="BOOL"/>
+<Tag Name="Grid" TagType="Base" DataType="REAL" Dimensions="3 4"/>
+<Tag Name="Rec" TagType="Base" DataType="Recipe"/>
+<Tag Name="T1" TagType="Base" DataType="TIMER"/>
+<Tag Name="Alias1" TagType="Alias" AliasFor="Counts"/>
+<Tag Name="U" TagType="Base" DataType="Uses"/>
+</Tags>
+<Programs>
+<Program Name="Main"><Tags><Tag Name="Local" TagType="Base" DataType="DINT"/></Tags></Program>
+</Programs>
+</Controller>
+</RSLogix5000Content>
+"""
+
+
+class L5XTest(unittest.TestCase):
+
+    def setUp(self):
+        self.project = load_l5x(StringIO(PROJECT))
+
+    def test_controller_scope_tags(self):
+        self.assertEqual(self.project.controller, 'Line')
+        tags = dict((tag['tag_name'], tag) for tag in self.project.tags)
+        self.assertEqual(sorted(tags), ['Counts', 'Flag', 'Grid', 'Rec', 'T1', 'U'])
+        self.assertEqual(tags['Grid']['dimensions'], [3, 4])
+        self.assertEqual(tags['Grid']['dim'], 2)
+        self.assertEqual(tags['Flag']['bit_position'], 0)
+        self.assertEqual(tags['Rec']['udt']['internal_tags'], ['Enable', 'Done', 'Speed', 'Steps', 'Pos', 'Big'])
+        self.assertNotIn('template', tags['U'])
+
+    def test_template_offsets(self):
+        recipe = self.project.templates['Recipe']
+        members = [(m['name'], m['offset'], m.get('bit')) for m in recipe['members']]
+        self.assertEqual(members, [('ZZZZZZZZZZRecipe0', 0, None), ('Enable', 0, 0), ('Done', 0, 3),
+                                   ('Speed', 4, None), ('Steps', 8, None), ('Pos', 16, None), ('Big', 24, None)])
+        self.assertEqual(self.project.templates['Point']['size'], 8)
+        self.assertEqual(recipe['size'], 32)
+        timer = self.project.templates['TIMER']
+        self.assertEqual([(m['name'], m['offset'], m['bit']) for m in timer['members'][3:]],
+                         [('EN', 3, 7), ('TT', 3, 6), ('DN', 3, 5)])
+        self.assertNotIn('Uses', self.project.templates)
+
+    def test_templates_decode(self):
+        codec = StructCodec(self.project.templates['Recipe'], self.project.templates.get)
+        value = codec.decode(codec.encode({'Enable': 1, 'Done': 0, 'Speed': 1.5, 'Steps': [1, 2, 3],
+                                           'Pos': {'X': 1, 'Y': 2, 'Z': 3}, 'Big': 1 << 40}))
+        self.assertEqual(value['Big'], 1 << 40)
+        self.assertEqual(dict(value['Pos']), {'X': 1, 'Y': 2, 'Z': 3})
+
+    def test_tag_types(self):
+        types = self.project.tag_types()
+        self.assertEqual(types['Counts'], 'INT')
+        self.assertEqual(types['Rec.Pos.Z'], 'DINT')
+        self.assertEqual(types['T1.ACC'], 'DINT')
+        self.assertNotIn('Grid', types)
+        self.assertNotIn('Rec.Steps', types)
+        self.assertNotIn('Local', types)
+
+    def test_malformed_file(self):
+        self.assertRaises(DataError, load_l5x, StringIO(PROJECT[:len(PROJECT) // 2]))
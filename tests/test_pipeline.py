@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+""" send_unit_data_pipelined: replies matched by sequence count, window, error handling
+"""
+import unittest
+
+from pycomm.ab_comm.clx import Driver
+from pycomm.cip.cip_base import CommError, build_common_packet_format, pack_uint
+from pycomm.cip.cip_const import DATA_ITEM, ADDRESS_ITEM
+
+from tests.transport import CID, connect, connected_request, connected_reply
+
+
+def message(sequence):
+    return build_common_packet_format(DATA_ITEM['Connected'], pack_uint(sequence) + '\x4c\x02\x20\x6b\x24\x01',
+                                      ADDRESS_ITEM['Connection Based'], addr_data=CID)
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = Driver()
+
+    def test_replies_in_any_order(self):
+        sock = connect(self.driver)
+        sock.replies.extend(connected_reply(sequence, 0x4c, data=chr(sequence)) for sequence in (2, 0, 1))
+        replies = self.driver.send_unit_data_pipelined([message(s) for s in range(3)], window=3)
+        self.assertEqual([reply.tobytes()[-1] for reply in replies], ['\x00', '\x01', '\x02'])
+
+    def test_window(self):
+        outstanding = []
+
+        def handler(frame):
+            outstanding.append(len(sock.sent) - sock.received)
+            sequence, service, path, data = connected_request(frame)
+            return connected_reply(sequence, service)
+
+        sock = connect(self.driver, handler)
+        replies = self.driver.send_unit_data_pipelined([message(s) for s in range(10)], window=4)
+        self.assertEqual(len(replies), 10)
+        self.assertEqual(max(outstanding), 4)
+
+    def test_window_attribute(self):
+        sock = connect(self.driver, lambda frame: connected_reply(connected_request(frame)[0], 0x4c))
+        self.driver.attribs['pipeline window'] = 1
+        self.driver.send_unit_data_pipelined([message(s) for s in range(3)])
+        self.assertEqual(sock.received, 3)
+
+    def test_error_status_drains_the_replies_in_flight(self):
+        sock = connect(self.driver)
+        sock.replies.extend([connected_reply(0, 0x4c, encapsulation_status=1),
+                             connected_reply(1, 0x4c), connected_reply(2, 0x4c), 'next'])
+        self.assertRaises(CommError, self.driver.send_unit_data_pipelined, [message(s) for s in range(4)], 3)
+        self.assertEqual(list(sock.replies), ['next'])
+        self.assertFalse(sock.closed)
+
+    def test_unexpected_sequence_closes_the_connection(self):
+        sock = connect(self.driver)
+        sock.replies.append(connected_reply(77, 0x4c))
+        self.assertRaises(CommError, self.driver.send_unit_data_pipelined, [message(s) for s in range(3)], 3)
+        self.assertTrue(sock.closed)
+        self.assertFalse(self.driver._target_is_connected)
+        self.assertFalse(self.driver.is_connected())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+""" The packing of the services of a multi tag request in multiple service packets
+"""
+import unittest
+
+from pycomm.ab_comm.clx import Driver
+from pycomm.cip.cip_const import MSP_REQUEST_OVERHEAD, MSP_REPLY_OVERHEAD, READ_REPLY_OVERHEAD
+
+
+def packet_sizes(items, indexes):
+    """ the request and the reply size of the multiple service packet of some items
+    """
+    request = MSP_REQUEST_OVERHEAD + sum(len(s) + 2 for i in indexes for s in items[i][0])
+    reply = MSP_REPLY_OVERHEAD + sum(items[i][1] + 2 * len(items[i][0]) for i in indexes)
+    return request, reply
+
+
+class PlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = Driver()
+        self.driver._connection_size = 500
+
+    def check(self, items, batches):
+        self.assertEqual(sorted(i for batch in batches for i in batch), range(len(items)))
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch))
+            if len(batch) > 1:
+                self.assertTrue(max(packet_sizes(items, batch)) <= 500)
+
+    def test_fits_the_connection(self):
+        items = [(['x' * (10 + i % 7)], 4 + (i * 13) % 90) for i in range(300)]
+        batches = self.driver._plan_multiple_requests(items)
+        self.check(items, batches)
+        # first fit from the biggest item stays close to the total size over the connection size
+        total = sum(max(packet_sizes(items, [i])) - MSP_REQUEST_OVERHEAD for i in range(len(items)))
+        self.assertTrue(len(batches) <= total // (500 - MSP_REQUEST_OVERHEAD) + 2)
+
+    def test_reply_limits(self):
+        # tiny requests with big replies: the reply size decides
+        items = [(['r'], 200) for i in range(5)]
+        batches = self.driver._plan_multiple_requests(items)
+        self.check(items, batches)
+        self.assertEqual(len(batches), 3)
+
+    def test_oversize_item_alone(self):
+        items = [(['a' * 10], 10), (['b' * 600], 10), (['c' * 10], 10)]
+        batches = self.driver._plan_multiple_requests(items)
+        self.check(items, batches)
+        self.assertIn([1], batches)
+        self.assertIn([0, 2], batches)
+
+    def test_services_of_an_item_together(self):
+        items = [(['a' * 100, 'b' * 100], 20) for i in range(4)]
+        batches = self.driver._plan_multiple_requests(items)
+        self.check(items, batches)
+        self.assertEqual(len(batches), 2)
+
+    def test_read_tag_plan(self):
+        tags = ['T{0:03d}'.format(i) for i in range(100)]
+        self.driver._tag_types.update((tag, 'DINT') for tag in tags)
+        plan = self.driver._plan_read_tag(tags)
+        self.assertEqual(sorted(i for indexes, message in plan for i in indexes), range(100))
+        services = self.driver._build_read_services(tags)
+        items = [([s], READ_REPLY_OVERHEAD + 4) for s in services]
+        for indexes, message in plan:
+            self.assertTrue(max(packet_sizes(items, indexes)) <= 500)
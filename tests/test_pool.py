@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+""" ConnectionPool: checkout, checkin, idle eviction and the limit of sessions, on drivers without network
+"""
+import threading
+import time
+import unittest
+
+from pycomm.cip.cip_base import CommError, DataError
+from pycomm.cip.cip_pool import ConnectionPool
+
+
+class FakeDriver(object):
+    """ a driver opening its session and forward open without network
+    """
+    instances = []
+    healthy = True
+    refuse = False
+
+    def __init__(self):
+        self.attribs = {}
+        self.ip_address = None
+        self.connected = False
+        self.closed = False
+        FakeDriver.instances.append(self)
+
+    def open(self, ip_address, direct_connection=False):
+        self.ip_address = ip_address
+        return not FakeDriver.refuse
+
+    def forward_open(self):
+        self.connected = True
+        return True
+
+    def is_connected(self):
+        return self.connected
+
+    def list_identity(self):
+        return FakeDriver.healthy
+
+    def get_status(self):
+        return 1, 'refused'
+
+    def close(self):
+        self.connected = False
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        FakeDriver.instances = []
+        FakeDriver.healthy = True
+        FakeDriver.refuse = False
+        self.pool = ConnectionPool(FakeDriver, max_sessions=2, idle_timeout=60.0, check_interval=10.0,
+                                   checkout_timeout=0.05)
+
+    def test_checkin_reuses_the_session(self):
+        driver = self.pool.checkout('10.0.0.1', cpu_slot=2)
+        self.assertTrue(driver.is_connected())
+        self.assertEqual(driver.attribs, {'cpu slot': 2})
+        self.pool.checkin(driver)
+        self.assertTrue(self.pool.checkout('10.0.0.1', cpu_slot=2) is driver)
+        self.assertFalse(self.pool.checkout('10.0.0.1', cpu_slot=3) is driver)
+        self.assertFalse(self.pool.checkout('10.0.0.2', cpu_slot=2) is driver)
+
+    def test_unknown_checkin(self):
+        driver = self.pool.checkout('10.0.0.1')
+        self.assertRaises(DataError, self.pool.checkin, FakeDriver())
+        self.pool.checkin(driver)
+        self.assertRaises(DataError, self.pool.checkin, driver)
+
+    def test_discard_closes_the_session(self):
+        driver = self.pool.checkout('10.0.0.1')
+        self.pool.checkin(driver, discard=True)
+        self.assertTrue(driver.closed)
+        self.assertFalse(self.pool.checkout('10.0.0.1') is driver)
+
+    def test_connection_discards_on_comm_error(self):
+        try:
+            with self.pool.connection('10.0.0.1') as driver:
+                raise CommError('lost')
+        except CommError:
+            pass
+        self.assertTrue(driver.closed)
+        with self.pool.connection('10.0.0.1') as other:
+            self.assertFalse(other is driver)
+        self.assertFalse(other.closed)
+
+    def test_max_sessions(self):
+        drivers = [self.pool.checkout('10.0.0.1') for i in range(2)]
+        self.assertRaises(CommError, self.pool.checkout, '10.0.0.1')
+
+        # a session given back by another thread is handed to the waiting checkout
+        self.pool.checkout_timeout = 5.0
+        threading.Timer(0.02, self.pool.checkin, (drivers[0],)).start()
+        self.assertTrue(self.pool.checkout('10.0.0.1') is drivers[0])
+        self.assertEqual(len(FakeDriver.instances), 2)
+
+    def test_failed_open_frees_the_slot(self):
+        FakeDriver.refuse = True
+        self.assertRaises(CommError, self.pool.checkout, '10.0.0.1')
+        self.assertRaises(CommError, self.pool.checkout, '10.0.0.1')
+        FakeDriver.refuse = False
+        self.pool.checkout('10.0.0.1')
+        self.pool.checkout('10.0.0.1')
+
+    def test_evict_idle_keeps_min_sessions(self):
+        self.pool.min_sessions = 1
+        drivers = [self.pool.checkout('10.0.0.1') for i in range(2)]
+        for driver in drivers:
+            self.pool.checkin(driver)
+        self.pool.evict_idle(time.time() + 30)
+        self.assertFalse(any(driver.closed for driver in drivers))
+        self.pool.evict_idle(time.time() + 120)
+        # the oldest session goes first
+        self.assertEqual([driver.closed for driver in drivers], [True, False])
+
+    def test_health_check(self):
+        self.pool.check_interval = 0
+        driver = self.pool.checkout('10.0.0.1')
+        self.pool.checkin(driver)
+        FakeDriver.healthy = False
+        time.sleep(0.01)
+        other = self.pool.checkout('10.0.0.1')
+        self.assertFalse(other is driver)
+        self.assertTrue(driver.closed)
+
+    def test_close(self):
+        idle = self.pool.checkout('10.0.0.1')
+        in_use = self.pool.checkout('10.0.0.1')
+        self.pool.checkin(idle)
+        self.pool.close()
+        self.assertTrue(idle.closed)
+        self.assertRaises(CommError, self.pool.checkout, '10.0.0.1')
+        self.pool.checkin(in_use)
+        self.assertTrue(in_use.closed)
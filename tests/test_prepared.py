@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+""" prepared requests: sent again in the same execution when the symbol instances moved
+"""
+import struct
+import unittest
+
+from pycomm.ab_comm.clx import Driver
+
+from tests.transport import connect, connected_request, connected_reply, symbolic_tag
+
+
+class PLC(object):
+    """ answer the multiple service packets of Read Tag and Write Tag on DINT tags, refuse the paths while stale
+    """
+    def __init__(self):
+        self.values = {}
+        self.stale = False
+
+    def __call__(self, frame):
+        sequence, service, path, data = connected_request(frame)
+        count = struct.unpack_from('<H', data)[0]
+        starts = struct.unpack_from('<%dH' % count, data, 2) + (len(data),)
+        replies = []
+        for k in range(count):
+            request = data[starts[k]:starts[k + 1]]
+            tag, indexes = symbolic_tag(request[2:2 + ord(request[1]) * 2])
+            reply = chr(ord(request[0]) | 0x80) + '\x00'
+            if self.stale:
+                reply += '\x05\x00'
+            elif request[0] == '\x4c':
+                reply += '\x00\x00' + struct.pack('<Hi', 0xc4, self.values.get(tag, 0))
+            else:
+                self.values[tag] = struct.unpack('<i', request[-4:])[0]
+                reply += '\x00\x00'
+            replies.append(reply)
+        offsets = []
+        position = 2 + 2 * count
+        for reply in replies:
+            offsets.append(position)
+            position += len(reply)
+        return connected_reply(sequence, service, data=struct.pack('<%dH' % (count + 1), count, *offsets) +
+                               ''.join(replies))
+
+
+class PreparedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = Driver()
+        self.plc = PLC()
+        self.sock = connect(self.driver, self.plc)
+        self.driver._tag_types.update({'A': 'DINT', 'B': 'DINT'})
+
+        def symbols_moved():
+            # the instances are loaded again with a new version, the messages are encoded again
+            moved, self.plc.stale = self.plc.stale, False
+            if moved:
+                self.driver._instance_ids_version += 1
+            return moved
+        self.driver._symbols_moved = symbols_moved
+
+    def test_read_sent_again_when_the_instances_moved(self):
+        self.plc.values.update({'A': 1, 'B': 2})
+        prepared = self.driver.prepare_read(['A', 'B'])
+        self.assertEqual(prepared.execute(), [('A', 1, 'DINT'), ('B', 2, 'DINT')])
+        self.plc.stale = True
+        sent = len(self.sock.sent)
+        self.assertEqual(prepared.execute(), [('A', 1, 'DINT'), ('B', 2, 'DINT')])
+        self.assertEqual(len(self.sock.sent) - sent, 2)
+
+    def test_write_packs_the_values_in_the_messages_encoded_again(self):
+        prepared = self.driver.prepare_write(['A', 'B'])
+        self.plc.stale = True
+        self.assertEqual(prepared.execute([7, -8]), [('A', 7, 'DINT', 'GOOD'), ('B', -8, 'DINT', 'GOOD')])
+        self.assertEqual(self.plc.values, {'A': 7, 'B': -8})
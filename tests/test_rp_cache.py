@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+""" LRUCache and the cache of the request paths
+"""
+import unittest
+
+from pycomm.cip.cip_base import LRUCache, TAG_RP_CACHE, create_tag_rp, create_symbol_instance_rp
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_goes_first(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_put_replaces(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('a', 10)
+        cache.put('c', 3)
+        self.assertEqual(cache.get('a'), 10)
+        self.assertEqual(cache.get('b'), None)
+
+    def test_stats_and_clear(self):
+        cache = LRUCache(8)
+        cache.put('a', 1)
+        cache.get('a')
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': 8})
+        cache.clear()
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 8})
+
+
+class TagRPCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        TAG_RP_CACHE.clear()
+
+    def tearDown(self):
+        TAG_RP_CACHE.clear()
+
+    def test_request_path_encoded_once(self):
+        rp = create_tag_rp('Recipe[3].Steps')
+        self.assertEqual(create_tag_rp('Recipe[3].Steps'), rp)
+        self.assertEqual(TAG_RP_CACHE.stats()['hits'], 1)
+        self.assertEqual(create_tag_rp('Recipe[3].Steps', multi_requests=True), chr(len(rp) / 2) + rp)
+        self.assertEqual(len(TAG_RP_CACHE), 2)
+
+    def test_instance_paths_cached_by_instance(self):
+        self.assertNotEqual(create_symbol_instance_rp(5, 'Recipe[3].Steps'),
+                            create_symbol_instance_rp(6, 'Recipe[3].Steps'))
+        self.assertEqual(len(TAG_RP_CACHE), 2)
+
+    def test_invalid_tag_not_cached(self):
+        self.assertEqual(create_tag_rp('Big[4294967296]'), None)
+        self.assertEqual(len(TAG_RP_CACHE), 0)
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+""" The PCCC messages of slc.Driver
+"""
+import unittest
+
+from pycomm.ab_comm.slc import Driver
+from pycomm.cip.cip_base import PACK_PCCC_DATA_FUNCTION
+
+from tests.transport import connect, connected_request, connected_reply
+
+
+def written(tag, value):
+    """ write_tag on a fake connection, with the same sequence count each time
+
+    :return: the send_unit_data message sent
+    """
+    driver = Driver()
+    sock = connect(driver, lambda frame: connected_reply(connected_request(frame)[0], 0x4b, data='\x00' * 12))
+    driver._sequence = 100
+    driver.write_tag(tag, value)
+    return sock.sent[-1]
+
+
+class WriteTagTest(unittest.TestCase):
+
+    def test_list_of_one_value_as_one_value(self):
+        self.assertEqual(written('N7:0', [21]), written('N7:0', 21))
+        self.assertEqual(written('F8:3', [2.5]), written('F8:3', 2.5))
+
+    def test_list_keeps_the_mask(self):
+        values = [-30, 32767, -32767]
+        data = '\xff\xff' + ''.join(PACK_PCCC_DATA_FUNCTION['N'](v) for v in values)
+        frame = written('N7:0', values)
+        self.assertTrue(frame.endswith(data))
+        # size of the data, file, type, element and sub element precede the values
+        self.assertEqual(ord(frame[-len(data) - 5]), 2 * len(values))
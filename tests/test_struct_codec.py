@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+""" StructCodec: structures decoded and encoded with one struct compiled from their template
+"""
+import struct
+import unittest
+
+from pycomm.cip.cip_base import DataError, StructCodec, get_codec
+
+
+def member(name, offset, typ, count=1, hidden=False, bit=None):
+    m = {'name': name, 'offset': offset, 'count': count, 'hidden': hidden, 'bit': bit}
+    if typ in TEMPLATES:
+        m['template'] = typ
+    else:
+        m['codec'] = get_codec(typ)
+    return m
+
+TEMPLATES = {}
+TEMPLATES['Pos'] = {'name': 'Pos', 'size': 12, 'members': [
+    member('X', 0, 'DINT'), member('Y', 4, 'DINT'), member('Z', 8, 'DINT')]}
+TEMPLATES['STRING'] = {'name': 'STRING', 'size': 88, 'members': [
+    member('LEN', 0, 'DINT'), member('DATA', 4, 'SINT', 82)]}
+TEMPLATES['Recipe'] = {'name': 'Recipe', 'size': 124, 'members': [
+    member('ZZZZZZZZZZRecipe0', 0, 'SINT', hidden=True),
+    member('Enable', 0, 'BOOL', bit=0),
+    member('Done', 0, 'BOOL', bit=3),
+    member('Speed', 4, 'REAL'),
+    member('Steps', 8, 'DINT', 4),
+    member('Pos', 24, 'Pos'),
+    member('Label', 36, 'STRING')]}
+
+
+def recipe_bytes(enable, done, speed, steps, pos, label):
+    data = bytearray(124)
+    data[0] = enable | done << 3
+    struct.pack_into('<f4i3ii', data, 4, speed, *(steps + pos + [len(label)]))
+    data[40:40 + len(label)] = label
+    return data
+
+
+class StructCodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = StructCodec(TEMPLATES['Recipe'], TEMPLATES.get)
+
+    def test_decode(self):
+        value = self.codec.decode(str(recipe_bytes(1, 0, 12.5, [1, 2, 3, 4], [7, 8, -9], 'label3')))
+        self.assertEqual(list(value), ['Enable', 'Done', 'Speed', 'Steps', 'Pos', 'Label'])
+        self.assertEqual(value['Enable'], 1)
+        self.assertEqual(value['Done'], 0)
+        self.assertEqual(value['Speed'], 12.5)
+        self.assertEqual(value['Steps'], [1, 2, 3, 4])
+        self.assertEqual(dict(value['Pos']), {'X': 7, 'Y': 8, 'Z': -9})
+        self.assertEqual(value['Label'], 'label3')
+
+    def test_encode_round_trip(self):
+        data = recipe_bytes(0, 1, -2.5, [9, 8, 7, 6], [1, 2, 3], 'abc')
+        self.assertEqual(self.codec.encode(self.codec.decode(data)), data)
+
+    def test_encode_keeps_the_hidden_bits(self):
+        data = recipe_bytes(1, 1, 0.0, [0] * 4, [0] * 3, '')
+        data[0] |= 0x40
+        value = self.codec.decode(data)
+        value['Enable'] = 0
+        self.codec.encode(value, data)
+        self.assertEqual(data[0], 0x48)
+
+    def test_arrays_and_columns(self):
+        data = recipe_bytes(1, 0, 1.5, [1] * 4, [1, 2, 3], 'a') + recipe_bytes(0, 1, 2.5, [2] * 4, [4, 5, 6], 'bc')
+        values = self.codec.decode_array(memoryview(data), 2)
+        self.assertEqual([v['Label'] for v in values], ['a', 'bc'])
+        columns = self.codec.decode_columns(data, 2, kind='array')
+        self.assertEqual(list(columns['Enable']), [1, 0])
+        self.assertEqual(list(columns['Done']), [0, 1])
+        self.assertEqual(list(columns['Speed']), [1.5, 2.5])
+        self.assertEqual(list(columns['Pos.Z']), [3, 6])
+        self.assertEqual(columns['Steps'], [[1] * 4, [2] * 4])
+        self.assertEqual(columns['Label'], ['a', 'bc'])
+
+    def test_encode_errors(self):
+        value = self.codec.decode(recipe_bytes(0, 0, 0.0, [0] * 4, [0] * 3, ''))
+        value['Steps'] = [1, 2]
+        self.assertRaises(DataError, self.codec.encode, value)
+        value['Steps'] = [1] * 4
+        value['Label'] = 'x' * 83
+        self.assertRaises(DataError, self.codec.encode, value)
+        del value['Speed']
+        self.assertRaises(DataError, self.codec.encode, value)
+
+    def test_overlapping_members(self):
+        template = {'name': 'Bad', 'size': 8, 'members': [member('A', 0, 'DINT'), member('B', 2, 'DINT')]}
+        self.assertRaises(DataError, StructCodec, template, TEMPLATES.get)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+""" one driver shared by threads: every public method sending a request holds the driver lock, the parse state of
+a request is not touched by another thread
+"""
+import struct
+import threading
+import unittest
+
+from pycomm.ab_comm.clx import Driver
+from pycomm.cip.cip_base import PycommError
+
+from tests.transport import connect, connected_request, connected_reply, symbolic_tag
+
+FRAGMENT = 25   # the DINT answered by each Read Tag Fragmented reply
+
+
+def element(tag, index):
+    """ the value of the element index of the DINT array tag named T<n>
+    """
+    return int(tag[1:]) * 1000 + index
+
+
+def plc(frame):
+    """ answer Read Tag and Read Tag Fragmented of the DINT arrays T<n>
+    """
+    sequence, service, path, data = connected_request(frame)
+    tag, indexes = symbolic_tag(path)
+    start = indexes[0] if indexes else 0
+    if service == 0x4c:
+        return connected_reply(sequence, service, data=struct.pack('<Hi', 0xc4, element(tag, start)))
+    counts, offset = struct.unpack('<HI', data)
+    first = start + offset // 4
+    last = min(start + counts, first + FRAGMENT)
+    values = struct.pack('<H%di' % (last - first), 0xc4, *[element(tag, i) for i in range(first, last)])
+    return connected_reply(sequence, service, status=0x06 if last < start + counts else 0, data=values)
+
+
+class ThreadsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.driver = Driver()
+
+    def test_concurrent_read_tag_and_read_array(self):
+        connect(self.driver, plc, delay=0.0005)
+        errors = []
+
+        def reader(n):
+            tag = 'T%d' % n
+            try:
+                for index in range(10):
+                    self.assertEqual(self.driver.read_tag('%s[%d]' % (tag, index)), (element(tag, index), 'DINT'))
+                    values = self.driver.read_array(tag, 60)
+                    self.assertEqual(values, [(i, element(tag, i)) for i in range(60)])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(1, 7)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_public_methods_send_under_the_lock(self):
+        owned = []
+
+        def refuse(frame):
+            owned.append(self.driver._lock._is_owned())
+            sequence, service, path, data = connected_request(frame)
+            return connected_reply(sequence, service, status=0x08)
+
+        connect(self.driver, refuse)
+        calls = [
+            lambda: self.driver.read_tag('T1'),
+            lambda: self.driver.read_tag(['T1', 'T2']),
+            lambda: self.driver.read_array('T1', 10),
+            lambda: self.driver.write_tag('T1', 1, 'DINT'),
+            lambda: self.driver.write_tag([('T1', 1, 'DINT'), ('T2', 2, 'DINT')]),
+            lambda: self.driver.write_array('T1', [1, 2, 3], 'DINT'),
+            lambda: self.driver.read_string('S'),
+            lambda: self.driver.read_strings(['S', 'S2']),
+            lambda: self.driver.write_string('S', 'text'),
+            lambda: self.driver.write_strings([('S', 'text'), ('S2', 'text')]),
+            lambda: self.driver.get_tag_list(),
+            lambda: list(self.driver.iter_tag_list()),
+            lambda: self.driver.get_struct_codec('R'),
+            lambda: self.driver.read_struct('R'),
+            lambda: self.driver.write_struct('R', {}),
+            lambda: self.driver.prepare_read(['T1', 'T2']).execute(),
+            lambda: self.driver.prepare_write(['T1', 'T2'], ['DINT', 'DINT']).execute([1, 2]),
+        ]
+        for call in calls:
+            before = len(owned)
+            try:
+                call()
+            except PycommError:
+                pass
+            self.assertTrue(len(owned) > before)
+        self.assertTrue(all(owned))
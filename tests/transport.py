@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+An in memory transport standing for the socket of a driver: each message sent is answered by a handler, the replies
+are received in the order of the messages, in a buffer reused as the one of pycomm.cip.cip_base.Socket.
+"""
+import struct
+import time
+import threading
+from collections import deque
+
+CID = '\x01\x02\x03\x04'
+
+
+class FakeSocket(object):
+    """ the socket of a connected driver
+
+    :param handler: called with each message sent, returns the reply or None when the message is not answered
+    :param delay: seconds waited by each receive, so the threads sharing a driver have room to interleave
+    """
+    def __init__(self, handler=None, delay=0.0):
+        self.handler = handler
+        self.delay = delay
+        self.sent = []
+        self.received = 0
+        self.replies = deque()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._buffer = bytearray(4096)
+
+    def send(self, msg, timeout=0):
+        msg = str(bytearray(msg))
+        with self._lock:
+            self.sent.append(msg)
+            if self.handler is not None:
+                reply = self.handler(msg)
+                if reply is not None:
+                    self.replies.append(reply)
+        return len(msg)
+
+    def receive(self, timeout=0):
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            reply = self.replies.popleft()
+            self.received += 1
+            if len(reply) > len(self._buffer):
+                self._buffer = bytearray(len(reply))
+            self._buffer[:len(reply)] = reply
+            return memoryview(self._buffer)[:len(reply)]
+
+    def close(self):
+        self.closed = True
+
+
+def connect(driver, handler=None, delay=0.0):
+    """ make the driver look opened, registered and forward opened on a FakeSocket
+
+    :return: the FakeSocket
+    """
+    sock = FakeSocket(handler, delay)
+    driver._Base__sock = sock
+    driver._session = 1
+    driver._connection_opened = True
+    driver._target_is_connected = True
+    driver._target_cid = CID
+    return sock
+
+
+def connected_request(frame):
+    """ split a send_unit_data message
+
+    :return: a tuple (sequence count, service, request path, request data)
+    """
+    sequence, service, path_size = struct.unpack_from('<HBB', frame, 44)
+    return sequence, service, frame[48:48 + path_size * 2], frame[48 + path_size * 2:]
+
+
+def connected_reply(sequence, service, status=0, data='', encapsulation_status=0):
+    """ build the send_unit_data reply of a connected request
+    """
+    item = struct.pack('<HBBBB', sequence, service | 0x80, 0, status, 0) + data
+    body = struct.pack('<IHHHH4sHH', 0, 0, 2, 0xa1, 4, CID, 0xb1, len(item)) + item
+    return struct.pack('<HHII8sI', 0x70, len(body), 1, encapsulation_status, '_pycomm_', 0) + body
+
+
+def symbolic_tag(path):
+    """ decode an ANSI extended symbolic request path
+
+    :return: a tuple (tag name, list of the indexes of the last segment)
+    """
+    names = []
+    indexes = []
+    position = 0
+    while position < len(path):
+        segment = ord(path[position])
+        if segment == 0x91:
+            length = ord(path[position + 1])
+            names.append(path[position + 2:position + 2 + length])
+            indexes = []
+            position += 2 + length + length % 2
+        elif segment == 0x28:
+            indexes.append(ord(path[position + 1]))
+            position += 2
+        elif segment == 0x29:
+            indexes.append(struct.unpack_from('<H', path, position + 2)[0])
+            position += 4
+        elif segment == 0x2a:
+            indexes.append(struct.unpack_from('<I', path, position + 2)[0])
+            position += 6
+        else:
+            raise ValueError("segment 0x{0:02x} not supported".format(segment))
+    return '.'.join(names), indexes